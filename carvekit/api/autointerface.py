@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PIL import Image
@@ -21,14 +22,20 @@ from carvekit.ml.wrap.u2net import U2NET
 from carvekit.ml.wrap.yolov4 import SimplifiedYoloV4
 from carvekit.pipelines.postprocessing import CasMattingMethod, MattingMethod
 from carvekit.trimap.generator import TrimapGenerator
-from carvekit.utils.image_utils import load_image
+from carvekit.utils.image_utils import prepare_images
+from carvekit.utils.models_utils import model_registry
 
-from carvekit.utils.pool_utils import thread_pool_processing
+from carvekit.utils.pool_utils import batch_generator
+from carvekit.utils.timing_utils import stage_timer
 
 __all__ = ["AutoInterface"]
 
 
 class AutoInterface(Interface):
+    OBJECT_DEPENDENT_SCENES = {"hard"}
+    """Scenes, for which select_net uses detected objects. Objects aren't detected
+    in images of other scenes, select_net gets empty object lists for them"""
+
     def __init__(
         self,
         scene_classifier: SceneClassifier,
@@ -123,6 +130,82 @@ class AutoInterface(Interface):
         else:
             raise ValueError("Unknown network type")
 
+    def classify(self, images_info: List[dict]):
+        """
+        Detects scenes of the images and objects in the images, which need them to select the net.
+        Objects in the already classified images are detected concurrently with
+        the scene classification of the next images.
+
+        Args:
+            images_info: list of dicts with image, "scene" and "objects" keys are filled
+        """
+        detections = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for batch in batch_generator(images_info, self.scene_classifier.batch_size):
+                with stage_timer("scene_classification"):
+                    scene_analysis = self.scene_classifier(
+                        [image_info["image"] for image_info in batch]
+                    )
+                for image_info, scene in zip(batch, scene_analysis):
+                    image_info["scene"] = scene[0][0]
+                dependent = [
+                    image_info
+                    for image_info in batch
+                    if image_info["scene"] in self.OBJECT_DEPENDENT_SCENES
+                ]
+                if len(dependent) > 0:
+                    detections.append(
+                        (
+                            dependent,
+                            executor.submit(
+                                self.detect_objects,
+                                [image_info["image"] for image_info in dependent],
+                            ),
+                        )
+                    )
+            for dependent, future in detections:
+                for image_info, objects in zip(dependent, future.result()):
+                    image_info["objects"] = objects
+
+    def detect_objects(self, images: List[Image.Image]) -> List[List[str]]:
+        """
+        Detects objects in the images
+
+        Args:
+            images: list of images
+
+        Returns:
+            list of detected object classes for every image
+        """
+        with stage_timer("object_detection"):
+            return self.object_classifier(images)
+
+    def refining_module(self) -> CascadePSP:
+        """
+        Returns CascadePSP network from the model registry.
+        Web API post-processing with the same config uses the same instance.
+        """
+        return model_registry.get(
+            CascadePSP,
+            device=self.postprocessing_device,
+            batch_size=self.refining_batch_size,
+            input_tensor_size=self.refining_image_size,
+            fp16=self.fp16,
+        )
+
+    def matting_module(self) -> FBAMatting:
+        """
+        Returns FBA matting network from the model registry.
+        Web API post-processing with the same config uses the same instance.
+        """
+        return model_registry.get(
+            FBAMatting,
+            device=self.postprocessing_device,
+            batch_size=self.postprocessing_batch_size,
+            input_tensor_size=self.postprocessing_image_size,
+            fp16=self.fp16,
+        )
+
     def select_net(self, scene: str, images_info: List[dict]):
         if scene == "hard":
             for image_info in images_info:
@@ -205,104 +288,74 @@ class AutoInterface(Interface):
         Returns:
             list of masks
         """
-        loaded_images = thread_pool_processing(load_image, images)
+        with stage_timer("load"):
+            loaded_images = prepare_images(images)
 
-        scene_analysis = self.scene_classifier(loaded_images)
-        images_objects = self.object_classifier(loaded_images)
+        images_info = [
+            {"index": idx, "image": image, "objects": []}
+            for idx, image in enumerate(loaded_images)
+        ]
+        self.classify(images_info)
 
         images_per_scene = {}
-        for i, image in enumerate(loaded_images):
-            scene_name = scene_analysis[i][0][0]
-            if scene_name not in images_per_scene:
-                images_per_scene[scene_name] = []
-            images_per_scene[scene_name].append(
-                {"image": image, "objects": images_objects[i]}
-            )
-
-        for scene_name, images_info in list(images_per_scene.items()):
-            self.select_net(scene_name, images_info)
-
-        # groups images by net
-        for scene_name, images_info in list(images_per_scene.items()):
-            groups = {}
-            for image_info in images_info:
-                net = image_info["net"]
-                if net not in groups:
-                    groups[net] = []
-                groups[net].append(image_info)
-            for net, gimages_info in list(groups.items()):
-                sc_images = [image_info["image"] for image_info in gimages_info]
-                masks = net(
+        for image_info in images_info:
+            images_per_scene.setdefault(image_info["scene"], []).append(image_info)
+        for scene_name, scene_images_info in images_per_scene.items():
+            self.select_net(scene_name, scene_images_info)
+
+        # groups images by net, the processing pipeline depends only on the net
+        groups = {}
+        for image_info in images_info:
+            groups.setdefault(image_info["net"], []).append(image_info)
+
+        for net, gimages_info in groups.items():
+            sc_images = [image_info["image"] for image_info in gimages_info]
+            with stage_timer("segmentation"):
+                masks = model_registry.get(
+                    net,
                     device=self.segmentation_device,
                     batch_size=self.segmentation_batch_size,
                     fp16=self.fp16,
                 )(sc_images)
 
-                for i, image_info in enumerate(gimages_info):
-                    image_info["mask"] = masks[i]
+            for i, image_info in enumerate(gimages_info):
+                image_info["mask"] = masks[i]
 
-        cascadepsp = CascadePSP(
-            device=self.postprocessing_device,
-            fp16=self.fp16,
-            input_tensor_size=self.refining_image_size,
-            batch_size=self.refining_batch_size,
-        )
-
-        fba = FBAMatting(
-            device=self.postprocessing_device,
-            batch_size=self.postprocessing_batch_size,
-            input_tensor_size=self.postprocessing_image_size,
-            fp16=self.fp16,
-        )
-        # groups images by net
-        for scene_name, images_info in list(images_per_scene.items()):
-            groups = {}
-            for image_info in images_info:
-                net = image_info["net"]
-                if net not in groups:
-                    groups[net] = []
-                groups[net].append(image_info)
-            for net, gimages_info in list(groups.items()):
-                # Configure custom pipeline for image group
-                config_params = self.select_params_for_net(net)
-                trimap_generator = TrimapGenerator(**config_params["trimap_generator"])
-                fba.disable_noise_filter = config_params["matting_module"][
-                    "disable_noise_filter"
-                ]
-                if config_params["refining"]["enabled"]:
-                    cascadepsp.mask_binary_threshold = config_params["refining"][
+        # Networks are shared, so per-group settings are passed with each call
+        cascadepsp = self.refining_module()
+        fba = self.matting_module()
+        for net, gimages_info in groups.items():
+            # Configure custom pipeline for image group
+            config_params = self.select_params_for_net(net)
+            trimap_generator = TrimapGenerator(**config_params["trimap_generator"])
+            disable_noise_filter = config_params["matting_module"][
+                "disable_noise_filter"
+            ]
+            if config_params["refining"]["enabled"]:
+                matting_method = CasMattingMethod(
+                    refining_module=cascadepsp,
+                    matting_module=fba,
+                    trimap_generator=trimap_generator,
+                    device=self.postprocessing_device,
+                    disable_noise_filter=disable_noise_filter,
+                    mask_binary_threshold=config_params["refining"][
                         "mask_binary_threshold"
-                    ]
-                    matting_method = CasMattingMethod(
-                        refining_module=cascadepsp,
-                        matting_module=fba,
-                        trimap_generator=trimap_generator,
-                        device=self.postprocessing_device,
-                    )
-                else:
-                    matting_method = MattingMethod(
-                        matting_module=fba,
-                        trimap_generator=trimap_generator,
-                        device=self.postprocessing_device,
-                    )
+                    ],
+                )
+            else:
+                matting_method = MattingMethod(
+                    matting_module=fba,
+                    trimap_generator=trimap_generator,
+                    device=self.postprocessing_device,
+                    disable_noise_filter=disable_noise_filter,
+                )
+
+            sc_images = [image_info["image"] for image_info in gimages_info]
+            masks = [image_info["mask"] for image_info in gimages_info]
+            result = matting_method(sc_images, masks)
+
+            for i, image_info in enumerate(gimages_info):
+                image_info["result"] = result[i]
 
-                sc_images = [image_info["image"] for image_info in gimages_info]
-                masks = [image_info["mask"] for image_info in gimages_info]
-                result = matting_method(sc_images, masks)
-
-                for i, image_info in enumerate(gimages_info):
-                    image_info["result"] = result[i]
-
-        # Reconstructing the original order of image
-        result = []
-        for image in loaded_images:
-            for scene_name, images_info in list(images_per_scene.items()):
-                for image_info in images_info:
-                    if image_info["image"] == image:
-                        result.append(image_info["result"])
-                        break
-        if len(result) != len(images):
-            raise RuntimeError(
-                "Something went wrong with restoring original order. Please report this bug."
-            )
-        return result
+        # Images info is in the original order of images
+        return [image_info["result"] for image_info in images_info]
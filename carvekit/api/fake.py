@@ -0,0 +1,140 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import math
+import random
+import time
+from pathlib import Path
+from typing import List, Union, Optional
+
+from PIL import Image, ImageDraw
+
+from carvekit.api.interface import Interface
+from carvekit.utils.image_utils import load_image
+from carvekit.utils.pool_utils import thread_pool_processing
+
+__all__ = ["FakeSegmentation", "FakeInterface"]
+
+
+class FakeSegmentation:
+    """
+    Stand-in segmentation network, which returns synthetic masks after a random delay.
+    Doesn't need model checkpoints, so the rest of the framework can be
+    benchmarked and tested on any machine.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        latency_ms_per_mp: float = 100,
+        latency_std_ms: float = 50,
+        seed: Optional[int] = None,
+    ):
+        """
+        Initialize the fake segmentation network.
+
+        Args:
+            latency_ms: mean processing time of one image in milliseconds
+            latency_ms_per_mp: additional mean processing time per megapixel of the image
+            latency_std_ms: standard deviation of the processing time of one image.
+                Processing time is log-normally distributed, so it has a long tail like
+                the real networks. 0 makes processing time constant
+            seed: random seed for reproducible delays
+        """
+        self.latency_ms = latency_ms
+        self.latency_ms_per_mp = latency_ms_per_mp
+        self.latency_std_ms = latency_std_ms
+        self.random = random.Random(seed)
+
+    def latency(self, image: Image.Image) -> float:
+        """
+        Samples processing time of the image
+
+        Args:
+            image: input image
+
+        Returns:
+            processing time in seconds
+        """
+        mean = (
+            self.latency_ms
+            + self.latency_ms_per_mp * image.size[0] * image.size[1] / 1e6
+        )
+        if mean <= 0:
+            return 0.0
+        if self.latency_std_ms <= 0:
+            return mean / 1000
+        sigma = math.sqrt(math.log(1 + (self.latency_std_ms / mean) ** 2))
+        mu = math.log(mean) - sigma**2 / 2
+        return self.random.lognormvariate(mu, sigma) / 1000
+
+    @staticmethod
+    def mask(image: Image.Image) -> Image.Image:
+        """
+        Draws synthetic mask of the image
+
+        Args:
+            image: input image
+
+        Returns:
+            L mode mask with an ellipse in the center of the image
+        """
+        mask = Image.new("L", image.size, 0)
+        width, height = image.size
+        ImageDraw.Draw(mask).ellipse(
+            (width // 6, height // 6, width - width // 6, height - height // 6),
+            fill=255,
+        )
+        return mask
+
+    def __call__(
+        self, images: List[Union[str, Path, Image.Image]]
+    ) -> List[Image.Image]:
+        """
+        Passes input images through the fake network
+
+        Args:
+            images: input images
+
+        Returns:
+            synthetic segmentation masks
+        """
+        images = thread_pool_processing(load_image, images)
+        time.sleep(sum(self.latency(image) for image in images))
+        return [self.mask(image) for image in images]
+
+
+class FakeInterface(Interface):
+    def __init__(
+        self,
+        latency_ms: float = 200,
+        latency_ms_per_mp: float = 100,
+        latency_std_ms: float = 50,
+        device="cpu",
+        seed: Optional[int] = None,
+    ):
+        """
+        Initializes interface with the fake segmentation network and without
+        pre- and post-processing. Masks are still applied to the images,
+        so the output has the same format as the output of the real interfaces.
+
+        Args:
+            latency_ms: mean processing time of one image in milliseconds
+            latency_ms_per_mp: additional mean processing time per megapixel of the image
+            latency_std_ms: standard deviation of the processing time of one image
+            device: The processing device that will be used to apply the masks to the images.
+            seed: random seed for reproducible delays
+        """
+        super().__init__(
+            seg_pipe=FakeSegmentation(
+                latency_ms=latency_ms,
+                latency_ms_per_mp=latency_ms_per_mp,
+                latency_std_ms=latency_std_ms,
+                seed=seed,
+            ),
+            pre_pipe=None,
+            post_pipe=None,
+            device=device,
+        )
@@ -4,7 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 from pathlib import Path
-from typing import Union, List, Optional
+from typing import Union, List, Optional, Iterable, Iterator, Callable, Tuple
 
 from PIL import Image
 
@@ -15,9 +15,10 @@ from carvekit.ml.wrap.isnet import ISNet
 from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
 from carvekit.pipelines.preprocessing import PreprocessingStub, AutoScene
 from carvekit.pipelines.postprocessing import MattingMethod, CasMattingMethod
-from carvekit.utils.image_utils import load_image
+from carvekit.utils.image_utils import prepare_images, PreparedImage
 from carvekit.utils.mask_utils import apply_mask
-from carvekit.utils.pool_utils import thread_pool_processing
+from carvekit.utils.pool_utils import pipeline_processing
+from carvekit.utils.timing_utils import stage_timer
 
 
 class Interface:
@@ -42,6 +43,53 @@ class Interface:
         self.segmentation_pipeline = seg_pipe
         self.postprocessing_pipeline = post_pipe
 
+    def load(self, images: List[Union[str, Path, Image.Image]]) -> List[PreparedImage]:
+        """
+        Decodes the images once for all the next stages
+
+        Args:
+            images: list of input images
+
+        Returns:
+            list of PreparedImage instances
+        """
+        with stage_timer("load"):
+            return prepare_images(images)
+
+    def segment(self, images: List[PreparedImage]) -> List[Image.Image]:
+        """
+        Segments the images by the pre-processing pipeline or the segmentation network
+
+        Args:
+            images: list of images returned by load
+
+        Returns:
+            list of masks
+        """
+        with stage_timer("segmentation"):
+            if self.preprocessing_pipeline is not None:
+                return self.preprocessing_pipeline(interface=self, images=images)
+            return self.segmentation_pipeline(images=images)
+
+    def apply_masks(
+        self, images: List[PreparedImage], masks: List[Image.Image]
+    ) -> List[Image.Image]:
+        """
+        Applies segmentation masks to the images without post-processing
+
+        Args:
+            images: list of images returned by load
+            masks: list of masks
+
+        Returns:
+            list of images without background
+        """
+        with stage_timer("apply_mask"):
+            return [
+                apply_mask(image=image, mask=mask, device=self.device)
+                for image, mask in zip(images, masks)
+            ]
+
     def __call__(
         self, images: List[Union[str, Path, Image.Image]]
     ) -> List[Image.Image]:
@@ -59,25 +107,138 @@ class Interface:
                 "Segmentation pipeline is not initialized."
                 "Override the class or pass the pipeline to the constructor."
             )
-        images = thread_pool_processing(load_image, images)
-        if self.preprocessing_pipeline is not None:
-            masks: List[Image.Image] = self.preprocessing_pipeline(
-                interface=self, images=images
-            )
-        else:
-            masks: List[Image.Image] = self.segmentation_pipeline(images=images)
-
+        images = self.load(images)
+        masks = self.segment(images)
         if self.postprocessing_pipeline is not None:
-            images: List[Image.Image] = self.postprocessing_pipeline(
-                images=images, masks=masks
+            with stage_timer("postprocessing"):
+                return self.postprocessing_pipeline(images=images, masks=masks)
+        return self.apply_masks(images, masks)
+
+    def stream(
+        self, images: Iterable[Union[str, Path, Image.Image]], queue_size: int = 4
+    ) -> Iterator[Image.Image]:
+        """
+        Removes the background from the images of the iterable and yields the results
+        in the input order as soon as they are ready.
+
+        Notes:
+            Decoding, segmentation, refining, trimap generation, matting and mask
+            application run in separate threads connected with bounded queues, so
+            CPU-bound stages overlap with network forward passes. Each stage batches
+            the images waiting for it up to the batch size of its network.
+            Only a few images are kept in memory, so the iterable may be long or lazy.
+
+        Args:
+            images: iterable of input images
+            queue_size: maximum count of images waiting between two stages
+
+        Returns:
+            Generator of images without background as PIL.Image.Image instances
+        """
+        if (
+            self.segmentation_pipeline is None
+            and type(self).__call__ is Interface.__call__
+        ):
+            raise ValueError(
+                "Segmentation pipeline is not initialized."
+                "Override the class or pass the pipeline to the constructor."
             )
+        return pipeline_processing(images, self._stream_stages(), queue_size=queue_size)
+
+    def _stream_stages(self) -> List[Tuple[Callable[[list], list], int]]:
+        """
+        Splits the interface into the stages of Interface.stream
+
+        Returns:
+            list of (stage function, batch size)
+        """
+        seg_batch_size = getattr(self.segmentation_pipeline, "batch_size", 1)
+
+        def load(batch):
+            # images are decoded here, lazy decoding shouldn't block the next stages
+            return [{"image": image} for image in self.load(batch)]
+
+        if type(self).__call__ is not Interface.__call__:
+            # Interfaces with custom processing, like AutoInterface, are streamed by batches
+            def process(batch):
+                return self([item["image"] for item in batch])
+
+            return [(load, seg_batch_size), (process, seg_batch_size)]
+
+        def segment(batch):
+            masks = self.segment([item["image"] for item in batch])
+            for item, mask in zip(batch, masks):
+                item["mask"] = mask
+            return batch
+
+        stages = [(load, seg_batch_size), (segment, seg_batch_size)]
+        post = self.postprocessing_pipeline
+        if isinstance(post, MattingMethod):
+            # Stages are the methods, which are called by post-processing pipeline itself
+
+            def prepare(batch):
+                images, masks = post.prepare(
+                    [item["image"] for item in batch], [item["mask"] for item in batch]
+                )
+                for item, image, mask in zip(batch, images, masks):
+                    item["image"], item["mask"] = image, mask
+
+            def refine(batch):
+                prepare(batch)
+                masks = post.refine(
+                    [item["image"] for item in batch], [item["mask"] for item in batch]
+                )
+                for item, mask in zip(batch, masks):
+                    item["mask"] = mask
+                return batch
+
+            def trimap(batch):
+                if not isinstance(post, CasMattingMethod):
+                    prepare(batch)
+                trimaps = post.generate_trimaps(
+                    [item["image"] for item in batch], [item["mask"] for item in batch]
+                )
+                for item, item_trimap in zip(batch, trimaps):
+                    item["trimap"] = item_trimap
+                return batch
+
+            def matting(batch):
+                alpha = post.matting(
+                    [item["image"] for item in batch],
+                    [item["trimap"] for item in batch],
+                )
+                for item, mask in zip(batch, alpha):
+                    item["mask"] = mask
+                return batch
+
+            def compose(batch):
+                return post.apply_masks(
+                    [item["image"] for item in batch], [item["mask"] for item in batch]
+                )
+
+            if isinstance(post, CasMattingMethod):
+                stages.append((refine, getattr(post.refining_module, "batch_size", 1)))
+            matting_batch_size = getattr(post.matting_module, "batch_size", 1)
+            stages.append((trimap, matting_batch_size))
+            stages.append((matting, matting_batch_size))
+        elif post is not None:
+
+            def postprocess(batch):
+                with stage_timer("postprocessing"):
+                    outputs = post(
+                        images=[item["image"] for item in batch],
+                        masks=[item["mask"] for item in batch],
+                    )
+                return outputs
+
+            stages.append((postprocess, seg_batch_size))
+            return stages
         else:
-            images = list(
-                map(
-                    lambda x: apply_mask(
-                        image=images[x], mask=masks[x], device=self.device
-                    ),
-                    range(len(images)),
+
+            def compose(batch):
+                return self.apply_masks(
+                    [item["image"] for item in batch], [item["mask"] for item in batch]
                 )
-            )
-        return images
+
+        stages.append((compose, 1))
+        return stages
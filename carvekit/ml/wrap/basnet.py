@@ -13,7 +13,7 @@ from PIL import Image
 
 from carvekit.ml.arch.basnet.basnet import BASNet
 from carvekit.ml.files.models_loc import basnet_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import load_rgb_image, resize_image
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
 __all__ = ["BASNET"]
@@ -66,7 +66,7 @@ class BASNET(BASNet):
             input for neural network
 
         """
-        resized = data.resize(self.input_image_size)
+        resized = resize_image(data, self.input_image_size)
         # noinspection PyTypeChecker
         resized_arr = np.array(resized, dtype=np.float64)
         temp_image = np.zeros((resized_arr.shape[0], resized_arr.shape[1], 3))
@@ -120,9 +120,7 @@ class BASNET(BASNet):
         """
         collect_masks = []
         for image_batch in batch_generator(images, self.batch_size):
-            converted_images = thread_pool_processing(
-                lambda x: convert_image(load_image(x)), image_batch
-            )
+            converted_images = thread_pool_processing(load_rgb_image, image_batch)
             batches = torch.vstack(
                 thread_pool_processing(self.data_preprocessing, converted_images)
             )
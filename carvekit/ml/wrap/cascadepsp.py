@@ -11,7 +11,7 @@ import numpy as np
 import torch
 from PIL import Image
 from torchvision import transforms
-from typing import Union, List
+from typing import Union, List, Optional, Tuple
 
 from carvekit.ml.arch.cascadepsp.pspnet import RefinementModule
 from carvekit.ml.arch.cascadepsp.utils import (
@@ -19,7 +19,15 @@ from carvekit.ml.arch.cascadepsp.utils import (
     process_high_res_im,
 )
 from carvekit.ml.files.models_loc import cascadepsp_finetuned, cascadepsp_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import (
+    convert_image,
+    load_image,
+    load_rgb_image,
+    resize_image,
+    thumbnail_image,
+    thumbnail_size,
+)
+from carvekit.utils.mask_utils import to_mask_array, resize_mask
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
@@ -101,50 +109,36 @@ class CascadePSP(RefinementModule):
             ]
         )
 
-    def data_preprocessing(self, data: Union[PIL.Image.Image]) -> torch.FloatTensor:
+    def preprocessing_size(self, size: Tuple[int, int]) -> Tuple[int, int]:
         """
-        Transform input image to suitable data format for neural network
+        Returns size, to which images and masks are resized before the neural network
 
         Args:
-            data: input image
+            size: size of the input image or mask
 
         Returns:
-            input for neural network
+            size of the neural network input
 
+        Raises:
+            ValueError: if local step is used with batch_size > 1 without image processing acceleration
         """
-        preprocessed_data = data.copy()
         if self.batch_size == 1 and self.processing_accelerate_image_size > 0:
             # Okay, we have only one image, so
             # we can use image processing acceleration for accelerate high resolution image processing
-            preprocessed_data.thumbnail(
+            return thumbnail_size(
+                size,
                 (
                     self.processing_accelerate_image_size,
                     self.processing_accelerate_image_size,
-                )
+                ),
             )
         elif self.batch_size == 1:
-            pass  # No need to do anything
+            return size  # No need to do anything
         elif self.batch_size > 1 and self.global_step_only is True:
             # If we have more than one image and we use only global step,
             # there aren't any reason to use image processing acceleration,
             # because we will use only global step for prediction and anyway it will be resized to input_tensor_size
-            preprocessed_data = preprocessed_data.resize(
-                (self.input_tensor_size, self.input_tensor_size)
-            )
-        elif (
-            self.batch_size > 1
-            and self.global_step_only is False
-            and self.processing_accelerate_image_size > 0
-        ):
-            # If we have more than one image and we use local step,
-            # we can use image processing acceleration for accelerate high resolution image processing
-            # but we need to resize image to processing_accelerate_image_size to stack it with other images
-            preprocessed_data = preprocessed_data.resize(
-                (
-                    self.processing_accelerate_image_size,
-                    self.processing_accelerate_image_size,
-                )
-            )
+            return self.input_tensor_size, self.input_tensor_size
         elif (
             self.batch_size > 1
             and self.global_step_only is False
@@ -155,56 +149,89 @@ class CascadePSP(RefinementModule):
                 "you need to set processing_accelerate_image_size > 0,"
                 "since we cannot stack images with different sizes to one batch"
             )
-        else:  # some extra cases
-            preprocessed_data = preprocessed_data.resize(
-                (
-                    self.processing_accelerate_image_size,
-                    self.processing_accelerate_image_size,
-                )
+        else:
+            # If we have more than one image and we use local step,
+            # we can use image processing acceleration for accelerate high resolution image processing
+            # but we need to resize image to processing_accelerate_image_size to stack it with other images
+            return (
+                self.processing_accelerate_image_size,
+                self.processing_accelerate_image_size,
             )
 
-        if data.mode == "RGB":
-            preprocessed_data = self._image_transform(
-                np.array(preprocessed_data)
-            ).unsqueeze(0)
-        elif data.mode == "L":
-            preprocessed_data = np.array(preprocessed_data)
-            if 0 < self.mask_binary_threshold <= 255:
-                preprocessed_data = (
-                    preprocessed_data > self.mask_binary_threshold
-                ).astype(np.uint8) * 255
-            elif self.mask_binary_threshold > 255 or self.mask_binary_threshold < 0:
+    def data_preprocessing(
+        self,
+        data: Union[PIL.Image.Image, np.ndarray],
+        mask_binary_threshold: Optional[int] = None,
+    ) -> torch.FloatTensor:
+        """
+        Transform input image to suitable data format for neural network
+
+        Args:
+            data: input image or mask as L mode PIL image or uint8 array
+            mask_binary_threshold: overrides mask_binary_threshold of the instance, if not None
+
+        Returns:
+            input for neural network
+
+        """
+        if isinstance(data, np.ndarray) or data.mode == "L":
+            # Masks are resized and thresholded as arrays
+            mask = to_mask_array(data)
+            mask = resize_mask(mask, self.preprocessing_size(mask.shape[::-1]))
+            if mask_binary_threshold is None:
+                mask_binary_threshold = self.mask_binary_threshold
+            if 0 < mask_binary_threshold <= 255:
+                mask = (mask > mask_binary_threshold).astype(np.uint8) * 255
+            elif mask_binary_threshold > 255 or mask_binary_threshold < 0:
                 warnings.warn(
                     "mask_binary_threshold should be in range [0, 255], "
                     "but got {}. Disabling mask_binary_threshold!".format(
-                        self.mask_binary_threshold
+                        mask_binary_threshold
                     )
                 )
+            return self._seg_transform(mask).unsqueeze(0)  # [H,W,1]
 
-            preprocessed_data = self._seg_transform(preprocessed_data).unsqueeze(
-                0
-            )  # [H,W,1]
+        size = self.preprocessing_size(data.size)
+        if self.batch_size == 1 and self.processing_accelerate_image_size > 0:
+            # Thumbnails of prepared images are memoized, their size is the same
+            preprocessed_data = thumbnail_image(
+                data,
+                (
+                    self.processing_accelerate_image_size,
+                    self.processing_accelerate_image_size,
+                ),
+            )
+        elif size != data.size:
+            preprocessed_data = resize_image(data, size)
+        else:
+            preprocessed_data = load_image(data)
 
+        if data.mode == "RGB":
+            preprocessed_data = self._image_transform(
+                np.array(preprocessed_data)
+            ).unsqueeze(0)
         return preprocessed_data
 
     @staticmethod
     def data_postprocessing(
-        data: torch.tensor, mask: PIL.Image.Image
-    ) -> PIL.Image.Image:
+        data: torch.tensor, mask: Union[PIL.Image.Image, np.ndarray]
+    ) -> Union[PIL.Image.Image, np.ndarray]:
         """
         Transforms output data from neural network to suitable data
         format for using with other components of this framework.
 
         Args:
             data: output data from neural network
-            mask: input mask
+            mask: input mask as L mode PIL image or uint8 array
 
         Returns:
-            Segmentation mask as PIL Image instance
+            Segmentation mask in the same format as the input mask
 
         """
         refined_mask = (data[0, :, :].cpu().numpy() * 255).astype("uint8")
-        return Image.fromarray(refined_mask).convert("L").resize(mask.size)
+        if isinstance(mask, np.ndarray):
+            return resize_mask(refined_mask, mask.shape[::-1])
+        return Image.fromarray(resize_mask(refined_mask, mask.size))
 
     def safe_forward(self, im, seg, inter_s8=None, inter_s4=None):
         """
@@ -243,17 +270,21 @@ class CascadePSP(RefinementModule):
     def __call__(
         self,
         images: List[Union[str, pathlib.Path, PIL.Image.Image]],
-        masks: List[Union[str, pathlib.Path, PIL.Image.Image]],
-    ) -> List[PIL.Image.Image]:
+        masks: List[Union[str, pathlib.Path, PIL.Image.Image, np.ndarray]],
+        mask_binary_threshold: Optional[int] = None,
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
         Args:
             images: input images
             masks: Segmentation masks to refine
+            mask_binary_threshold: overrides mask_binary_threshold of the instance for this call,
+                so the shared instance isn't modified
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances.
+            Masks passed as uint8 arrays are returned as uint8 arrays
 
         """
 
@@ -268,18 +299,22 @@ class CascadePSP(RefinementModule):
             cast_network(self, dtype)
             for idx_batch in batch_generator(range(len(images)), self.batch_size):
                 inpt_images = thread_pool_processing(
-                    lambda x: convert_image(load_image(images[x])), idx_batch
+                    lambda x: load_rgb_image(images[x]), idx_batch
                 )
 
                 inpt_masks = thread_pool_processing(
-                    lambda x: convert_image(load_image(masks[x]), mode="L"), idx_batch
+                    lambda x: masks[x]
+                    if isinstance(masks[x], np.ndarray)
+                    else convert_image(load_image(masks[x]), mode="L"),
+                    idx_batch,
                 )
 
                 inpt_img_batches = thread_pool_processing(
                     self.data_preprocessing, inpt_images
                 )
                 inpt_masks_batches = thread_pool_processing(
-                    self.data_preprocessing, inpt_masks
+                    lambda x: self.data_preprocessing(x, mask_binary_threshold),
+                    inpt_masks,
                 )
                 if self.batch_size > 1:  # We need to stack images, if batch_size > 1
                     inpt_img_batches = torch.vstack(inpt_img_batches)
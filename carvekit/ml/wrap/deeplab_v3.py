@@ -12,7 +12,7 @@ from PIL import Image
 from torchvision import transforms
 from torchvision.models.segmentation import deeplabv3_resnet101
 from carvekit.ml.files.models_loc import deeplab_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import load_rgb_image, thumbnail_image
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
@@ -87,9 +87,7 @@ class DeepLabV3:
             input for neural network
 
         """
-        copy = data.copy()
-        copy.thumbnail(self.input_image_size, resample=3)
-        return self.transform(copy)
+        return self.transform(thumbnail_image(data, self.input_image_size, resample=3))
 
     @staticmethod
     def data_postprocessing(
@@ -129,9 +127,7 @@ class DeepLabV3:
         with autocast:
             cast_network(self.network, dtype)
             for image_batch in batch_generator(images, self.batch_size):
-                converted_images = thread_pool_processing(
-                    lambda x: convert_image(load_image(x)), image_batch
-                )
+                converted_images = thread_pool_processing(load_rgb_image, image_batch)
                 batches = thread_pool_processing(
                     self.data_preprocessing, converted_images
                 )
@@ -4,7 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import pathlib
-from typing import Union, List, Tuple
+from typing import Union, List, Tuple, Optional
 
 import PIL
 import cv2
@@ -18,7 +18,15 @@ from carvekit.ml.arch.fba_matting.transforms import (
     groupnorm_normalise_image,
 )
 from carvekit.ml.files.models_loc import fba_pretrained
-from carvekit.utils.image_utils import convert_image, load_image
+from carvekit.utils.image_utils import (
+    convert_image,
+    load_image,
+    load_rgb_image,
+    resize_image,
+    thumbnail_image,
+    thumbnail_size,
+)
+from carvekit.utils.mask_utils import to_mask_array, resize_mask
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
 
@@ -58,44 +66,67 @@ class FBAMatting(FBA):
         self.device = device
         self.batch_size = batch_size
         self.disable_noise_filter = disable_noise_filter
-        if isinstance(input_tensor_size, list):
-            self.input_image_size = input_tensor_size[:2]
-        else:
-            self.input_image_size = (input_tensor_size, input_tensor_size)
+        self.input_image_size = self.image_size(input_tensor_size)
         self.to(device)
         if load_pretrained:
             self.load_state_dict(torch.load(fba_pretrained(), map_location=self.device))
         self.eval()
 
+    @staticmethod
+    def image_size(input_tensor_size: Union[List[int], int]) -> Tuple[int, int]:
+        """
+        Converts input tensor size to the size of the network input image
+
+        Args:
+            input_tensor_size: input image size as a number or a list
+
+        Returns:
+            width and height of the network input image
+        """
+        if isinstance(input_tensor_size, (list, tuple)):
+            return tuple(input_tensor_size[:2])
+        return input_tensor_size, input_tensor_size
+
     def data_preprocessing(
-        self, data: Union[PIL.Image.Image, np.ndarray]
+        self,
+        data: Union[PIL.Image.Image, np.ndarray],
+        input_image_size: Optional[Tuple[int, int]] = None,
     ) -> Tuple[torch.FloatTensor, torch.FloatTensor]:
         """
         Transform input image to suitable data format for neural network
 
         Args:
-            data: input image
+            data: input image or trimap as L mode PIL image or uint8 array
+            input_image_size: overrides input_image_size of the instance, if not None
 
         Returns:
             input for neural network
 
         """
-        resized = data.copy()
-        if self.batch_size == 1:
-            resized.thumbnail(self.input_image_size, resample=3)
-        else:
-            resized = resized.resize(self.input_image_size, resample=3)
-        # noinspection PyTypeChecker
-        image = np.array(resized, dtype=np.float64)
-        image = image / 255.0  # Normalize image to [0, 1] values range
-        if resized.mode == "RGB":
-            image = image[:, :, ::-1]
-        elif resized.mode == "L":
-            image2 = np.copy(image)
-            h, w = image2.shape
+        if input_image_size is None:
+            input_image_size = self.input_image_size
+        is_trimap = isinstance(data, np.ndarray) or data.mode == "L"
+        if is_trimap:
+            # Trimaps are resized as arrays
+            trimap = to_mask_array(data)
+            if self.batch_size == 1:
+                size = thumbnail_size(trimap.shape[::-1], input_image_size)
+            else:
+                size = input_image_size
+            trimap = resize_mask(trimap, size)
+            h, w = trimap.shape
             image = np.zeros((h, w, 2))  # Transform trimap to binary data format
-            image[image2 == 1, 1] = 1
-            image[image2 == 0, 0] = 1
+            image[trimap == 255, 1] = 1
+            image[trimap == 0, 0] = 1
+        elif data.mode == "RGB":
+            if self.batch_size == 1:
+                resized = thumbnail_image(data, input_image_size, resample=3)
+            else:
+                resized = resize_image(data, input_image_size, resample=3)
+            # noinspection PyTypeChecker
+            image = np.array(resized, dtype=np.float64)
+            image = image / 255.0  # Normalize image to [0, 1] values range
+            image = image[:, :, ::-1]
         else:
             raise ValueError("Incorrect color mode for image")
         h, w = image.shape[:2]  # Scale input mlt to 8
@@ -103,60 +134,72 @@ class FBAMatting(FBA):
         w1 = int(np.ceil(1.0 * w / 8) * 8)
         x_scale = cv2.resize(image, (w1, h1), interpolation=cv2.INTER_LANCZOS4)
         image_tensor = torch.from_numpy(x_scale).permute(2, 0, 1)[None, :, :, :].float()
-        if resized.mode == "RGB":
-            return image_tensor, groupnorm_normalise_image(
-                image_tensor.clone(), format="nchw"
-            )
-        else:
+        if is_trimap:
             return (
                 image_tensor,
                 torch.from_numpy(trimap_transform(x_scale))
                 .permute(2, 0, 1)[None, :, :, :]
                 .float(),
             )
+        else:
+            return image_tensor, groupnorm_normalise_image(
+                image_tensor.clone(), format="nchw"
+            )
 
     def data_postprocessing(
-        self, data: torch.tensor, trimap: PIL.Image.Image
-    ) -> PIL.Image.Image:
+        self,
+        data: torch.tensor,
+        trimap: Union[PIL.Image.Image, np.ndarray],
+        disable_noise_filter: Optional[bool] = None,
+    ) -> Union[PIL.Image.Image, np.ndarray]:
         """
         Transforms output data from neural network to suitable data
         format for using with other components of this framework.
 
         Args:
             data: output data from neural network
-            trimap: Map with the area we need to refine
+            trimap: Map with the area we need to refine as L mode PIL image or uint8 array
+            disable_noise_filter: overrides disable_noise_filter of the instance, if not None
 
         Returns:
-            Segmentation mask as PIL Image instance
+            Segmentation mask in the same format as the trimap
 
         """
-        if trimap.mode != "L":
+        if isinstance(trimap, PIL.Image.Image) and trimap.mode != "L":
             raise ValueError("Incorrect color mode for trimap")
-        pred = data.numpy().transpose((1, 2, 0))
-        pred = cv2.resize(pred, trimap.size, cv2.INTER_LANCZOS4)[:, :, 0]
-        # noinspection PyTypeChecker
+        trimap_arr = to_mask_array(trimap)
+        # Only alpha channel is resized, foreground and background predictions are unused
+        pred = cv2.resize(data[0].numpy(), trimap_arr.shape[::-1])
         # Clean mask by removing all false predictions outside trimap and already known area
-        trimap_arr = np.array(trimap.copy())
         pred[trimap_arr[:, :] == 0] = 0
         # pred[trimap_arr[:, :] == 255] = 1
-        if not self.disable_noise_filter:
+        if disable_noise_filter is None:
+            disable_noise_filter = self.disable_noise_filter
+        if not disable_noise_filter:
             pred[pred < 0.3] = 0
-        return Image.fromarray(pred * 255).convert("L")
+        alpha = np.clip(pred * 255, 0, 255).astype(np.uint8)
+        return alpha if isinstance(trimap, np.ndarray) else Image.fromarray(alpha)
 
     def __call__(
         self,
         images: List[Union[str, pathlib.Path, PIL.Image.Image]],
-        trimaps: List[Union[str, pathlib.Path, PIL.Image.Image]],
-    ) -> List[PIL.Image.Image]:
+        trimaps: List[Union[str, pathlib.Path, PIL.Image.Image, np.ndarray]],
+        disable_noise_filter: Optional[bool] = None,
+        input_image_size: Optional[Union[List[int], int]] = None,
+    ) -> List[Union[PIL.Image.Image, np.ndarray]]:
         """
         Passes input images though neural network and returns segmentation masks as PIL.Image.Image instances
 
         Args:
             images: input images
             trimaps: Maps with the areas we need to refine
+            disable_noise_filter: overrides disable_noise_filter of the instance for this call,
+                so the shared instance isn't modified
+            input_image_size: overrides input image size of the instance for this call
 
         Returns:
-            segmentation masks as for input images, as PIL.Image.Image instances
+            segmentation masks as for input images, as PIL.Image.Image instances.
+            Masks of trimaps passed as uint8 arrays are returned as uint8 arrays
 
         """
 
@@ -165,24 +208,30 @@ class FBAMatting(FBA):
                 "Len of specified arrays of images and trimaps should be equal!"
             )
 
+        if input_image_size is not None:
+            input_image_size = self.image_size(input_image_size)
         collect_masks = []
         autocast, dtype = get_precision_autocast(device=self.device, fp16=self.fp16)
         with autocast:
             cast_network(self, dtype)
             for idx_batch in batch_generator(range(len(images)), self.batch_size):
                 inpt_images = thread_pool_processing(
-                    lambda x: convert_image(load_image(images[x])), idx_batch
+                    lambda x: load_rgb_image(images[x]), idx_batch
                 )
 
                 inpt_trimaps = thread_pool_processing(
-                    lambda x: convert_image(load_image(trimaps[x]), mode="L"), idx_batch
+                    lambda x: trimaps[x]
+                    if isinstance(trimaps[x], np.ndarray)
+                    else convert_image(load_image(trimaps[x]), mode="L"),
+                    idx_batch,
                 )
 
                 inpt_img_batches = thread_pool_processing(
-                    self.data_preprocessing, inpt_images
+                    lambda x: self.data_preprocessing(x, input_image_size), inpt_images
                 )
                 inpt_trimaps_batches = thread_pool_processing(
-                    self.data_preprocessing, inpt_trimaps
+                    lambda x: self.data_preprocessing(x, input_image_size),
+                    inpt_trimaps,
                 )
 
                 inpt_img_batches_transformed = torch.vstack(
@@ -220,7 +269,9 @@ class FBAMatting(FBA):
                         output,
                     )
                 masks = thread_pool_processing(
-                    lambda x: self.data_postprocessing(output_cpu[x], inpt_trimaps[x]),
+                    lambda x: self.data_postprocessing(
+                        output_cpu[x], inpt_trimaps[x], disable_noise_filter
+                    ),
                     range(len(inpt_images)),
                 )
                 collect_masks += masks
@@ -14,7 +14,7 @@ from torchvision.transforms.functional import normalize
 
 from carvekit.ml.arch.isnet.isnet import ISNetDIS
 from carvekit.ml.files.models_loc import isnet_carveset_pretrained, isnet_full_pretrained
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import load_rgb_image, resize_image
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import thread_pool_processing, batch_generator
 
@@ -70,7 +70,7 @@ class ISNet(ISNetDIS):
             input for neural network
 
         """
-        resized = data.resize(self.input_image_size, resample=3)
+        resized = resize_image(data, self.input_image_size, resample=3)
         # noinspection PyTypeChecker
         resized_arr = torch.from_numpy(np.array(resized, dtype=float)).permute(2, 0, 1)
         resized_arr = resized_arr.unsqueeze(0)
@@ -122,9 +122,7 @@ class ISNet(ISNetDIS):
         with autocast:
             cast_network(self, dtype)
             for image_batch in batch_generator(images, self.batch_size):
-                converted_images = thread_pool_processing(
-                    lambda x: convert_image(load_image(x)), image_batch
-                )
+                converted_images = thread_pool_processing(load_rgb_image, image_batch)
                 batches = torch.vstack(
                     thread_pool_processing(self.data_preprocessing, converted_images)
                 )
@@ -14,7 +14,7 @@ from PIL import Image
 
 from carvekit.ml.arch.u2net.u2net import U2NETArchitecture
 from carvekit.ml.files.models_loc import u2net_full_pretrained
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import load_rgb_image, resize_image
 from carvekit.utils.pool_utils import thread_pool_processing, batch_generator
 
 __all__ = ["U2NET"]
@@ -72,7 +72,7 @@ class U2NET(U2NETArchitecture):
             input for neural network
 
         """
-        resized = data.resize(self.input_image_size, resample=3)
+        resized = resize_image(data, self.input_image_size, resample=3)
         # noinspection PyTypeChecker
         resized_arr = np.array(resized, dtype=float)
         temp_image = np.zeros((resized_arr.shape[0], resized_arr.shape[1], 3))
@@ -126,9 +126,7 @@ class U2NET(U2NETArchitecture):
         """
         collect_masks = []
         for image_batch in batch_generator(images, self.batch_size):
-            converted_images = thread_pool_processing(
-                lambda x: convert_image(load_image(x)), image_batch
-            )
+            converted_images = thread_pool_processing(load_rgb_image, image_batch)
             batches = torch.vstack(
                 thread_pool_processing(self.data_preprocessing, converted_images)
             )
@@ -17,7 +17,7 @@ from typing import List, Union
 from carvekit.ml.arch.yolov4.models import Yolov4
 from carvekit.ml.arch.yolov4.utils import post_processing
 from carvekit.ml.files.models_loc import yolov4_coco_pretrained
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import load_rgb_image, resize_image
 from carvekit.utils.models_utils import get_precision_autocast, cast_network
 from carvekit.utils.pool_utils import thread_pool_processing, batch_generator
 
@@ -94,7 +94,7 @@ class YoloV4_COCO(Yolov4):
             input for neural network
 
         """
-        image = data.resize(self.input_image_size)
+        image = resize_image(data, self.input_image_size)
         # noinspection PyTypeChecker
         image = np.array(image).astype(np.float32)
         image = image.transpose((2, 0, 1))
@@ -156,9 +156,7 @@ class YoloV4_COCO(Yolov4):
         with autocast:
             cast_network(self, dtype)
             for image_batch in batch_generator(images, self.batch_size):
-                converted_images = thread_pool_processing(
-                    lambda x: convert_image(load_image(x)), image_batch
-                )
+                converted_images = thread_pool_processing(load_rgb_image, image_batch)
                 batches = torch.vstack(
                     thread_pool_processing(self.data_preprocessing, converted_images)
                 )
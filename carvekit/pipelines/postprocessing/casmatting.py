@@ -5,19 +5,19 @@ License: Apache License 2.0
 """
 from carvekit.ml.wrap.fba_matting import FBAMatting
 from carvekit.ml.wrap.cascadepsp import CascadePSP
-from typing import Union, List
+from typing import Union, List, Optional
+import numpy as np
 from PIL import Image
 from pathlib import Path
+from carvekit.pipelines.postprocessing.matting import MattingMethod
 from carvekit.trimap.cv_gen import CV2TrimapGenerator
 from carvekit.trimap.generator import TrimapGenerator
-from carvekit.utils.mask_utils import apply_mask
-from carvekit.utils.pool_utils import thread_pool_processing
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.timing_utils import stage_timer
 
 __all__ = ["CasMattingMethod"]
 
 
-class CasMattingMethod:
+class CasMattingMethod(MattingMethod):
     """
     Improve segmentation quality by refining segmentation with the CascadePSP model
     and post-processing the segmentation with the FBAMatting model
@@ -29,6 +29,8 @@ class CasMattingMethod:
         matting_module: Union[FBAMatting],
         trimap_generator: Union[TrimapGenerator, CV2TrimapGenerator],
         device="cpu",
+        disable_noise_filter: Optional[bool] = None,
+        mask_binary_threshold: Optional[int] = None,
     ):
         """
         Initializes CasMattingMethod class.
@@ -38,16 +40,41 @@ class CasMattingMethod:
             matting_module: Initialized matting neural network class
             trimap_generator: Initialized trimap generator class
             device: Processing device used for applying mask to image
+            disable_noise_filter: overrides the matting module setting on each call,
+                so modules shared between methods aren't modified
+            mask_binary_threshold: overrides the refining module setting on each call
         """
-        self.device = device
+        super().__init__(
+            matting_module=matting_module,
+            trimap_generator=trimap_generator,
+            device=device,
+            disable_noise_filter=disable_noise_filter,
+        )
         self.refining_module = refining_module
-        self.matting_module = matting_module
-        self.trimap_generator = trimap_generator
+        self.mask_binary_threshold = mask_binary_threshold
+
+    def refine(
+        self, images: List[Image.Image], masks: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        Refines the masks with the refining network
+
+        Args:
+            images: list of images returned by prepare
+            masks: list of masks
+
+        Returns:
+            list of refined masks
+        """
+        with stage_timer("refine"):
+            return self.refining_module(
+                images, masks, mask_binary_threshold=self.mask_binary_threshold
+            )
 
     def __call__(
         self,
         images: List[Union[str, Path, Image.Image]],
-        masks: List[Union[str, Path, Image.Image]],
+        masks: List[Union[str, Path, Image.Image, np.ndarray]],
     ):
         """
         Passes data through apply_mask function
@@ -61,23 +88,8 @@ class CasMattingMethod:
         """
         if len(images) != len(masks):
             raise ValueError("Images and Masks lists should have same length!")
-        images = thread_pool_processing(lambda x: convert_image(load_image(x)), images)
-        masks = thread_pool_processing(
-            lambda x: convert_image(load_image(x), mode="L"), masks
-        )
-        refined_masks = self.refining_module(images, masks)
-        trimaps = thread_pool_processing(
-            lambda x: self.trimap_generator(
-                original_image=images[x], mask=refined_masks[x]
-            ),
-            range(len(images)),
-        )
-        alpha = self.matting_module(images=images, trimaps=trimaps)
-        return list(
-            map(
-                lambda x: apply_mask(
-                    image=images[x], mask=alpha[x], device=self.device
-                ),
-                range(len(images)),
-            )
-        )
+        images, masks = self.prepare(images, masks)
+        refined_masks = self.refine(images, masks)
+        trimaps = self.generate_trimaps(images, refined_masks)
+        alpha = self.matting(images, trimaps)
+        return self.apply_masks(images, alpha)
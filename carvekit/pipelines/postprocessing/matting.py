@@ -4,14 +4,16 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 from carvekit.ml.wrap.fba_matting import FBAMatting
-from typing import Union, List
+from typing import Union, List, Optional, Tuple
+import numpy as np
 from PIL import Image
 from pathlib import Path
 from carvekit.trimap.cv_gen import CV2TrimapGenerator
 from carvekit.trimap.generator import TrimapGenerator
-from carvekit.utils.mask_utils import apply_mask
+from carvekit.utils.mask_utils import apply_mask, load_mask
 from carvekit.utils.pool_utils import thread_pool_processing
-from carvekit.utils.image_utils import load_image, convert_image
+from carvekit.utils.image_utils import load_rgb_image
+from carvekit.utils.timing_utils import stage_timer
 
 __all__ = ["MattingMethod"]
 
@@ -28,6 +30,8 @@ class MattingMethod:
         matting_module: Union[FBAMatting],
         trimap_generator: Union[TrimapGenerator, CV2TrimapGenerator],
         device="cpu",
+        disable_noise_filter: Optional[bool] = None,
+        input_image_size: Optional[Union[List[int], int]] = None,
     ):
         """
         Initializes Matting Method class.
@@ -36,15 +40,105 @@ class MattingMethod:
             matting_module: Initialized matting neural network class
             trimap_generator: Initialized trimap generator class
             device: Processing device used for applying mask to image
+            disable_noise_filter: overrides the matting module setting on each call,
+                so modules shared between methods aren't modified
+            input_image_size: overrides input image size of the matting module on each call
         """
         self.device = device
         self.matting_module = matting_module
         self.trimap_generator = trimap_generator
+        self.disable_noise_filter = disable_noise_filter
+        self.input_image_size = input_image_size
+
+    def prepare(
+        self,
+        images: List[Union[str, Path, Image.Image]],
+        masks: List[Union[str, Path, Image.Image, np.ndarray]],
+    ) -> Tuple[List[Image.Image], List[np.ndarray]]:
+        """
+        Loads images and masks for the next stages
+
+        Args:
+            images: list of images
+            masks: list of masks
+
+        Returns:
+            RGB images and masks as uint8 arrays, which are passed between the stages.
+            PreparedImage instances are kept, so the networks reuse their resized variants
+        """
+        images = thread_pool_processing(load_rgb_image, images)
+        masks = thread_pool_processing(load_mask, masks)
+        return images, masks
+
+    def generate_trimaps(
+        self, images: List[Image.Image], masks: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        Generates trimaps from the masks
+
+        Args:
+            images: list of images returned by prepare
+            masks: list of masks
+
+        Returns:
+            list of trimaps
+        """
+        with stage_timer("trimap"):
+            return thread_pool_processing(
+                lambda x: self.trimap_generator(
+                    original_image=images[x], mask=masks[x]
+                ),
+                range(len(images)),
+            )
+
+    def matting(
+        self, images: List[Image.Image], trimaps: List[np.ndarray]
+    ) -> List[np.ndarray]:
+        """
+        Passes images and their trimaps through the matting network
+
+        Args:
+            images: list of images returned by prepare
+            trimaps: list of trimaps
+
+        Returns:
+            list of alpha masks
+        """
+        # Size is passed only if it is set, so other matting modules keep working
+        options = {}
+        if self.input_image_size is not None:
+            options["input_image_size"] = self.input_image_size
+        with stage_timer("matting"):
+            return self.matting_module(
+                images=images,
+                trimaps=trimaps,
+                disable_noise_filter=self.disable_noise_filter,
+                **options,
+            )
+
+    def apply_masks(
+        self, images: List[Image.Image], alpha: List[np.ndarray]
+    ) -> List[Image.Image]:
+        """
+        Applies alpha masks to the images
+
+        Args:
+            images: list of images returned by prepare
+            alpha: list of alpha masks
+
+        Returns:
+            list of images without background
+        """
+        with stage_timer("apply_mask"):
+            return [
+                apply_mask(image=image, mask=mask, device=self.device)
+                for image, mask in zip(images, alpha)
+            ]
 
     def __call__(
         self,
         images: List[Union[str, Path, Image.Image]],
-        masks: List[Union[str, Path, Image.Image]],
+        masks: List[Union[str, Path, Image.Image, np.ndarray]],
     ):
         """
         Passes data through apply_mask function
@@ -58,20 +152,7 @@ class MattingMethod:
         """
         if len(images) != len(masks):
             raise ValueError("Images and Masks lists should have same length!")
-        images = thread_pool_processing(lambda x: convert_image(load_image(x)), images)
-        masks = thread_pool_processing(
-            lambda x: convert_image(load_image(x), mode="L"), masks
-        )
-        trimaps = thread_pool_processing(
-            lambda x: self.trimap_generator(original_image=images[x], mask=masks[x]),
-            range(len(images)),
-        )
-        alpha = self.matting_module(images=images, trimaps=trimaps)
-        return list(
-            map(
-                lambda x: apply_mask(
-                    image=images[x], mask=alpha[x], device=self.device
-                ),
-                range(len(images)),
-            )
-        )
+        images, masks = self.prepare(images, masks)
+        trimaps = self.generate_trimaps(images, masks)
+        alpha = self.matting(images, trimaps)
+        return self.apply_masks(images, alpha)
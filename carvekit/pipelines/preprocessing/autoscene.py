@@ -6,11 +6,13 @@ License: Apache License 2.0
 from pathlib import Path
 
 from PIL import Image
-from typing import Union, List
+from typing import Union, List, Optional
 
 from carvekit.ml.wrap.scene_classifier import SceneClassifier
 from carvekit.ml.wrap.tracer_b7 import TracerUniversalB7
 from carvekit.ml.wrap.isnet import ISNet
+from carvekit.utils.models_utils import model_registry
+from carvekit.utils.timing_utils import stage_timer
 
 __all__ = ["AutoScene"]
 
@@ -18,12 +20,37 @@ __all__ = ["AutoScene"]
 class AutoScene:
     """AutoScene preprocessing method"""
 
-    def __init__(self, scene_classifier: SceneClassifier):
+    def __init__(
+        self,
+        scene_classifier: SceneClassifier,
+        networks: Optional[List[Union[TracerUniversalB7, ISNet]]] = None,
+    ):
         """
         Args:
             scene_classifier: SceneClassifier instance
+            networks: resident segmentation networks. Other networks are taken from
+                the process-wide model registry
         """
         self.scene_classifier = scene_classifier
+        self.networks = networks or []
+
+    def resident_network(self, interface, net):
+        """
+        Returns already loaded instance of the network
+
+        Args:
+            interface: Interface instance
+            net: network class
+
+        Returns:
+            network instance or None if the network is not loaded
+        """
+        if isinstance(interface.segmentation_pipeline, net):
+            return interface.segmentation_pipeline
+        for network in self.networks:
+            if isinstance(network, net):
+                return network
+        return None
 
     @staticmethod
     def select_net(scene: str):
@@ -51,35 +78,28 @@ class AutoScene:
         Returns:
             list of masks
         """
-        scene_analysis = self.scene_classifier(images)
-        images_per_scene = {}
-        for i, image in enumerate(images):
-            scene_name = scene_analysis[i][0][0]
-            if scene_name not in images_per_scene:
-                images_per_scene[scene_name] = []
-            images_per_scene[scene_name].append(image)
-
-        masks_per_scene = {}
-        for scene_name, igs in list(images_per_scene.items()):
+        with stage_timer("scene_classification"):
+            scene_analysis = self.scene_classifier(images)
+        indices_per_scene = {}
+        for i in range(len(images)):
+            indices_per_scene.setdefault(scene_analysis[i][0][0], []).append(i)
+
+        masks = [None] * len(images)
+        for scene_name, indices in indices_per_scene.items():
             net = self.select_net(scene_name)
-            if isinstance(interface.segmentation_pipeline, net):
-                masks_per_scene[scene_name] = interface.segmentation_pipeline(igs)
-            else:
-                old_device = interface.segmentation_pipeline.device
-                interface.segmentation_pipeline.to(
-                    "cpu"
-                )  # unload model from gpu, to avoid OOM
-                net_instance = net(device=old_device)
-                masks_per_scene[scene_name] = net_instance(igs)
-                del net_instance
-                interface.segmentation_pipeline.to(old_device)  # load model back to gpu
-
-        # restore one list of masks with the same order as images
-        masks = []
-        for i, image in enumerate(images):
-            scene_name = scene_analysis[i][0][0]
-            masks.append(
-                masks_per_scene[scene_name][images_per_scene[scene_name].index(image)]
-            )
+            net_instance = self.resident_network(interface, net)
+            if net_instance is None:
+                # Registry keeps the network on its device within the memory budget
+                seg_pipe = interface.segmentation_pipeline
+                net_instance = model_registry.get(
+                    net,
+                    device=seg_pipe.device,
+                    batch_size=seg_pipe.batch_size,
+                    fp16=seg_pipe.fp16,
+                )
+            scene_masks = net_instance([images[i] for i in indices])
+            # restore one list of masks with the same order as images
+            for i, mask in zip(indices, scene_masks):
+                masks[i] = mask
 
         return masks
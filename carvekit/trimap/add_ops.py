@@ -3,12 +3,32 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from typing import Union
+
 import cv2
 import numpy as np
 from PIL import Image
 
+from carvekit.utils.mask_utils import to_mask_array
+
+Mask = Union[Image.Image, np.ndarray]
+
+
+def as_mask_type(array: np.ndarray, mask: Mask) -> Mask:
+    """
+    Returns the array in the same format as the input mask of the operation
+
+    Args:
+        array: uint8 array of (H, W) shape
+        mask: input mask of the operation
+
+    Returns:
+        the array itself or L mode PIL image
+    """
+    return array if isinstance(mask, np.ndarray) else Image.fromarray(array)
+
 
-def prob_filter(mask: Image.Image, prob_threshold=231) -> Image.Image:
+def prob_filter(mask: Mask, prob_threshold=231) -> Mask:
     """
     Applies a filter to the mask by the probability of locating an object in the object area.
 
@@ -22,16 +42,12 @@ def prob_filter(mask: Image.Image, prob_threshold=231) -> Image.Image:
     Returns:
         Generated trimap for image.
     """
-    if mask.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
-    # noinspection PyTypeChecker
-    mask_array = np.array(mask)
-    mask_array[mask_array > prob_threshold] = 255  # Probability filter for mask
-    mask_array[mask_array <= prob_threshold] = 0
-    return Image.fromarray(mask_array).convert("L")
+    mask_array = to_mask_array(mask)
+    mask_array = np.where(mask_array > prob_threshold, 255, 0).astype(np.uint8)
+    return as_mask_type(mask_array, mask)
 
 
-def low_prob_filter(mask: Image.Image, filter_threshold=-1) -> Image.Image:
+def low_prob_filter(mask: Mask, filter_threshold=-1) -> Mask:
     """
     Applies a filter to the mask by the probability of locating an object in the object area.
 
@@ -45,17 +61,13 @@ def low_prob_filter(mask: Image.Image, filter_threshold=-1) -> Image.Image:
     Returns:
         Generated trimap for image.
     """
-    if mask.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
-    # noinspection PyTypeChecker
-    mask_array = np.array(mask)
-    mask_array[mask_array <= filter_threshold] = 0
-    return Image.fromarray(mask_array).convert("L")
+    mask_array = to_mask_array(mask)
+    if filter_threshold >= 0:
+        mask_array = np.where(mask_array <= filter_threshold, 0, mask_array)
+    return as_mask_type(mask_array, mask)
 
 
-def prob_as_unknown_area(
-    trimap: Image.Image, mask: Image.Image, prob_threshold=255
-) -> Image.Image:
+def prob_as_unknown_area(trimap: Mask, mask: Mask, prob_threshold=255) -> Mask:
     """
     Marks any uncertainty in the seg mask as an unknown region.
 
@@ -70,17 +82,13 @@ def prob_as_unknown_area(
     Returns:
         Generated trimap for image.
     """
-    if mask.mode != "L" or trimap.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
-    # noinspection PyTypeChecker
-    mask_array = np.array(mask)
-    # noinspection PyTypeChecker
-    trimap_array = np.array(trimap)
+    mask_array = to_mask_array(mask)
+    trimap_array = np.array(to_mask_array(trimap))
     trimap_array[np.logical_and(mask_array <= prob_threshold, mask_array > 0)] = 128
-    return Image.fromarray(trimap_array).convert("L")
+    return as_mask_type(trimap_array, trimap)
 
 
-def post_erosion(trimap: Image.Image, erosion_iters=1) -> Image.Image:
+def post_erosion(trimap: Mask, erosion_iters=1) -> Mask:
     """
     Performs erosion on the mask and marks the resulting area as an unknown region.
 
@@ -93,21 +101,16 @@ def post_erosion(trimap: Image.Image, erosion_iters=1) -> Image.Image:
     Returns:
         Generated trimap for image.
     """
-    if trimap.mode != "L":
-        raise ValueError("Input mask has wrong color mode.")
-    # noinspection PyTypeChecker
-    trimap_array = np.array(trimap)
+    trimap_array = to_mask_array(trimap)
     if erosion_iters > 0:
-        without_unknown_area = trimap_array.copy()
-        without_unknown_area[without_unknown_area == 128] = 0
+        without_unknown_area = np.where(trimap_array == 128, 0, trimap_array)
 
         erosion_kernel = np.ones((3, 3), np.uint8)
         erode = cv2.erode(
             without_unknown_area, erosion_kernel, iterations=erosion_iters
         )
         erode = np.where(erode == 0, 0, without_unknown_area)
-        trimap_array[np.logical_and(erode == 0, without_unknown_area > 0)] = 128
-        erode = trimap_array.copy()
-    else:
-        erode = trimap_array.copy()
-    return Image.fromarray(erode).convert("L")
+        trimap_array = np.where(
+            np.logical_and(erode == 0, without_unknown_area > 0), 128, trimap_array
+        )
+    return as_mask_type(trimap_array, trimap)
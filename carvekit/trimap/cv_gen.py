@@ -3,10 +3,14 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from typing import Union
+
 import PIL.Image
 import cv2
 import numpy as np
 
+from carvekit.utils.mask_utils import to_mask_array
+
 
 class CV2TrimapGenerator:
     def __init__(self, kernel_size: int = 30, erosion_iters: int = 1):
@@ -23,25 +27,24 @@ class CV2TrimapGenerator:
         self.erosion_iters = erosion_iters
 
     def __call__(
-        self, original_image: PIL.Image.Image, mask: PIL.Image.Image
-    ) -> PIL.Image.Image:
+        self,
+        original_image: PIL.Image.Image,
+        mask: Union[PIL.Image.Image, np.ndarray],
+    ) -> Union[PIL.Image.Image, np.ndarray]:
         """
         Generates trimap based on predicted object mask to refine object mask borders.
         Based on cv2 erosion algorithm.
 
         Args:
             original_image: Original image
-            mask: Predicted object mask
+            mask: Predicted object mask as L mode PIL image or uint8 array
 
         Returns:
-            Generated trimap for image.
+            Generated trimap for image in the same format as the mask.
         """
-        if mask.mode != "L":
-            raise ValueError("Input mask has wrong color mode.")
-        if mask.size != original_image.size:
+        mask_array = to_mask_array(mask)
+        if mask_array.shape[::-1] != original_image.size:
             raise ValueError("Sizes of input image and predicted mask doesn't equal")
-        # noinspection PyTypeChecker
-        mask_array = np.array(mask)
         pixels = 2 * self.kernel_size + 1
         kernel = np.ones((pixels, pixels), np.uint8)
 
@@ -50,7 +53,7 @@ class CV2TrimapGenerator:
             erode = cv2.erode(mask_array, erosion_kernel, iterations=self.erosion_iters)
             erode = np.where(erode == 0, 0, mask_array)
         else:
-            erode = mask_array.copy()
+            erode = mask_array
 
         dilation = cv2.dilate(erode, kernel, iterations=1)
 
@@ -61,4 +64,6 @@ class CV2TrimapGenerator:
         trimap = np.where(trimap > 200, 0, trimap)  # Embelishment
         trimap = np.where(trimap == 200, 255, trimap)  # GRAY to WHITE
 
-        return PIL.Image.fromarray(trimap).convert("L")
+        if isinstance(mask, np.ndarray):
+            return trimap
+        return PIL.Image.fromarray(trimap)
@@ -3,15 +3,20 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from typing import Union
+
+import numpy as np
 from PIL import Image
 
 from carvekit.trimap.add_ops import (
+    as_mask_type,
     prob_filter,
     prob_as_unknown_area,
     post_erosion,
     low_prob_filter,
 )
 from carvekit.trimap.cv_gen import CV2TrimapGenerator
+from carvekit.utils.mask_utils import to_mask_array
 
 
 class TrimapGenerator(CV2TrimapGenerator):
@@ -39,23 +44,28 @@ class TrimapGenerator(CV2TrimapGenerator):
         self.__erosion_iters = erosion_iters
         self.filter_threshold = filter_threshold
 
-    def __call__(self, original_image: Image.Image, mask: Image.Image) -> Image.Image:
+    def __call__(
+        self, original_image: Image.Image, mask: Union[Image.Image, np.ndarray]
+    ) -> Union[Image.Image, np.ndarray]:
         """
         Generates trimap based on predicted object mask to refine object mask borders.
         Based on cv2 erosion algorithm and additional prob. filters.
         Args:
             original_image: Original image
-            mask: Predicted object mask
+            mask: Predicted object mask as L mode PIL image or uint8 array
 
         Returns:
-            Generated trimap for image.
+            Generated trimap for image in the same format as the mask.
         """
-        mask = low_prob_filter(mask, self.filter_threshold)  # filter low prob noise
+        mask_array = low_prob_filter(
+            to_mask_array(mask), self.filter_threshold
+        )  # filter low prob noise
 
-        filter_mask = prob_filter(mask=mask, prob_threshold=self.prob_threshold)
+        # Operations are chained on arrays, PIL image is created only for PIL masks
+        filter_mask = prob_filter(mask=mask_array, prob_threshold=self.prob_threshold)
         trimap = super(TrimapGenerator, self).__call__(original_image, filter_mask)
         new_trimap = prob_as_unknown_area(
-            trimap=trimap, mask=mask, prob_threshold=self.prob_threshold
+            trimap=trimap, mask=mask_array, prob_threshold=self.prob_threshold
         )
         new_trimap = post_erosion(new_trimap, self.__erosion_iters)
-        return new_trimap
+        return as_mask_type(new_trimap, mask)
@@ -4,13 +4,17 @@
     License: Apache License 2.0
 """
 
+import math
 import pathlib
-from typing import Union, Any, Tuple
+import threading
+from typing import Union, Any, Tuple, Dict, Callable, Optional, List
 
 import PIL.Image
 import numpy as np
 import torch
 
+from carvekit.utils.pool_utils import thread_pool_processing
+
 ALLOWED_SUFFIXES = [".jpg", ".jpeg", ".bmp", ".png", ".webp"]
 
 
@@ -27,14 +31,16 @@ def to_tensor(x: Any) -> torch.Tensor:
     return torch.tensor(np.array(x, copy=True))
 
 
-def load_image(file: Union[str, pathlib.Path, PIL.Image.Image]) -> PIL.Image.Image:
+def load_image(
+    file: Union[str, pathlib.Path, PIL.Image.Image, "PreparedImage"]
+) -> PIL.Image.Image:
     """Returns a PIL.Image.Image class by string path or pathlib path or PIL.Image.Image instance
 
     Args:
-        file: File path or PIL.Image.Image instance
+        file: File path, PIL.Image.Image or PreparedImage instance
 
     Returns:
-        PIL.Image.Image instance
+        PIL.Image.Image instance. Decoded image is returned for PreparedImage
 
     Raises:
         ValueError: If file not exists or file is directory or file isn't an image or file is not correct PIL Image
@@ -44,29 +50,272 @@ def load_image(file: Union[str, pathlib.Path, PIL.Image.Image]) -> PIL.Image.Ima
         return PIL.Image.open(file)
     elif isinstance(file, PIL.Image.Image):
         return file
+    elif isinstance(file, PreparedImage):
+        return file.image
     elif isinstance(file, pathlib.Path) and is_image_valid(file):
         return PIL.Image.open(str(file))
     else:
         raise ValueError("Unknown input file type")
 
 
-def convert_image(image: PIL.Image.Image, mode="RGB") -> PIL.Image.Image:
+def convert_image(
+    image: Union[PIL.Image.Image, "PreparedImage"], mode="RGB"
+) -> PIL.Image.Image:
     """Performs image conversion to correct color mode
 
     Args:
-        image: PIL.Image.Image instance
+        image: PIL.Image.Image or PreparedImage instance
         mode: Colort Mode to convert
 
     Returns:
-        PIL.Image.Image instance
+        PIL.Image.Image instance. Decoded image of PreparedImage is returned without copying,
+        if it has the same color mode
 
     Raises:
         ValueError: If image hasn't convertable color mode, or it is too small
     """
+    if isinstance(image, PreparedImage):
+        if is_image_valid(image.image) and image.mode == mode:
+            return image.image
+        image = image.image
     if is_image_valid(image):
         return image.convert(mode)
 
 
+def load_rgb_image(
+    file: Union[str, pathlib.Path, PIL.Image.Image, "PreparedImage"]
+) -> Union[PIL.Image.Image, "PreparedImage"]:
+    """Loads the input image of a neural network
+
+    Args:
+        file: File path, PIL.Image.Image or PreparedImage instance
+
+    Returns:
+        RGB PIL.Image.Image instance. PreparedImage is returned as is,
+        so resize_image and thumbnail_image reuse its memoized variants
+
+    Raises:
+        ValueError: If file isn't a valid image
+    """
+    if isinstance(file, PreparedImage):
+        return file
+    return convert_image(load_image(file))
+
+
+class PreparedImage:
+    """
+    RGB image, which is decoded once and memoizes its resized variants.
+
+    Notes:
+        Interfaces pass it to every stage instead of the input image. load_image and
+        convert_image return the decoded PIL image, while resize_image and thumbnail_image
+        return copies of memoized variants, so every stage, which needs the image in the same size,
+        copies the small variant instead of resizing the full resolution image again.
+        Decoded image is shared by all stages like the input image of load_image,
+        so it must not be modified in place.
+    """
+
+    def __init__(self, image: Union[str, pathlib.Path, PIL.Image.Image]):
+        """
+        Args:
+            image: File path or PIL.Image.Image instance
+
+        Raises:
+            ValueError: If file not exists or file is directory or file isn't an image
+        """
+        image = load_image(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.load()
+        self.image = image
+        self.lock = threading.Lock()
+        self.variants: Dict[tuple, PIL.Image.Image] = {}
+
+    def __getstate__(self):
+        return {"image": self.image}
+
+    def __setstate__(self, state):
+        self.image = state["image"]
+        self.lock = threading.Lock()
+        self.variants = {}
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Image size"""
+        return self.image.size
+
+    @property
+    def mode(self) -> str:
+        """Image color mode"""
+        return self.image.mode
+
+    def _variant(
+        self, key: tuple, make: Callable[[], PIL.Image.Image]
+    ) -> PIL.Image.Image:
+        """
+        Returns memoized variant of the image
+
+        Args:
+            key: variant key
+            make: function, which computes the variant
+
+        Returns:
+            copy of the memoized variant, which can be modified by the caller
+        """
+        with self.lock:
+            variant = self.variants.get(key)
+        if variant is None:
+            variant = make()
+            with self.lock:
+                variant = self.variants.setdefault(key, variant)
+        return variant.copy()
+
+    def resize(
+        self,
+        size: Tuple[int, int],
+        resample: int = PIL.Image.Resampling.BICUBIC,
+    ) -> PIL.Image.Image:
+        """
+        Returns a resized copy of the image, like PIL.Image.Image.resize
+
+        Args:
+            size: size of the copy
+            resample: resampling filter
+
+        Returns:
+            copy of the memoized image of the size
+        """
+        return self._variant(
+            ("resize", tuple(size), int(resample)),
+            lambda: self.image.resize(size, resample),
+        )
+
+    def thumbnail(
+        self, size: Tuple[int, int], resample: int = PIL.Image.Resampling.BICUBIC
+    ) -> PIL.Image.Image:
+        """
+        Returns a copy of the image, which is resized by PIL.Image.Image.thumbnail
+
+        Args:
+            size: maximum size of the copy
+            resample: resampling filter
+
+        Returns:
+            copy of the memoized image, which fits into the size and keeps the aspect ratio
+        """
+
+        def make():
+            variant = self.image.copy()
+            variant.thumbnail(size, resample=resample)
+            return variant
+
+        return self._variant(("thumbnail", tuple(size), int(resample)), make)
+
+
+def prepare_image(file: Union[str, pathlib.Path, PIL.Image.Image]) -> PreparedImage:
+    """Returns a PreparedImage by string path or pathlib path or PIL.Image.Image instance
+
+    Args:
+        file: File path, PIL.Image.Image or PreparedImage instance
+
+    Returns:
+        PreparedImage instance, which is the file itself if it is already prepared
+
+    Raises:
+        ValueError: If file not exists or file is directory or file isn't an image
+    """
+    if isinstance(file, PreparedImage):
+        return file
+    return PreparedImage(file)
+
+
+def prepare_images(
+    files: List[Union[str, pathlib.Path, PIL.Image.Image]]
+) -> List[PreparedImage]:
+    """Prepares images in the thread pool. Repeated objects are prepared once and share
+    the PreparedImage, so the same lazily loaded image isn't decoded concurrently.
+
+    Args:
+        files: list of file paths, PIL.Image.Image or PreparedImage instances
+
+    Returns:
+        list of PreparedImage instances
+
+    Raises:
+        ValueError: If file not exists or file is directory or file isn't an image
+    """
+    unique = list({id(file): file for file in files}.values())
+    prepared = dict(zip(map(id, unique), thread_pool_processing(prepare_image, unique)))
+    return [prepared[id(file)] for file in files]
+
+
+def thumbnail_image(
+    image: Union[PIL.Image.Image, PreparedImage],
+    size: Tuple[int, int],
+    resample: int = PIL.Image.Resampling.BICUBIC,
+) -> PIL.Image.Image:
+    """Returns a copy of the image, which fits into the size and keeps the aspect ratio
+
+    Args:
+        image: PIL.Image.Image or PreparedImage instance
+        size: maximum size of the copy
+        resample: resampling filter
+
+    Returns:
+        PIL.Image.Image instance. Copies of PreparedImage are memoized
+    """
+    if isinstance(image, PreparedImage):
+        return image.thumbnail(size, resample=resample)
+    copy = image.copy()
+    copy.thumbnail(size, resample=resample)
+    return copy
+
+
+def resize_image(
+    image: Union[PIL.Image.Image, PreparedImage],
+    size: Tuple[int, int],
+    resample: int = PIL.Image.Resampling.BICUBIC,
+) -> PIL.Image.Image:
+    """Returns a resized copy of the image
+
+    Args:
+        image: PIL.Image.Image or PreparedImage instance
+        size: size of the copy
+        resample: resampling filter
+
+    Returns:
+        PIL.Image.Image instance. Copies of PreparedImage are memoized
+    """
+    return image.resize(size, resample)
+
+
+def thumbnail_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Returns size of the copy, which is made by PIL.Image.Image.thumbnail,
+    so masks as arrays are resized to the same size as their images
+
+    Args:
+        size: image size
+        max_size: maximum size of the copy
+
+    Returns:
+        size, which fits into max_size and keeps the aspect ratio
+    """
+    width, height = size
+    x, y = map(math.floor, max_size)
+    if x >= width and y >= height:
+        return width, height
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
 def is_image_valid(image: Union[pathlib.Path, PIL.Image.Image]) -> bool:
     """This function performs image validation.
 
@@ -3,15 +3,106 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import pathlib
+from typing import Union, Tuple
+
 import PIL.Image
+import cv2
+import numpy as np
 import torch
-from carvekit.utils.image_utils import to_tensor
+from carvekit.utils.image_utils import to_tensor, load_image, is_image_valid
+
+
+def to_mask_array(mask: Union[PIL.Image.Image, np.ndarray]) -> np.ndarray:
+    """
+    Returns the mask as an array, which is the internal mask format of the pipelines.
+
+    Args:
+        mask: L mode PIL image or uint8 array of (H, W) shape
+
+    Returns:
+        uint8 array of (H, W) shape. Arrays are returned without copying
+
+    Raises:
+        ValueError: If mask has wrong color mode
+    """
+    if isinstance(mask, np.ndarray):
+        if mask.dtype != np.uint8 or mask.ndim != 2:
+            raise ValueError("Input mask has wrong color mode.")
+        return mask
+    if mask.mode != "L":
+        raise ValueError("Input mask has wrong color mode.")
+    return np.asarray(mask)
+
+
+def to_mask_image(mask: Union[PIL.Image.Image, np.ndarray]) -> PIL.Image.Image:
+    """
+    Returns the mask as an L mode PIL image.
+
+    Args:
+        mask: L mode PIL image or uint8 array of (H, W) shape
+
+    Returns:
+        L mode PIL image. Contiguous arrays are wrapped without copying
+
+    Raises:
+        ValueError: If mask has wrong color mode
+    """
+    if isinstance(mask, PIL.Image.Image):
+        if mask.mode != "L":
+            raise ValueError("Input mask has wrong color mode.")
+        return mask
+    return PIL.Image.fromarray(to_mask_array(mask))
+
+
+def load_mask(
+    mask: Union[str, pathlib.Path, PIL.Image.Image, np.ndarray]
+) -> np.ndarray:
+    """
+    Loads the mask and converts it to the internal mask format of the pipelines
+
+    Args:
+        mask: File path, PIL.Image.Image instance or uint8 array of (H, W) shape
+
+    Returns:
+        uint8 array of (H, W) shape
+
+    Raises:
+        ValueError: If file isn't a valid image or mask has wrong color mode
+    """
+    if isinstance(mask, np.ndarray):
+        return to_mask_array(mask)
+    mask = load_image(mask)
+    if is_image_valid(mask) and mask.mode != "L":
+        mask = mask.convert("L")
+    return to_mask_array(mask)
+
+
+def resize_mask(mask: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Resizes the mask. Area interpolation is used for downscaling and bicubic one for upscaling,
+    which is close to the antialiased bicubic resampling of PIL.Image.Image.resize.
+
+    Args:
+        mask: uint8 array of (H, W) shape
+        size: new size as (width, height)
+
+    Returns:
+        uint8 array of (height, width) shape. Mask of this size already is returned as is
+    """
+    height, width = mask.shape
+    size = tuple(size)
+    if size == (width, height):
+        return mask
+    if size[0] <= width and size[1] <= height:
+        return cv2.resize(mask, size, interpolation=cv2.INTER_AREA)
+    return cv2.resize(mask, size, interpolation=cv2.INTER_CUBIC)
 
 
 def composite(
     foreground: PIL.Image.Image,
     background: PIL.Image.Image,
-    alpha: PIL.Image.Image,
+    alpha: Union[PIL.Image.Image, np.ndarray],
     device="cpu",
 ):
     """
@@ -22,7 +113,7 @@ def composite(
         device: Processing device
         foreground: Image that will be pasted to background image with following alpha mask.
         background: Background image
-        alpha: Alpha Image
+        alpha: Alpha Image or uint8 alpha array of (H, W) shape
 
     Returns:
         Composited image as PIL.Image instance.
@@ -30,41 +121,37 @@ def composite(
 
     foreground = foreground.convert("RGBA")
     background = background.convert("RGBA")
-    alpha_rgba = alpha.convert("RGBA")
-    alpha_l = alpha.convert("L")
+    if isinstance(alpha, PIL.Image.Image) and alpha.mode != "L":
+        alpha = alpha.convert("L")
 
     fg = to_tensor(foreground).to(device)
-    alpha_rgba = to_tensor(alpha_rgba).to(device)
-    alpha_l = to_tensor(alpha_l).to(device)
     bg = to_tensor(background).to(device)
+    alpha_l = torch.tensor(to_mask_array(alpha), device=device)[:, :, None] / 255
 
-    alpha_l = alpha_l / 255
-    alpha_rgba = alpha_rgba / 255
+    bg[:, :, :3] = alpha_l * fg[:, :, :3] + (1 - alpha_l) * bg[:, :, :3]
+    bg[:, :, 3] = alpha_l[:, :, 0] * 255
 
-    bg = torch.where(torch.logical_not(alpha_rgba >= 1), bg, fg)
-    bg[:, :, 0] = alpha_l[:, :] * fg[:, :, 0] + (1 - alpha_l[:, :]) * bg[:, :, 0]
-    bg[:, :, 1] = alpha_l[:, :] * fg[:, :, 1] + (1 - alpha_l[:, :]) * bg[:, :, 1]
-    bg[:, :, 2] = alpha_l[:, :] * fg[:, :, 2] + (1 - alpha_l[:, :]) * bg[:, :, 2]
-    bg[:, :, 3] = alpha_l[:, :] * 255
-
-    del alpha_l, alpha_rgba, fg
+    del alpha_l, fg
     return PIL.Image.fromarray(bg.cpu().numpy()).convert("RGBA")
 
 
 def apply_mask(
-    image: PIL.Image.Image, mask: PIL.Image.Image, device="cpu"
+    image: PIL.Image.Image,
+    mask: Union[PIL.Image.Image, np.ndarray],
+    device="cpu",
 ) -> PIL.Image.Image:
     """
     Applies mask to foreground.
 
     Args:
         device: Processing device.
-        image: Image with background.
-        mask: Alpha Channel mask for this image.
+        image: Image with background as PIL image or PreparedImage.
+        mask: Alpha Channel mask for this image as PIL image or uint8 array of (H, W) shape.
 
     Returns:
         Image without background, where mask was black.
     """
+    image = load_image(image)
     background = PIL.Image.new("RGBA", image.size, color=(130, 130, 130, 0))
     return composite(image, background, mask, device=device).convert("RGBA")
 
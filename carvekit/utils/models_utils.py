@@ -5,8 +5,11 @@ License: Apache License 2.0
 """
 
 import random
+import threading
 import warnings
-from typing import Union, Tuple, Any
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Union, Tuple, Any, Optional, Type, Dict, Set, List
 
 import torch
 from torch import autocast
@@ -123,3 +126,214 @@ def suppress_warnings():
         "in nn.MaxPool2d in a future release.",
         module="torch",
     )
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded models.
+
+    Notes:
+        Models are keyed by their class and constructor arguments, so each model with
+        the same config is loaded only once. Least recently used models are evicted,
+        when the size of their weights exceeds the memory budget. Evicted models are freed
+        only when they aren't referenced anymore, so callers should fetch models through
+        the registry on each use. Models, which are kept by interfaces for their lifetime,
+        are registered as resident: they are counted in the budget, but never evicted.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """
+        Args:
+            max_bytes: memory budget for model weights in bytes, None disables the limit
+        """
+        self.lock = threading.RLock()
+        self._models: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._resident: Set[tuple] = set()
+        self._loading: Dict[tuple, Future] = {}
+        self._bytes = 0
+        self._max_bytes = max_bytes
+
+    @property
+    def max_bytes(self) -> Optional[int]:
+        """Memory budget for model weights in bytes, None disables the limit"""
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: Optional[int]):
+        with self.lock:
+            self._max_bytes = value
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of resident model weights in bytes"""
+        return self._bytes
+
+    @staticmethod
+    def key(model_class: Type, **kwargs) -> tuple:
+        """
+        Returns registry key of the model
+
+        Args:
+            model_class: model class
+            **kwargs: model constructor arguments
+
+        Returns:
+            hashable key
+        """
+        return model_class, tuple(
+            sorted(
+                (name, tuple(value) if isinstance(value, list) else value)
+                for name, value in kwargs.items()
+            )
+        )
+
+    @staticmethod
+    def model_size(model: Any) -> int:
+        """
+        Computes size of the model weights
+
+        Args:
+            model: model instance
+
+        Returns:
+            size of parameters and buffers in bytes, 0 for objects which aren't torch modules
+        """
+        if not isinstance(model, torch.nn.Module):
+            return 0
+        return sum(
+            tensor.numel() * tensor.element_size()
+            for tensor in list(model.parameters()) + list(model.buffers())
+        )
+
+    def get(self, model_class: Type, **kwargs) -> Any:
+        """
+        Returns loaded model or loads it
+
+        Args:
+            model_class: model class
+            **kwargs: model constructor arguments
+
+        Returns:
+            model instance
+        """
+        return self._get(model_class, kwargs, resident=False)
+
+    def get_resident(self, model_class: Type, **kwargs) -> Any:
+        """
+        Returns loaded model or loads it and marks it as resident.
+        Resident models are never evicted, since interfaces keep references to them
+        and eviction wouldn't free their memory.
+
+        Args:
+            model_class: model class
+            **kwargs: model constructor arguments
+
+        Returns:
+            model instance
+        """
+        return self._get(model_class, kwargs, resident=True)
+
+    def _get(self, model_class: Type, kwargs: dict, resident: bool) -> Any:
+        key = self.key(model_class, **kwargs)
+        with self.lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                if resident:
+                    self._resident.add(key)
+                return entry[0]
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            # Concurrent callers wait for the same model instead of loading it twice
+            model = loading.result()
+            if resident:
+                with self.lock:
+                    if key in self._models:
+                        self._resident.add(key)
+            return model
+        # Loading takes seconds, so it is done without the lock and doesn't block
+        # callers of other models
+        try:
+            model = model_class(**kwargs)
+        except Exception as e:
+            with self.lock:
+                del self._loading[key]
+            loading.set_exception(e)
+            raise
+        size = self.model_size(model)
+        with self.lock:
+            del self._loading[key]
+            self._models[key] = model, size
+            self._bytes += size
+            if resident:
+                self._resident.add(key)
+            self._evict()
+        loading.set_result(model)
+        return model
+
+    def entries(self) -> List[Tuple[tuple, Any, bool]]:
+        """
+        Returns loaded models
+
+        Returns:
+            list of (key, model, resident) tuples from the least recently used model
+        """
+        with self.lock:
+            return [
+                (key, model, key in self._resident)
+                for key, (model, _) in self._models.items()
+            ]
+
+    def add(self, key: tuple, model: Any, resident: bool = False):
+        """
+        Registers already loaded model, like a model shared by another process
+
+        Args:
+            key: registry key returned by key
+            model: model instance
+            resident: marks the model as resident
+        """
+        size = self.model_size(model)
+        with self.lock:
+            if key in self._models:
+                return
+            self._models[key] = model, size
+            self._bytes += size
+            if resident:
+                self._resident.add(key)
+            self._evict()
+
+    def clear(self):
+        """Unloads all models"""
+        with self.lock:
+            self._models.clear()
+            self._resident.clear()
+            self._bytes = 0
+
+    def _evict(self):
+        """
+        Evicts least recently used models, which aren't resident.
+        The most recent model is always kept.
+        """
+        if self._max_bytes is None:
+            return
+        for key in list(self._models.keys())[:-1]:
+            if self._bytes <= self._max_bytes:
+                break
+            if key in self._resident:
+                continue
+            _, size = self._models.pop(key)
+            self._bytes -= size
+
+
+model_registry = ModelRegistry()
+"""Registry of models shared by all interfaces of the process"""
@@ -3,8 +3,10 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import queue
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator, List, Tuple, Callable
 
 
 def thread_pool_processing(func: Any, data: Iterable, workers=18):
@@ -38,3 +40,114 @@ def batch_generator(iterable, n=1):
     it = len(iterable)
     for ndx in range(0, it, n):
         yield iterable[ndx : min(ndx + n, it)]
+
+
+class _PipelineEnd:
+    """Marks the end of the pipeline input or its failure"""
+
+    def __init__(self, error: BaseException = None):
+        self.error = error
+
+
+def pipeline_processing(
+    data: Iterable,
+    stages: List[Tuple[Callable[[List[Any]], List[Any]], int]],
+    queue_size: int = 4,
+) -> Iterator[Any]:
+    """
+    Passes iterator data through the chain of stages, each of them runs in its own thread.
+    Stages are connected with bounded queues, so slow stages block the faster ones
+    and only a few items are in memory at once.
+
+    Args:
+        data: input iterator, it is consumed lazily
+        stages: list of (function, batch size). Function takes a list of items and
+            returns a list of the same length. Each stage takes all items waiting
+            in its input queue, up to the batch size
+        queue_size: maximum count of items waiting between two stages
+
+    Returns:
+        generator of the last stage outputs in the input order
+
+    Raises:
+        Exception: the first exception raised by the input iterator or by a stage
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(q: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _PipelineEnd()
+
+    def feed():
+        try:
+            for item in data:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            put(queues[0], _PipelineEnd(e))
+            return
+        put(queues[0], _PipelineEnd())
+
+    def run_stage(func, batch_size: int, q_in: queue.Queue, q_out: queue.Queue):
+        end = None
+        while end is None:
+            item = get(q_in)
+            if isinstance(item, _PipelineEnd):
+                put(q_out, item)
+                return
+            batch = [item]
+            while len(batch) < batch_size:
+                try:
+                    item = q_in.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(item, _PipelineEnd):
+                    end = item
+                    break
+                batch.append(item)
+            try:
+                outputs = func(batch)
+            except BaseException as e:
+                put(q_out, _PipelineEnd(e))
+                return
+            for output in outputs:
+                if not put(q_out, output):
+                    return
+        put(q_out, end)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    for idx, (func, batch_size) in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=run_stage,
+                args=(func, max(1, batch_size), queues[idx], queues[idx + 1]),
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if isinstance(item, _PipelineEnd):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        # Stops the threads, if the generator is closed before the end of the data
+        stop.set()
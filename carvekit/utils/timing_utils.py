@@ -0,0 +1,70 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+
+__all__ = [
+    "stage_listeners",
+    "add_stage_listener",
+    "remove_stage_listener",
+    "report_stage_time",
+    "stage_timer",
+]
+
+stage_listeners: List[Callable[[str, float], None]] = []
+"""Functions called with the stage name and its duration in seconds"""
+
+
+def add_stage_listener(listener: Callable[[str, float], None]):
+    """
+    Subscribes function to processing stage durations
+
+    Args:
+        listener: function, which accepts stage name and its duration in seconds
+    """
+    stage_listeners.append(listener)
+
+
+def remove_stage_listener(listener: Callable[[str, float], None]):
+    """
+    Unsubscribes function from processing stage durations
+
+    Args:
+        listener: previously added function
+    """
+    stage_listeners.remove(listener)
+
+
+def report_stage_time(stage: str, seconds: float):
+    """
+    Passes stage duration to all listeners
+
+    Args:
+        stage: stage name
+        seconds: stage duration in seconds
+    """
+    for listener in stage_listeners:
+        listener(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Measures duration of the code block and reports it to the stage listeners.
+    Does nothing if there are no listeners.
+
+    Args:
+        stage: stage name
+    """
+    if len(stage_listeners) == 0:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        report_stage_time(stage, time.perf_counter() - start)
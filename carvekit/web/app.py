@@ -1,13 +1,17 @@
 from pathlib import Path
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from starlette.staticfiles import StaticFiles
 
 from carvekit import version
-from carvekit.web.deps import config
+from carvekit.web.deps import config, image_fetcher, ml_processor
+from carvekit.web.responses.api import error_dict
 from carvekit.web.routers.api_router import api_router
+from carvekit.web.utils.rate_limit import RateLimitExceeded
 
 app = FastAPI(title="CarveKit Web API", version=version)
 
@@ -19,6 +23,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(RateLimitExceeded)
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        content=error_dict("Rate limit exceeded. Please, try again later."),
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after), **exc.headers},
+    )
+
+
+@app.on_event("startup")
+def startup():
+    # Models are loaded in background, /readyz reports when they are ready
+    ml_processor.ensure_started()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await image_fetcher.close()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Returns metrics in Prometheus text format
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def models_state() -> dict:
+    return {
+        "state": ml_processor.state,
+        "load_time": ml_processor.load_time,
+        "warmup_time": ml_processor.warmup_time,
+    }
+
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    """
+    Liveness probe. Fails only if models failed to load
+    """
+    status_code = 500 if ml_processor.state == "failed" else 200
+    return JSONResponse(content=models_state(), status_code=status_code)
+
+
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """
+    Readiness probe. Succeeds when models are loaded and warmed up
+    """
+    status_code = 200 if ml_processor.state == "ready" else 503
+    return JSONResponse(content=models_state(), status_code=status_code)
+
+
 app.include_router(api_router, prefix="/api")
 app.mount(
     "/",
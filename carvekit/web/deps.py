@@ -1,6 +1,14 @@
 from carvekit.web.schemas.config import WebAPIConfig
 from carvekit.web.utils.init_utils import init_config
+from carvekit.web.utils.net_utils import ImageFetcher
+from carvekit.web.utils.rate_limit import RateLimiter
 from carvekit.web.utils.task_queue import MLProcessor
 
 config: WebAPIConfig = init_config()
 ml_processor = MLProcessor(api_config=config)
+rate_limiter = RateLimiter(
+    rate=config.auth.rate_limit, burst=config.auth.rate_limit_burst
+)
+image_fetcher = ImageFetcher(
+    timeout=config.fetch_timeout, max_size=config.fetch_max_size_mb * 1024 * 1024
+)
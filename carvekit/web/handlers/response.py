@@ -1,37 +1,85 @@
-from typing import Union
+from typing import Union, Tuple, Dict, Optional
 
-from fastapi import Header
+from fastapi import Header, Depends, Request
 from fastapi.responses import Response, JSONResponse
-from carvekit.web.deps import config
+from carvekit.web.deps import config, ml_processor, rate_limiter
 
 
-def Authenticate(x_api_key: Union[str, None] = Header(None)) -> Union[bool, str]:
+def Authenticate(
+    request: Request, x_api_key: Union[str, None] = Header(None)
+) -> Union[bool, str]:
     if x_api_key in config.auth.allowed_tokens:
+        request.state.api_key = x_api_key
         return "allowed"
     elif x_api_key == config.auth.admin_token:
         return "admin"
     elif config.auth.auth is False:
+        # Unknown keys share one bucket, otherwise random keys would bypass the limit
+        request.state.api_key = "anonymous"
         return "allowed"
     else:
         return False
 
 
-def handle_response(response, original_image) -> Response:
+def AuthenticateJob(
+    request: Request, auth: Union[bool, str] = Depends(Authenticate)
+) -> Union[bool, str]:
+    """
+    Authenticates request, which submits jobs, and checks the rate limit of its API key.
+    Admin token isn't rate limited.
+
+    Raises:
+        RateLimitExceeded: if the API key has spent its rate limit
+    """
+    if auth == "allowed":
+        rate_limiter.check(request.state.api_key)
+    return auth
+
+
+def ratelimit_headers(request: Request) -> Dict[str, str]:
+    """
+    Generates X-Ratelimit headers
+
+    Args:
+        request: authenticated request
+
+    Returns:
+        Token bucket state of the request API key or free space in the job queue,
+        if rate limiting is disabled
+    """
+    api_key = getattr(request.state, "api_key", None)
+    if rate_limiter.enabled and api_key is not None:
+        return rate_limiter.headers(api_key)
+    return {
+        "X-Ratelimit-Limit": str(config.ml.queue_max_jobs),
+        "X-Ratelimit-Remaining": str(ml_processor.queue_remaining()),
+        "X-Ratelimit-Reset": str(ml_processor.estimate_wait()),
+    }
+
+
+def handle_response(
+    response, original_size: Tuple[int, int], headers: Optional[Dict[str, str]] = None
+) -> Response:
     """
     Response handler from TaskQueue
     :param response: TaskQueue response
-    :param original_image: Original PIL image
+    :param original_size: Size of original PIL image
+    :param headers: extra headers, like X-Ratelimit ones
     :return: Complete flask response
     """
     response_object = None
     if isinstance(response, dict):
         if response["type"] == "jpg":
             response_object = Response(
-                content=response["data"][0].read(), media_type="image/jpeg"
+                content=response["data"][0], media_type="image/jpeg"
             )
         elif response["type"] == "png":
             response_object = Response(
-                content=response["data"][0].read(), media_type="image/png"
+                content=response["data"][0], media_type="image/png"
+            )
+        elif response["type"] == "webp":
+            response_object = Response(
+                content=response["data"][0], media_type="image/webp"
             )
         elif response["type"] == "zip":
             response_object = Response(
@@ -44,18 +92,17 @@ def handle_response(response, original_image) -> Response:
         # Add headers to output result
         response_object.headers["X-Credits-Charged"] = "0"
         response_object.headers["X-Type"] = "other"  # TODO Make support for this
-        response_object.headers["X-Max-Width"] = str(original_image.size[0])
-        response_object.headers["X-Max-Height"] = str(original_image.size[1])
-        response_object.headers[
-            "X-Ratelimit-Limit"
-        ] = "500"  # TODO Make ratelimit support
-        response_object.headers["X-Ratelimit-Remaining"] = "500"
-        response_object.headers["X-Ratelimit-Reset"] = "1"
+        response_object.headers["X-Max-Width"] = str(original_size[0])
+        response_object.headers["X-Max-Height"] = str(original_size[1])
         response_object.headers["X-Width"] = str(response["data"][1][0])
         response_object.headers["X-Height"] = str(response["data"][1][1])
+        if "tier" in response:
+            response_object.headers["X-Quality-Tier"] = response["tier"]
 
     else:
-        response = JSONResponse(content=response[0])
-        response.headers["X-Credits-Charged"] = "0"
+        response_object = JSONResponse(content=response[0], status_code=response[1])
+        response_object.headers["X-Credits-Charged"] = "0"
 
+    if headers is not None:
+        response_object.headers.update(headers)
     return response_object
@@ -0,0 +1,268 @@
+import asyncio
+import io
+import random
+import time
+from collections import Counter
+from typing import List, Tuple, Dict, Optional
+from urllib.parse import parse_qsl
+
+import click
+import httpx
+import numpy as np
+from PIL import Image
+
+__all__ = [
+    "parse_image_size",
+    "parse_params",
+    "synthetic_image",
+    "percentile",
+    "run_load",
+    "format_report",
+]
+
+
+def parse_image_size(value: str) -> Tuple[int, int]:
+    """
+    Parses image size
+
+    Args:
+        value: size in WIDTHxHEIGHT format, like 1920x1080
+
+    Returns:
+        width and height
+    """
+    try:
+        width, height = value.lower().split("x")
+        size = int(width), int(height)
+    except ValueError:
+        raise ValueError(f"Incorrect image size {value}!")
+    if size[0] <= 0 or size[1] <= 0:
+        raise ValueError(f"Incorrect image size {value}!")
+    return size
+
+
+def parse_params(value: str) -> Dict[str, str]:
+    """
+    Parses request parameters
+
+    Args:
+        value: parameters in query string format, like size=preview&format=png
+
+    Returns:
+        dict of form fields
+    """
+    return dict(parse_qsl(value, keep_blank_values=True))
+
+
+def synthetic_image(size: Tuple[int, int], seed: int) -> bytes:
+    """
+    Generates unique JPEG image, so requests don't hit the alpha matte cache
+
+    Args:
+        size: image size
+        seed: image seed
+
+    Returns:
+        encoded image
+    """
+    colors = np.random.default_rng(seed).integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(colors).resize(size, resample=Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Computes percentile with linear interpolation
+
+    Args:
+        values: sample
+        q: percentile in range [0, 100]
+
+    Returns:
+        percentile value or 0 for the empty sample
+    """
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+async def run_load(
+    url: str,
+    api_key: Optional[str] = None,
+    concurrency: int = 8,
+    requests_count: int = 100,
+    image_sizes: Optional[List[Tuple[int, int]]] = None,
+    params_mix: Optional[List[Dict[str, str]]] = None,
+    timeout: float = 300,
+    seed: int = 0,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> dict:
+    """
+    Sends requests to /api/removebg with the fixed count of concurrent clients
+
+    Args:
+        url: web api base url
+        api_key: X-Api-Key header value
+        concurrency: count of concurrent clients
+        requests_count: total count of requests
+        image_sizes: sizes of generated images, picked at random for every request
+        params_mix: sets of form fields, picked at random for every request
+        timeout: request timeout in seconds
+        seed: random seed of images and parameters choice
+        transport: custom httpx transport
+
+    Returns:
+        load test statistics
+    """
+    image_sizes = image_sizes or [(1024, 768)]
+    params_mix = params_mix or [{}]
+    rng = random.Random(seed)
+    plan = [
+        (rng.choice(image_sizes), rng.choice(params_mix)) for _ in range(requests_count)
+    ]
+    headers = {"X-Api-Key": api_key} if api_key else {}
+    loop = asyncio.get_running_loop()
+    statuses = Counter()
+    latencies = []
+    megapixels = 0.0
+    next_request = 0
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal next_request, megapixels
+        while next_request < len(plan):
+            index = next_request
+            next_request += 1
+            size, params = plan[index]
+            # Image encoding isn't a part of the measured latency
+            data = await loop.run_in_executor(
+                None, synthetic_image, size, seed * requests_count + index
+            )
+            started_at = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/api/removebg",
+                    data=params,
+                    files={"image_file": ("image.jpg", data, "image/jpeg")},
+                    headers=headers,
+                )
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            statuses[status] += 1
+            if status == "200":
+                latencies.append(time.perf_counter() - started_at)
+                megapixels += size[0] * size[1] / 1e6
+
+    started_at = time.perf_counter()
+    async with httpx.AsyncClient(
+        base_url=url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency),
+        transport=transport,
+    ) as client:
+        await asyncio.gather(*[client_loop(client) for _ in range(concurrency)])
+    duration = time.perf_counter() - started_at
+    return {
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "duration": duration,
+        "statuses": dict(statuses),
+        "throughput": len(latencies) / duration if duration > 0 else 0.0,
+        "megapixels_throughput": megapixels / duration if duration > 0 else 0.0,
+        "latency": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies, default=0.0),
+        },
+    }
+
+
+def format_report(stats: dict) -> str:
+    """
+    Formats load test statistics
+
+    Args:
+        stats: run_load output
+
+    Returns:
+        human-readable report
+    """
+    statuses = ", ".join(
+        f"{status}: {count}" for status, count in sorted(stats["statuses"].items())
+    )
+    latency = stats["latency"]
+    return "\n".join(
+        [
+            f"Requests:    {stats['requests']} with concurrency {stats['concurrency']} "
+            f"in {stats['duration']:.2f} s",
+            f"Statuses:    {statuses}",
+            f"Throughput:  {stats['throughput']:.2f} req/s, "
+            f"{stats['megapixels_throughput']:.2f} MP/s",
+            f"Latency, ms: mean {latency['mean'] * 1000:.0f}, "
+            f"p50 {latency['p50'] * 1000:.0f}, p95 {latency['p95'] * 1000:.0f}, "
+            f"p99 {latency['p99'] * 1000:.0f}, max {latency['max'] * 1000:.0f}",
+        ]
+    )
+
+
+@click.command(
+    "loadtest",
+    help="Load tests /api/removebg of the running web api. "
+    "Run the web api with CARVEKIT_INFERENCE_BACKEND=fake to measure only the web api overhead.",
+)
+@click.option("--url", default="http://localhost:5000", help="Web API base url")
+@click.option("--api-key", default=None, type=str, help="X-Api-Key header value")
+@click.option("-c", "--concurrency", default=8, type=int, help="Concurrent clients")
+@click.option("-n", "--requests", "requests_count", default=100, type=int)
+@click.option(
+    "--image-size",
+    "image_sizes",
+    multiple=True,
+    default=["1024x768"],
+    help="Size of generated images in WIDTHxHEIGHT format. Can be repeated",
+)
+@click.option(
+    "--params",
+    "params_mix",
+    multiple=True,
+    default=[""],
+    help="Request form fields in query string format, like size=preview&format=png. "
+    "Can be repeated, every request picks one at random",
+)
+@click.option("--timeout", default=300, type=float, help="Request timeout in seconds")
+@click.option("--seed", default=0, type=int, help="Random seed")
+def loadtest(
+    url: str,
+    api_key: Optional[str],
+    concurrency: int,
+    requests_count: int,
+    image_sizes: Tuple[str],
+    params_mix: Tuple[str],
+    timeout: float,
+    seed: int,
+):
+    stats = asyncio.run(
+        run_load(
+            url,
+            api_key=api_key,
+            concurrency=concurrency,
+            requests_count=requests_count,
+            image_sizes=[parse_image_size(size) for size in image_sizes],
+            params_mix=[parse_params(params) for params in params_mix],
+            timeout=timeout,
+            seed=seed,
+        )
+    )
+    click.echo(format_report(stats))
+
+
+if __name__ == "__main__":
+    loadtest()
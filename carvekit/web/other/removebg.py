@@ -1,15 +1,99 @@
 import io
-import time
 import zipfile
+from typing import Tuple, Optional
 
-import requests
 from PIL import Image, ImageColor
 
 from carvekit.utils.image_utils import transparency_paste, add_margin
 from carvekit.utils.mask_utils import extract_alpha_channel
 from carvekit.web.responses.api import error_dict
+from carvekit.web.utils.zip_utils import write_zip_entry
 from carvekit.api.interface import Interface
 
+SIZE_TIERS = {
+    "preview": (625, 400),  # 0.25 mp
+    "small": (625, 400),
+    "regular": (625, 400),
+    "medium": (1504, 1000),  # 1.5 mp
+    "hd": (2000, 2000),  # 2.5 mp
+}
+"""Maximum image sizes of the size parameter values"""
+FULL_SIZE = (6250, 4000)  # 25 mp
+"""Maximum image size of other size parameter values"""
+
+
+def size_tier_limit(params) -> Tuple[int, int]:
+    """
+    Returns maximum image size for the size parameter
+
+    Args:
+        params: parameters
+
+    Returns:
+        maximum width and height
+    """
+    return SIZE_TIERS.get(params.get("size"), FULL_SIZE)
+
+
+def scale_limit(params, size: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+    """
+    Returns maximum output size for the scale parameter
+
+    Args:
+        params: parameters
+        size: image size after resizing to its size tier
+
+    Returns:
+        maximum width and height of the output image or None if it isn't scaled
+    """
+    if "scale" not in params.keys() or params["scale"] == 100:
+        return None
+    value = params["scale"]
+    return (
+        max(1, int(size[0] * value / 100)),
+        max(1, int(size[1] * value / 100)),
+    )
+
+
+def scaled_size(params, size: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    Computes size of the image after resizing to its size tier and scale without resizing it
+
+    Args:
+        params: parameters
+        size: original image size
+
+    Returns:
+        image size, which is passed to the interface without region of interest cropping
+    """
+    if "size" in params.keys():
+        max_width, max_height = size_tier_limit(params)
+        ratio = min(max_width / size[0], max_height / size[1], 1)
+        size = max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+    limit = scale_limit(params, size)
+    if limit is None:
+        return size
+    ratio = min(limit[0] / size[0], limit[1] / size[1], 1)
+    return max(1, round(size[0] * ratio)), max(1, round(size[1] * ratio))
+
+
+def encode_image(image: Image.Image, image_format: str, **params) -> bytes:
+    """
+    Encodes image
+
+    Args:
+        image: image to encode
+        image_format: PIL image format
+        **params: PIL encoder parameters
+
+    Returns:
+        encoded image
+    """
+    buff = io.BytesIO()
+    image.save(buff, image_format, **params)
+    # getvalue doesn't copy the buffer, unlike read
+    return buff.getvalue()
+
 
 def process_remove_bg(
     interface: Interface, params, image, bg, is_json_or_www_encoded=False
@@ -19,31 +103,39 @@ def process_remove_bg(
 
     Args:
         interface: CarveKit interface
-        bg: background pil image
+        bg: background pil image or future of the image downloaded by bg_image_url
         is_json_or_www_encoded: is "json" or "x-www-form-urlencoded" content-type
         image: foreground pil image
         params: parameters
     """
+    prepared = prepare_remove_bg(params, image)
+    if isinstance(prepared, tuple):
+        return prepared
+    new_image = interface([prepared["roi_image"]])[0]
+    return finalize_remove_bg(params, prepared, new_image, bg, is_json_or_www_encoded)
+
+
+def prepare_remove_bg(params, image):
+    """
+    Resizes the image and crops the region of interest, which should be passed to the interface.
+    The region of interest is downscaled to the output size planned from the size and
+    scale parameters, so the interface doesn't process pixels, which would be thrown away
+
+    Args:
+        params: parameters
+        image: foreground pil image
+
+    Returns:
+        dict with resized image, roi box and region of interest image or error tuple
+    """
     h, w = image.size
     if h < 2 or w < 2:
         return error_dict("Image is too small. Minimum size 2x2"), 400
 
     if "size" in params.keys():
-        value = params["size"]
-        if value == "preview" or value == "small" or value == "regular":
-            image.thumbnail((625, 400), resample=3)  # 0.25 mp
-        elif value == "medium":
-            image.thumbnail((1504, 1000), resample=3)  # 1.5 mp
-        elif value == "hd":
-            image.thumbnail((2000, 2000), resample=3)  # 2.5 mp
-        else:
-            image.thumbnail((6250, 4000), resample=3)  # 25 mp
+        image.thumbnail(size_tier_limit(params), resample=3)
 
     roi_box = [0, 0, image.size[0], image.size[1]]
-    if "type" in params.keys():
-        value = params["type"]
-        pass
-
     if "roi" in params.keys():
         value = params["roi"].split(" ")
         if len(value) == 4:
@@ -107,15 +199,33 @@ def process_remove_bg(
     h, w = new_image.size
     if h < 2 or w < 2:
         return error_dict("Image is too small. Minimum size 2x2"), 400
-    new_image = interface([new_image])[0]
+    limit = scale_limit(params, image.size)
+    if limit is not None:
+        # Output is the scaled region of interest, alpha crop and background
+        # composition are done at this size too
+        new_image.thumbnail(limit, resample=3)
+    return {"image": image, "roi_box": roi_box, "roi_image": new_image}
+
 
+def finalize_remove_bg(
+    params, prepared: dict, new_image, bg, is_json_or_www_encoded=False
+):
+    """
+    Composes and encodes the interface output according to the request parameters
+
+    Args:
+        params: parameters
+        prepared: output of prepare_remove_bg
+        new_image: interface output for the region of interest image
+        bg: background pil image or future of the image downloaded by bg_image_url
+        is_json_or_www_encoded: is "json" or "x-www-form-urlencoded" content-type
+    """
+    image, roi_box = prepared["image"], prepared["roi_box"]
     scaled = False
-    if "scale" in params.keys() and params["scale"] != 100:
-        value = params["scale"]
-        new_image.thumbnail(
-            (int(image.size[0] * value / 100), int(image.size[1] * value / 100)),
-            resample=3,
-        )
+    limit = scale_limit(params, image.size)
+    if limit is not None:
+        # No-op for outputs of prepare_remove_bg, which are already scaled
+        new_image.thumbnail(limit, resample=3)
         scaled = True
     if "crop" in params.keys():
         value = params["crop"]
@@ -191,7 +301,8 @@ def process_remove_bg(
                 value = params["bg_image_url"]
                 if len(value) > 0:
                     try:
-                        bg = Image.open(io.BytesIO(requests.get(value).content))
+                        # Background is downloaded by the web api while the job is processed
+                        bg = bg.result()
                     except BaseException:
                         return error_dict("Error download background image!"), 400
                     bg = bg.resize(new_image.size)
@@ -207,37 +318,41 @@ def process_remove_bg(
                     new_image = bg.copy()
     if "format" in params.keys():
         value = params["format"]
+        quality = params.get("quality")
+        compression = params.get("compression", 6)
         if value == "jpg":
-            new_image = new_image.convert("RGB")
-            img_io = io.BytesIO()
-            new_image.save(img_io, "JPEG", quality=100)
-            img_io.seek(0)
-            return {"type": "jpg", "data": [img_io, new_image.size]}
+            data = encode_image(
+                new_image.convert("RGB"), "JPEG", quality=quality or 100
+            )
+            return {"type": "jpg", "data": [data, new_image.size]}
+        elif value == "webp":
+            if params.get("lossless", False):
+                # method 0 is the fastest one, lossless output doesn't depend on it
+                data = encode_image(new_image, "WEBP", lossless=True, method=0)
+            else:
+                data = encode_image(new_image, "WEBP", quality=quality or 90)
+            return {"type": "webp", "data": [data, new_image.size]}
+        elif value == "alpha":
+            data = encode_image(
+                new_image.getchannel("A"), "PNG", compress_level=compression
+            )
+            return {"type": "png", "data": [data, new_image.size]}
         elif value == "zip":
             mask = extract_alpha_channel(new_image)
             mask_buff = io.BytesIO()
-            mask.save(mask_buff, "PNG")
+            mask.save(mask_buff, "PNG", compress_level=compression)
             mask_buff.seek(0)
             image_buff = io.BytesIO()
             image.save(image_buff, "JPEG")
             image_buff.seek(0)
             fileobj = io.BytesIO()
             with zipfile.ZipFile(fileobj, "w") as zip_file:
-                zip_info = zipfile.ZipInfo(filename="color.jpg")
-                zip_info.date_time = time.localtime(time.time())[:6]
-                zip_info.compress_type = zipfile.ZIP_DEFLATED
-                zip_file.writestr(zip_info, image_buff.getvalue())
-                zip_info = zipfile.ZipInfo(filename="alpha.png")
-                zip_info.date_time = time.localtime(time.time())[:6]
-                zip_info.compress_type = zipfile.ZIP_DEFLATED
-                zip_file.writestr(zip_info, mask_buff.getvalue())
-            fileobj.seek(0)
-            return {"type": "zip", "data": [fileobj.read(), new_image.size]}
+                write_zip_entry(zip_file, "color.jpg", image_buff.getvalue())
+                write_zip_entry(zip_file, "alpha.png", mask_buff.getvalue())
+            return {"type": "zip", "data": [fileobj.getvalue(), new_image.size]}
         else:
-            buff = io.BytesIO()
-            new_image.save(buff, "PNG")
-            buff.seek(0)
-            return {"type": "png", "data": [buff, new_image.size]}
+            data = encode_image(new_image, "PNG", compress_level=compression)
+            return {"type": "png", "data": [data, new_image.size]}
     return (
         error_dict(
             "Something wrong with request or http api. Please, open new issue on Github! This is error in "
@@ -1,36 +1,59 @@
+import asyncio
 import base64
 import http
 import io
+import json
+import tarfile
 import time
+import zipfile
+from concurrent.futures import Future
 from json import JSONDecodeError
-from typing import Optional
+from pathlib import PurePosixPath
+from typing import Optional, List, AsyncIterator, Tuple, Callable
 
-import requests
 from PIL import Image
-from fastapi import Header, Depends, Form, File, Request, APIRouter, UploadFile
+from fastapi import (
+    Header,
+    Depends,
+    Form,
+    File,
+    Request,
+    APIRouter,
+    UploadFile,
+    Query,
+)
 from fastapi.openapi.models import Response
+from loguru import logger
 from pydantic import ValidationError
-from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
 
-from carvekit.web.deps import config, ml_processor
-from carvekit.web.handlers.response import handle_response, Authenticate
+from carvekit.web.deps import config, ml_processor, image_fetcher, rate_limiter
+from carvekit.web.handlers.response import (
+    handle_response,
+    Authenticate,
+    AuthenticateJob,
+    ratelimit_headers,
+)
 from carvekit.web.responses.api import error_dict
 from carvekit.web.schemas.request import Parameters
-from carvekit.web.utils.net_utils import is_loopback
+from carvekit.web.utils.matte_cache import MatteCache
+from carvekit.web.utils.task_queue import QueueFullError
+from carvekit.web.utils.upload_utils import (
+    read_image_stream,
+    archive_members,
+    UploadTooLargeError,
+)
+from carvekit.web.utils.zip_utils import write_zip_entry, ZipStreamBuffer
 
 api_router = APIRouter(prefix="", tags=["api"])
 
+DISCONNECT_POLL_INTERVAL = 1.0
+"""Interval in seconds between checks whether the client is still connected"""
 
-# noinspection PyBroadException
-@api_router.post("/removebg")
-async def removebg(
-    request: Request,
-    image_file: Optional[bytes] = File(None),
-    auth: bool = Depends(Authenticate),
-    content_type: str = Header(""),
-    image_file_b64: Optional[str] = Form(None),
-    image_url: Optional[str] = Form(None),
-    bg_image_file: Optional[bytes] = File(None),
+
+def removebg_form_options(
+    bg_image_url: Optional[str] = Form(""),
     size: Optional[str] = Form("full"),
     type: Optional[str] = Form("auto"),
     format: Optional[str] = Form("auto"),
@@ -43,7 +66,57 @@ async def removebg(
     add_shadow: bool = Form(False),  # Not supported at the moment
     semitransparency: bool = Form(False),  # Not supported at the moment
     bg_color: Optional[str] = Form(""),
+    quality: Optional[int] = Form(None),
+    lossless: bool = Form(False),
+    compression: int = Form(6),
+    timeout: Optional[float] = Form(None),
+    priority: Optional[str] = Form("normal"),
+) -> dict:
+    """
+    Reads removebg processing options from the form
+
+    Returns:
+        Parameters fields except the image ones
+    """
+    return dict(
+        bg_image_url=bg_image_url,
+        size=size,
+        type=type,
+        format=format,
+        roi=roi,
+        crop=crop,
+        crop_margin=crop_margin,
+        scale=scale,
+        position=position,
+        channels=channels,
+        add_shadow="false",
+        semitransparency="false",
+        bg_color=bg_color,
+        quality=quality,
+        lossless=lossless,
+        compression=compression,
+        timeout=timeout,
+        priority=priority,
+    )
+
+
+# noinspection PyBroadException
+async def removebg_job_data(
+    request: Request,
+    image_file: Optional[bytes] = File(None),
+    auth: bool = Depends(AuthenticateJob),
+    content_type: str = Header(""),
+    image_file_b64: Optional[str] = Form(None),
+    image_url: Optional[str] = Form(None),
+    bg_image_file: Optional[bytes] = File(None),
+    options: dict = Depends(removebg_form_options),
 ):
+    """
+    Reads removebg request parameters and images
+
+    Returns:
+        Job data for MLProcessor or error response
+    """
     if auth is False:
         return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
     if (
@@ -54,18 +127,16 @@ async def removebg(
             content=error_dict("Invalid request content type"), status_code=400
         )
 
-    if image_url:
-        if not (
-            image_url.startswith("http://") or image_url.startswith("https://")
-        ) or is_loopback(image_url):
-            print(
-                f"Possible ssrf attempt to /api/removebg endpoint with image url: {image_url}"
-            )
-            return JSONResponse(
-                content=error_dict("Invalid image url."), status_code=400
-            )  # possible ssrf attempt
+    if image_url and not await image_fetcher.is_url_allowed(image_url):
+        logger.warning(
+            f"Possible ssrf attempt to /api/removebg endpoint with image url: {image_url}"
+        )
+        return JSONResponse(
+            content=error_dict("Invalid image url."), status_code=400
+        )  # possible ssrf attempt
 
     image = None
+    image_bytes = None
     bg = None
     parameters = None
     if (
@@ -79,22 +150,24 @@ async def removebg(
             if len(image_file_b64) == 0:
                 return JSONResponse(content=error_dict("Empty image"), status_code=400)
             try:
-                image = Image.open(io.BytesIO(base64.b64decode(image_file_b64)))
-            except BaseException:
+                image_bytes = base64.b64decode(image_file_b64)
+                image = Image.open(io.BytesIO(image_bytes))
+            except Exception:
                 return JSONResponse(
                     content=error_dict("Error decode image!"), status_code=400
                 )
         elif image_url:
             try:
-                image = Image.open(io.BytesIO(requests.get(image_url).content))
-            except BaseException:
+                image = await image_fetcher.fetch_image(image_url)
+            except Exception:
                 return JSONResponse(
                     content=error_dict("Error download image!"), status_code=400
                 )
         elif image_file:
             if len(image_file) == 0:
                 return JSONResponse(content=error_dict("Empty image"), status_code=400)
-            image = Image.open(io.BytesIO(image_file))
+            image_bytes = image_file
+            image = Image.open(io.BytesIO(image_bytes))
 
         if bg_image_file:
             if len(bg_image_file) == 0:
@@ -102,20 +175,7 @@ async def removebg(
             bg = Image.open(io.BytesIO(bg_image_file))
         try:
             parameters = Parameters(
-                image_file_b64=image_file_b64,
-                image_url=image_url,
-                size=size,
-                type=type,
-                format=format,
-                roi=roi,
-                crop=crop,
-                crop_margin=crop_margin,
-                scale=scale,
-                position=position,
-                channels=channels,
-                add_shadow="false",
-                semitransparency="false",
-                bg_color=bg_color,
+                image_file_b64=image_file_b64, image_url=image_url, **options
             )
         except ValidationError as e:
             return JSONResponse(
@@ -141,29 +201,23 @@ async def removebg(
             if len(parameters.image_file_b64) == 0:
                 return JSONResponse(content=error_dict("Empty image"), status_code=400)
             try:
-                image = Image.open(
-                    io.BytesIO(base64.b64decode(parameters.image_file_b64))
-                )
-            except BaseException:
+                image_bytes = base64.b64decode(parameters.image_file_b64)
+                image = Image.open(io.BytesIO(image_bytes))
+            except Exception:
                 return JSONResponse(
                     content=error_dict("Error decode image!"), status_code=400
                 )
         elif parameters.image_url:
-            if not (
-                parameters.image_url.startswith("http://")
-                or parameters.image_url.startswith("https://")
-            ) or is_loopback(parameters.image_url):
-                print(
+            if not await image_fetcher.is_url_allowed(parameters.image_url):
+                logger.warning(
                     f"Possible ssrf attempt to /api/removebg endpoint with image url: {parameters.image_url}"
                 )
                 return JSONResponse(
                     content=error_dict("Invalid image url."), status_code=400
                 )  # possible ssrf attempt
             try:
-                image = Image.open(
-                    io.BytesIO(requests.get(parameters.image_url).content)
-                )
-            except BaseException:
+                image = await image_fetcher.fetch_image(parameters.image_url)
+            except Exception:
                 return JSONResponse(
                     content=error_dict("Error download image!"), status_code=400
                 )
@@ -172,17 +226,490 @@ async def removebg(
                 content=error_dict("Error download image!"), status_code=400
             )
 
-    job_id = ml_processor.job_create([parameters.dict(), image, bg, False])
+    # Downloaded images aren't kept as files, so their pixels are hashed
+    request.state.image_digest = await image_digest(
+        image if image_bytes is None else image_bytes
+    )
+    if parameters.bg_image_url:
+        bg = await background_future(parameters.bg_image_url)
+        if not isinstance(bg, Future):
+            return bg
+
+    # base64 image isn't needed anymore, so the job doesn't hold it
+    return [parameters.dict(exclude={"image_file_b64"}), image, bg, False]
+
+
+async def image_digest(source) -> Optional[str]:
+    """
+    Computes content digest of the uploaded image for the matte cache off the event loop
+
+    Args:
+        source: uploaded image file bytes or decoded image
+
+    Returns:
+        digest returned by MatteCache.digest or None if the matte cache is disabled
+    """
+    if ml_processor.matte_cache is None:
+        return None
+    return await run_in_threadpool(MatteCache.digest, source)
+
+
+async def background_future(bg_image_url: str):
+    """
+    Starts downloading of the background image.
+    Background is downloaded while the job waits in the queue and is processed.
+
+    Args:
+        bg_image_url: background image url
+
+    Returns:
+        Future of the background image or error response
+    """
+    if not await image_fetcher.is_url_allowed(bg_image_url):
+        logger.warning(
+            f"Possible ssrf attempt to /api/removebg endpoint with bg image url: {bg_image_url}"
+        )
+        return JSONResponse(
+            content=error_dict("Invalid background image url."), status_code=400
+        )  # possible ssrf attempt
+    return asyncio.run_coroutine_threadsafe(
+        image_fetcher.fetch_image(bg_image_url), asyncio.get_running_loop()
+    )
+
+
+def queue_full_response(
+    error: QueueFullError, request: Request, job_data: list
+) -> JSONResponse:
+    """
+    Generates response for a rejected job and cancels download of its background
+
+    Args:
+        error: job queue error
+        request: client request
+        job_data: job data of the rejected job
+
+    Returns:
+        Response with 503 code and Retry-After header
+    """
+    if isinstance(job_data[2], Future):
+        job_data[2].cancel()
+    response = JSONResponse(
+        content=error_dict("Server is overloaded. Please, try again later."),
+        status_code=503,
+        headers=ratelimit_headers(request),
+    )
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
+
+def charge_job(request: Request, job_data: list):
+    """
+    Charges the API key of the request for the accepted job
+
+    Args:
+        request: authenticated request
+        job_data: job data for MLProcessor
+    """
+    api_key = getattr(request.state, "api_key", None)
+    if api_key is not None:
+        rate_limiter.charge(
+            api_key, ml_processor.job_cost(job_data[0], job_data[1].size)
+        )
+
+
+def job_deadline(request: Request, timeout: Optional[float]) -> Optional[float]:
+    """
+    Computes job deadline from the timeout parameter and X-Request-Timeout header.
+    The earliest of them is used, invalid header values are ignored.
+
+    Args:
+        request: client request
+        timeout: timeout parameter in seconds
+
+    Returns:
+        time.monotonic() value, after which the job result is not needed, or None
+    """
+    timeouts = [] if timeout is None else [timeout]
+    try:
+        header_timeout = float(request.headers.get("X-Request-Timeout", ""))
+        if header_timeout > 0:
+            timeouts.append(header_timeout)
+    except ValueError:
+        pass
+    if len(timeouts) == 0:
+        return None
+    return time.monotonic() + min(timeouts)
+
+
+@api_router.post("/removebg")
+async def removebg(request: Request, job_data=Depends(removebg_job_data)):
+    if not isinstance(job_data, list):
+        return job_data
+    return await process_job(request, job_data)
+
+
+async def process_job(request: Request, job_data: list):
+    """
+    Passes job to MLProcessor and waits for its result.
+    The job is cancelled if the client disconnects or the deadline passes.
+
+    Args:
+        request: client request
+        job_data: job data for MLProcessor
+
+    Returns:
+        Response with job result
+    """
+    deadline = job_deadline(request, job_data[0].get("timeout"))
+    try:
+        job_id = ml_processor.job_create(
+            job_data,
+            deadline=deadline,
+            keep_result=False,
+            digest=getattr(request.state, "image_digest", None),
+        )
+    except QueueFullError as e:
+        return queue_full_response(e, request, job_data)
+    charge_job(request, job_data)
+    job_future = ml_processor.job_future(job_id)
+    if job_future is None:
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=500)
+    job_future = asyncio.wrap_future(job_future)
+    while not job_future.done():
+        timeout = DISCONNECT_POLL_INTERVAL
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.monotonic(), 0))
+        # asyncio.wait doesn't cancel the job future on timeout
+        await asyncio.wait([job_future], timeout=timeout)
+        if job_future.done():
+            break
+        if await request.is_disconnected():
+            ml_processor.job_cancel(job_id)
+            return JSONResponse(content=error_dict("Job is cancelled"), status_code=499)
+        if deadline is not None and time.monotonic() >= deadline:
+            ml_processor.job_cancel(job_id)
+            return JSONResponse(
+                content=error_dict("Request deadline exceeded"), status_code=504
+            )
+    return handle_response(
+        job_future.result(), job_data[1].size, headers=ratelimit_headers(request)
+    )
+
+
+@api_router.post("/removebg/raw")
+async def removebg_raw(
+    request: Request,
+    auth: bool = Depends(AuthenticateJob),
+    content_type: str = Header(""),
+):
+    """
+    Removes background from the image sent as raw request body.
+    Processing parameters are passed as query parameters.
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    if content_type != "application/octet-stream" and not content_type.startswith(
+        "image/"
+    ):
+        return JSONResponse(
+            content=error_dict("Invalid request content type"), status_code=400
+        )
+    options = dict(request.query_params)
+    options.pop("image_file_b64", None)
+    options.pop("image_url", None)
+    try:
+        parameters = Parameters(**options)
+    except ValidationError as e:
+        return JSONResponse(
+            content=e.json(), status_code=400, media_type="application/json"
+        )
+    try:
+        image = await read_image_stream(
+            request.stream(),
+            max_size=config.upload_max_size_mb * 1024 * 1024,
+            spool_size=config.upload_spool_size_mb * 1024 * 1024,
+        )
+    except UploadTooLargeError:
+        return JSONResponse(content=error_dict("Image is too large"), status_code=413)
+    except Exception:
+        return JSONResponse(content=error_dict("Error decode image!"), status_code=400)
+    if image is None:
+        return JSONResponse(content=error_dict("Empty image"), status_code=400)
+    request.state.image_digest = await image_digest(image)
+    bg = None
+    if parameters.bg_image_url:
+        bg = await background_future(parameters.bg_image_url)
+        if not isinstance(bg, Future):
+            return bg
+
+    job_data = [parameters.dict(exclude={"image_file_b64"}), image, bg, False]
+    return await process_job(request, job_data)
+
+
+def job_status_response(job_id: str, status_code: int = 200) -> JSONResponse:
+    """
+    Generates response with current job status
+
+    Args:
+        job_id: id of the job
+        status_code: http status code of the response
+
+    Returns:
+        Response with job id, status and queue position
+    """
+    status = ml_processor.job_status(job_id)
+    if status == "not_found":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    return JSONResponse(
+        content={
+            "id": job_id,
+            "status": status,
+            "queue_position": ml_processor.job_queue_position(job_id),
+        },
+        status_code=status_code,
+    )
+
+
+@api_router.post("/jobs")
+async def job_submit(request: Request, job_data=Depends(removebg_job_data)):
+    """
+    Submits removebg job and returns its id without waiting for the result
+    """
+    if not isinstance(job_data, list):
+        return job_data
+    try:
+        job_id = ml_processor.job_create(
+            job_data,
+            deadline=job_deadline(request, job_data[0].get("timeout")),
+            digest=getattr(request.state, "image_digest", None),
+        )
+    except QueueFullError as e:
+        return queue_full_response(e, request, job_data)
+    charge_job(request, job_data)
+    response = job_status_response(job_id, status_code=202)
+    response.headers.update(ratelimit_headers(request))
+    return response
+
 
-    while ml_processor.job_status(job_id) != "finished":
-        if ml_processor.job_status(job_id) == "not_found":
+@api_router.get("/jobs/{job_id}")
+def job_status(job_id: str, auth: bool = Depends(Authenticate)):
+    """
+    Returns job status and position in the queue
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    return job_status_response(job_id)
+
+
+@api_router.delete("/jobs/{job_id}")
+def job_cancel(job_id: str, auth: bool = Depends(Authenticate)):
+    """
+    Cancels the job. Waiting job is removed from the queue,
+    job in processing is dropped before its next stage.
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    if not ml_processor.job_cancel(job_id):
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    return JSONResponse(content={"id": job_id, "status": "cancelled"})
+
+
+@api_router.get("/jobs/{job_id}/result")
+async def job_result(
+    request: Request,
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60),
+    auth: bool = Depends(Authenticate),
+):
+    """
+    Returns job result. If the job is not finished, waits for it up to `wait` seconds
+    and returns job status with 202 code on timeout.
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    status = ml_processor.job_status(job_id)
+    if status == "not_found":
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    if status != "finished":
+        # Finished jobs are not asked for a future, since it loads the stored result
+        job_future = ml_processor.job_future(job_id)
+        if job_future is not None and not job_future.done() and wait > 0:
+            # asyncio.wait doesn't cancel the job future on timeout
+            await asyncio.wait([asyncio.wrap_future(job_future)], timeout=wait)
+        if job_future is not None and not job_future.done():
+            return job_status_response(job_id, status_code=202)
+
+    stored = ml_processor.job_result(job_id, with_image_size=True)
+    if stored is False:  # result was already taken by a concurrent request
+        return JSONResponse(content=error_dict("Job ID not found!"), status_code=404)
+    return handle_response(*stored, headers=ratelimit_headers(request))
+
+
+async def batch_images(
+    image_files: Optional[List[UploadFile]],
+    members: List[Tuple[str, Callable[[], bytes]]],
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    Reads images of the batch request
+
+    Args:
+        image_files: uploaded images
+        members: checked files of the uploaded archive returned by archive_members
+
+    Returns:
+        Iterator over file names and contents
+    """
+    for image_file in image_files or []:
+        yield image_file.filename or "image", await image_file.read()
+    for name, read in members:
+        yield name, await run_in_threadpool(read)
+
+
+async def write_batch_results(
+    zip_file: zipfile.ZipFile, pending: dict, return_when=asyncio.FIRST_COMPLETED
+):
+    """
+    Waits for batch jobs and writes their results to the archive
+
+    Args:
+        zip_file: output archive
+        pending: dict of pending job futures to file names and job ids
+        return_when: asyncio.wait condition
+    """
+    done, _ = await asyncio.wait(list(pending.keys()), return_when=return_when)
+    for future in done:
+        name, _ = pending.pop(future)
+        result = future.result()
+        if isinstance(result, dict):
+            data = result["data"][0]
+            name = f"{name}.{result['type']}"
+        else:
+            data = json.dumps(result[0]).encode()
+            name = f"{name}.error.json"
+        # Images are already compressed. Large entries take a while to checksum,
+        # so they are written off the event loop
+        await run_in_threadpool(
+            write_zip_entry, zip_file, name, data, compress_type=zipfile.ZIP_STORED
+        )
+
+
+@api_router.post("/removebg/batch")
+async def removebg_batch(
+    request: Request,
+    image_files: List[UploadFile] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    auth: bool = Depends(AuthenticateJob),
+    options: dict = Depends(removebg_form_options),
+):
+    """
+    Removes background from all uploaded images and streams zip archive with results
+    as they are ready. Images can be uploaded as a list of files or as a zip or tar archive.
+    """
+    if auth is False:
+        return JSONResponse(content=error_dict("Missing API Key"), status_code=403)
+    if not image_files and archive is None:
+        return JSONResponse(content=error_dict("File not found"), status_code=400)
+    try:
+        parameters = Parameters(**options).dict()
+    except ValidationError as e:
+        return JSONResponse(
+            content=e.json(), status_code=400, media_type="application/json"
+        )
+    # Limits are checked before any archive member is extracted
+    max_size = config.upload_max_size_mb * 1024 * 1024
+    max_count = config.batch_max_images - len(image_files or [])
+    max_total_size = config.batch_max_size_mb * 1024 * 1024
+    for image_file in image_files or []:
+        if image_file.size is not None:
+            if image_file.size > max_size:
+                return JSONResponse(
+                    content=error_dict("Image is too large"), status_code=413
+                )
+            max_total_size -= image_file.size
+    if max_count < 0 or max_total_size < 0:
+        return JSONResponse(content=error_dict("Batch is too large"), status_code=413)
+    members = []
+    if archive is not None:
+        try:
+            members = await run_in_threadpool(
+                archive_members, archive.file, max_count, max_size, max_total_size
+            )
+        except UploadTooLargeError as e:
+            return JSONResponse(content=error_dict(str(e)), status_code=413)
+        except (zipfile.BadZipFile, tarfile.TarError):
             return JSONResponse(
-                content=error_dict("Job ID not found!"), status_code=500
+                content=error_dict("Error decode archive!"), status_code=400
             )
-        time.sleep(5)
+    bg = None
+    if parameters["bg_image_url"]:
+        bg = await background_future(parameters["bg_image_url"])
+        if not isinstance(bg, Future):
+            return bg
+    deadline = job_deadline(request, parameters["timeout"])
+    # Enough jobs to fill inference batches without taking the whole queue
+    max_pending = 2 * ml_processor.batch_size * max(1, config.ml.inference_workers)
 
-    result = ml_processor.job_result(job_id)
-    return handle_response(result, image)
+    async def stream_results():
+        buffer = ZipStreamBuffer()
+        names = set()
+        pending = {}
+        try:
+            with zipfile.ZipFile(buffer, "w") as zip_file:
+                async for name, data in batch_images(image_files, members):
+                    name = PurePosixPath(name).stem
+                    while name in names:
+                        name = f"{name}_{len(names)}"
+                    names.add(name)
+                    try:
+                        image = Image.open(io.BytesIO(data))
+                    except Exception:
+                        await run_in_threadpool(
+                            write_zip_entry,
+                            zip_file,
+                            f"{name}.error.json",
+                            json.dumps(error_dict("Error decode image!")).encode(),
+                        )
+                        continue
+                    digest = await image_digest(data)
+                    # Spent rate limit slows down the batch instead of failing it
+                    api_key = getattr(request.state, "api_key", None)
+                    if api_key is not None:
+                        await asyncio.sleep(rate_limiter.wait_time(api_key))
+                    while True:
+                        if len(pending) >= max_pending:
+                            await write_batch_results(zip_file, pending)
+                            yield buffer.pop()
+                        try:
+                            job_id = ml_processor.job_create(
+                                [parameters, image, bg, False],
+                                deadline=deadline,
+                                keep_result=False,
+                                digest=digest,
+                            )
+                            charge_job(request, [parameters, image])
+                            break
+                        except QueueFullError as e:
+                            if len(pending) == 0:
+                                await asyncio.sleep(e.retry_after)
+                            else:
+                                await write_batch_results(zip_file, pending)
+                                yield buffer.pop()
+                    job_future = asyncio.wrap_future(ml_processor.job_future(job_id))
+                    pending[job_future] = (name, job_id)
+                while len(pending) > 0:
+                    await write_batch_results(zip_file, pending)
+                    yield buffer.pop()
+            yield buffer.pop()
+        finally:
+            # Unfinished jobs are left only if the client has disconnected
+            for _, job_id in pending.values():
+                ml_processor.job_cancel(job_id)
+
+    return StreamingResponse(
+        stream_results(),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=no-bg.zip"},
+    )
 
 
 @api_router.get("/account")
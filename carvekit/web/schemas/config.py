@@ -1,5 +1,5 @@
 import secrets
-from typing import List
+from typing import List, Optional, Dict
 from typing_extensions import Literal
 
 import torch.cuda
@@ -15,6 +15,24 @@ class AuthConfig(BaseModel):
     """Admin Token"""
     allowed_tokens: List[str] = [secrets.token_hex(32)]
     """All allowed tokens"""
+    rate_limit: float = 0
+    """Job cost units, which every token earns per second. 0 disables rate limiting"""
+    rate_limit_burst: float = 100
+    """Maximum job cost units, which a token can accumulate"""
+
+    @validator("rate_limit")
+    def rate_limit_validator(cls, value: float, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect rate_limit!")
+
+    @validator("rate_limit_burst")
+    def rate_limit_burst_validator(cls, value: float, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect rate_limit_burst!")
 
 
 class MLConfig(BaseModel):
@@ -24,10 +42,30 @@ class MLConfig(BaseModel):
         "u2net", "deeplabv3", "basnet", "tracer_b7", "isnet"
     ] = "tracer_b7"
     """Segmentation Network"""
+    inference_backend: Literal["models", "fake"] = "models"
+    """Inference backend. fake returns synthetic masks without loading models, for load testing"""
+    fake_latency_ms: float = 200
+    """Mean processing time of one image by the fake backend in milliseconds"""
+    fake_latency_ms_per_mp: float = 100
+    """Additional mean processing time per megapixel of the image by the fake backend"""
+    fake_latency_std_ms: float = 50
+    """Standard deviation of the processing time of one image by the fake backend"""
     preprocessing_method: Literal["none", "stub", "autoscene", "auto"] = "autoscene"
     """Pre-processing Method"""
     postprocessing_method: Literal["fba", "cascade_fba", "none"] = "cascade_fba"
     """Post-Processing Network"""
+    type_networks: Dict[str, str] = {}
+    """Segmentation networks for web api requests with specified image type,
+    like {"person": "isnet", "product": "tracer_b7"}. Each network stays loaded.
+    Empty dict processes requests with any type like type=auto"""
+    qos_tiers: Dict[str, float] = {}
+    """Queue wait in seconds, at which web api jobs are degraded to the quality tier.
+    Tiers are no_refine, fast_matting and segmentation. Empty dict disables degradation"""
+    qos_matting_mask_size: int = 1024
+    """The size of the input image for the matting neural network in fast_matting tier"""
+    models_max_mb: int = 2048
+    """Size in megabytes of weights of networks, which are loaded on demand by the auto
+    pre-processing methods and kept for the next requests. 0 disables the limit"""
     device: str = "cpu"
     """Processing device"""
     batch_size_pre: int = 5
@@ -52,6 +90,83 @@ class MLConfig(BaseModel):
     """Erosion levels for trimap"""
     trimap_prob_threshold: int = 231
     """Probability threshold for trimap generation"""
+    batch_max_wait_ms: int = 50
+    """Maximum time in milliseconds to wait for new web api jobs to fill an inference batch"""
+    inference_workers: int = 0
+    """Count of spawned web api inference processes, which share the model weights loaded by the web api process. 0 runs inference in the web api process"""
+    queue_max_jobs: int = 100
+    """Maximum count of web api jobs waiting for processing"""
+    queue_max_megapixels: float = 1000
+    """Maximum total size in megapixels of images waiting for processing"""
+    queue_policy: Literal["cost", "fifo"] = "cost"
+    """Order of web api jobs processing. cost processes cheap and high priority jobs first"""
+    queue_aging: float = 1.0
+    """Cost units, by which a waiting job gains priority every second. Prevents starvation"""
+    warmup: bool = True
+    """Passes synthetic images through the loaded networks before accepting web api jobs"""
+    cache_max_mb: int = 256
+    """Size in megabytes of the in-memory alpha matte cache. 0 disables the cache"""
+    cache_dir: Optional[str] = None
+    """Directory for the on-disk alpha matte cache tier"""
+    cache_dir_max_mb: int = 2048
+    """Size in megabytes of the on-disk alpha matte cache tier"""
+    results_max_mb: int = 512
+    """Size in megabytes of the in-memory store of async web api job results"""
+    results_ttl: int = 3600
+    """Time in seconds, after which unclaimed async web api job results are dropped"""
+    results_dir: Optional[str] = None
+    """Directory for the on-disk tier of job results, which don't fit into memory"""
+    results_dir_max_mb: int = 4096
+    """Size in megabytes of the on-disk tier of job results"""
+
+    @validator("type_networks")
+    def type_networks_validator(cls, value: Dict[str, str], values):
+        for image_type, network_name in value.items():
+            if image_type not in ["person", "product", "car"]:
+                raise ValueError(f"Unknown image type {image_type} in type_networks!")
+            if network_name not in [
+                "u2net",
+                "deeplabv3",
+                "basnet",
+                "tracer_b7",
+                "isnet",
+            ]:
+                raise ValueError(f"Unknown network {network_name} in type_networks!")
+        return value
+
+    @validator("fake_latency_ms", "fake_latency_ms_per_mp", "fake_latency_std_ms")
+    def fake_latency_validator(cls, value: float, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect fake backend latency!")
+
+    @validator("qos_tiers")
+    def qos_tiers_validator(cls, value: Dict[str, float], values):
+        tiers = ["no_refine", "fast_matting", "segmentation"]
+        for tier, wait in value.items():
+            if tier not in tiers:
+                raise ValueError(f"Unknown quality tier {tier} in qos_tiers!")
+            if wait <= 0:
+                raise ValueError(f"Incorrect queue wait of {tier} in qos_tiers!")
+        waits = [value[tier] for tier in tiers if tier in value]
+        if waits != sorted(waits):
+            raise ValueError("Queue waits in qos_tiers must grow with degradation!")
+        return value
+
+    @validator("qos_matting_mask_size")
+    def qos_matting_mask_size_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect qos_matting_mask_size!")
+
+    @validator("models_max_mb")
+    def models_max_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect models_max_mb!")
 
     @validator("seg_mask_size")
     def seg_mask_size_validator(cls, value: int, values):
@@ -81,6 +196,79 @@ class MLConfig(BaseModel):
         else:
             raise ValueError("Incorrect batch size!")
 
+    @validator("batch_max_wait_ms")
+    def batch_max_wait_ms_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect batch_max_wait_ms!")
+
+    @validator("inference_workers")
+    def inference_workers_validator(cls, value: int, values):
+        if value < 0:
+            raise ValueError("Incorrect inference_workers!")
+        if value > 0 and "cuda" in values.get("device", "cpu"):
+            raise ValueError(
+                "Inference workers are supported only for cpu processing device!"
+            )
+        return value
+
+    @validator("queue_max_jobs")
+    def queue_max_jobs_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect queue_max_jobs!")
+
+    @validator("queue_max_megapixels")
+    def queue_max_megapixels_validator(cls, value: float, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect queue_max_megapixels!")
+
+    @validator("queue_aging")
+    def queue_aging_validator(cls, value: float, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect queue_aging!")
+
+    @validator("cache_max_mb")
+    def cache_max_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect cache_max_mb!")
+
+    @validator("cache_dir_max_mb")
+    def cache_dir_max_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect cache_dir_max_mb!")
+
+    @validator("results_max_mb")
+    def results_max_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect results_max_mb!")
+
+    @validator("results_ttl")
+    def results_ttl_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect results_ttl!")
+
+    @validator("results_dir_max_mb")
+    def results_dir_max_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect results_dir_max_mb!")
+
     @validator("device")
     def device_validator(cls, value):
         if torch.cuda.is_available() is False and "cuda" in value:
@@ -99,7 +287,61 @@ class WebAPIConfig(BaseModel):
     """Web API port"""
     host: str = "0.0.0.0"
     """Web API host"""
+    fetch_timeout: float = 10.0
+    """Maximum time in seconds for downloading an image by url"""
+    fetch_max_size_mb: int = 50
+    """Maximum size in megabytes of an image downloaded by url"""
+    upload_max_size_mb: int = 100
+    """Maximum size in megabytes of an image uploaded as raw request body"""
+    upload_spool_size_mb: int = 16
+    """Raw uploads larger than this size in megabytes are spilled to a temporary file"""
+    batch_max_images: int = 100
+    """Maximum count of images in a batch request, including archive members"""
+    batch_max_size_mb: int = 1000
+    """Maximum total uncompressed size in megabytes of images in a batch request"""
     ml: MLConfig = MLConfig()
     """Config for ml part of framework"""
     auth: AuthConfig = AuthConfig()
     """Config for web api token authentication """
+
+    @validator("fetch_timeout")
+    def fetch_timeout_validator(cls, value: float, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect fetch_timeout!")
+
+    @validator("upload_max_size_mb")
+    def upload_max_size_mb_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect upload_max_size_mb!")
+
+    @validator("upload_spool_size_mb")
+    def upload_spool_size_mb_validator(cls, value: int, values):
+        if value >= 0:
+            return value
+        else:
+            raise ValueError("Incorrect upload_spool_size_mb!")
+
+    @validator("batch_max_images")
+    def batch_max_images_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect batch_max_images!")
+
+    @validator("batch_max_size_mb")
+    def batch_max_size_mb_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect batch_max_size_mb!")
+
+    @validator("fetch_max_size_mb")
+    def fetch_max_size_mb_validator(cls, value: int, values):
+        if value > 0:
+            return value
+        else:
+            raise ValueError("Incorrect fetch_max_size_mb!")
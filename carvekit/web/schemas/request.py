@@ -12,7 +12,7 @@ class Parameters(BaseModel):
     type: Optional[
         Literal["auto", "product", "person", "car"]
     ] = "auto"  # Not supported at the moment
-    format: Optional[Literal["auto", "jpg", "png", "zip"]] = "auto"
+    format: Optional[Literal["auto", "jpg", "png", "webp", "alpha", "zip"]] = "auto"
     roi: str = "0% 0% 100% 100%"
     crop: bool = False
     crop_margin: Optional[str] = "0px"
@@ -23,6 +23,29 @@ class Parameters(BaseModel):
     semitransparency: str = "false"  # Not supported at the moment
     bg_color: Optional[str] = ""
     bg_image_url: Optional[str] = ""
+    quality: Optional[int] = None  # jpg and lossy webp quality
+    lossless: bool = False  # lossless webp
+    compression: int = 6  # png compression level
+    timeout: Optional[float] = None  # seconds, after which the result is not needed
+    priority: Optional[Literal["high", "normal", "low"]] = "normal"
+
+    @validator("quality")
+    def quality_validator(cls, value):
+        if value is not None and not 1 <= value <= 100:
+            raise ValueError("quality must be in range between 1 and 100")
+        return value
+
+    @validator("compression")
+    def compression_validator(cls, value):
+        if not 0 <= value <= 9:
+            raise ValueError("compression must be in range between 0 and 9")
+        return value
+
+    @validator("timeout")
+    def timeout_validator(cls, value):
+        if value is not None and value <= 0:
+            raise ValueError("timeout must be greater than 0")
+        return value
 
     @validator("crop_margin")
     def crop_margin_validator(cls, value):
@@ -34,7 +57,7 @@ class Parameters(BaseModel):
             raise ValueError("crop_margin mast be in range between 0% and 100%")
         return value
 
-    @validator("scale")
+    @validator("scale", always=True)
     def scale_validator(cls, value):
         if value != "original" and (
             not re.match(r"[0-9]+%$", value)
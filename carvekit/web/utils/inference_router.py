@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from carvekit.api.interface import Interface
+from carvekit.web.schemas.config import WebAPIConfig
+from carvekit.web.utils.init_utils import (
+    init_interface,
+    init_typed_interfaces,
+    init_tier_postprocessing,
+)
+
+__all__ = ["InferenceRouter"]
+
+
+class InferenceRouter:
+    """Routes images to the interfaces of their types and quality tiers"""
+
+    def __init__(
+        self,
+        interface: Optional[Interface] = None,
+        typed_interfaces: Optional[Dict[str, Interface]] = None,
+        tier_postprocessing: Optional[Dict[str, object]] = None,
+    ):
+        """
+        Args:
+            interface: main interface, which processes images with auto type
+            typed_interfaces: interfaces by the type request parameter
+            tier_postprocessing: post-processing methods by the degraded quality tiers
+        """
+        self.interface = interface
+        self.typed_interfaces = typed_interfaces or {}
+        self.tier_postprocessing = tier_postprocessing or {}
+        self.tier_interfaces: Dict[Tuple[str, str], Interface] = {}
+
+    @classmethod
+    def from_config(cls, api_config: WebAPIConfig) -> "InferenceRouter":
+        """
+        Loads models of all configured interfaces.
+        Bound class method is picklable, so it is passed to the spawned inference workers.
+
+        Args:
+            api_config: config
+
+        Returns:
+            InferenceRouter instance
+        """
+        interface = init_interface(api_config)
+        return cls(
+            interface=interface,
+            typed_interfaces=init_typed_interfaces(api_config, interface),
+            tier_postprocessing=init_tier_postprocessing(api_config, interface),
+        )
+
+    @classmethod
+    def routing_only(
+        cls, image_types: List[str], tiers: List[str]
+    ) -> "InferenceRouter":
+        """
+        Creates router without models, which only answers routing questions.
+        Used by the parent process, when the models live in inference workers.
+
+        Args:
+            image_types: image types, which have own interfaces
+            tiers: supported degraded quality tiers
+
+        Returns:
+            InferenceRouter instance
+        """
+        return cls(
+            typed_interfaces=dict.fromkeys(image_types),
+            tier_postprocessing=dict.fromkeys(tiers),
+        )
+
+    def routing(self) -> Tuple[List[str], List[str]]:
+        """Returns image types, which have own interfaces, and supported quality tiers"""
+        return list(self.typed_interfaces.keys()), list(self.tier_postprocessing.keys())
+
+    def has_type(self, image_type: str) -> bool:
+        """Checks that the image type has own interface"""
+        return image_type in self.typed_interfaces
+
+    def has_tier(self, tier: str) -> bool:
+        """Checks that the degraded quality tier is configured and supported"""
+        return tier in self.tier_postprocessing
+
+    def variant_interface(self, image_type: str, tier: str) -> Interface:
+        """
+        Returns interface for the image type and quality tier
+
+        Args:
+            image_type: image type returned by MLProcessor.job_type
+            tier: quality tier
+
+        Returns:
+            Interface of the image type, which post-processing is replaced by the tier one
+        """
+        interface = self.typed_interfaces.get(image_type, self.interface)
+        if tier == "full":
+            return interface
+        if (image_type, tier) not in self.tier_interfaces:
+            # Networks are shared, so creation of the interface is cheap
+            self.tier_interfaces[(image_type, tier)] = Interface(
+                pre_pipe=interface.preprocessing_pipeline,
+                seg_pipe=interface.segmentation_pipeline,
+                post_pipe=self.tier_postprocessing[tier],
+                device=interface.device,
+            )
+        return self.tier_interfaces[(image_type, tier)]
+
+    def __call__(
+        self, images: List[Image.Image], variants: List[Tuple[str, str]]
+    ) -> List[Image.Image]:
+        """
+        Passes images through the interfaces of their types and quality tiers
+
+        Args:
+            images: list of images
+            variants: image types returned by MLProcessor.job_type
+                and quality tiers of the images
+
+        Returns:
+            list of interface outputs in the order of images
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for idx, variant in enumerate(variants):
+            groups.setdefault(tuple(variant), []).append(idx)
+        outputs = [None] * len(images)
+        for (image_type, tier), indices in groups.items():
+            interface = self.variant_interface(image_type, tier)
+            group_outputs = interface([images[idx] for idx in indices])
+            for idx, output in zip(indices, group_outputs):
+                outputs[idx] = output
+        return outputs
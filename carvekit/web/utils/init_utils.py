@@ -1,6 +1,6 @@
 import warnings
 from os import getenv
-from typing import Union
+from typing import Union, Dict, Optional
 
 from loguru import logger
 
@@ -11,6 +11,7 @@ from carvekit.web.schemas.config import WebAPIConfig, MLConfig, AuthConfig
 
 from carvekit.api.interface import Interface
 from carvekit.api.autointerface import AutoInterface
+from carvekit.api.fake import FakeInterface
 
 from carvekit.ml.wrap.fba_matting import FBAMatting
 from carvekit.ml.wrap.u2net import U2NET
@@ -23,6 +24,46 @@ from carvekit.ml.wrap.yolov4 import SimplifiedYoloV4
 from carvekit.pipelines.postprocessing import MattingMethod, CasMattingMethod
 from carvekit.pipelines.preprocessing import PreprocessingStub, AutoScene
 from carvekit.trimap.generator import TrimapGenerator
+from carvekit.utils.models_utils import model_registry
+
+
+def parse_type_networks(value: Optional[str], default: Dict[str, str]):
+    """
+    Parses networks for image types from the environment variable
+
+    Args:
+        value: comma separated type=network pairs, like person=isnet,product=tracer_b7.
+            Empty string disables routing by image type
+        default: value, if the environment variable is not set
+
+    Returns:
+        dict of segmentation network names by image types
+    """
+    if value is None:
+        return default
+    return dict(pair.strip().split("=", 1) for pair in value.split(",") if pair.strip())
+
+
+def parse_qos_tiers(value: Optional[str], default: Dict[str, float]):
+    """
+    Parses queue waits of quality tiers from the environment variable
+
+    Args:
+        value: comma separated tier=seconds pairs, like no_refine=5,segmentation=30.
+            Empty string disables degradation
+        default: value, if the environment variable is not set
+
+    Returns:
+        dict of queue waits by quality tiers
+    """
+    if value is None:
+        return default
+    return {
+        tier.strip(): float(wait)
+        for tier, wait in (
+            pair.split("=", 1) for pair in value.split(",") if pair.strip()
+        )
+    }
 
 
 def init_config() -> WebAPIConfig:
@@ -31,7 +72,47 @@ def init_config() -> WebAPIConfig:
         **dict(
             port=int(getenv("CARVEKIT_PORT", default_config.port)),
             host=getenv("CARVEKIT_HOST", default_config.host),
+            fetch_timeout=float(
+                getenv("CARVEKIT_FETCH_TIMEOUT", default_config.fetch_timeout)
+            ),
+            fetch_max_size_mb=int(
+                getenv("CARVEKIT_FETCH_MAX_SIZE_MB", default_config.fetch_max_size_mb)
+            ),
+            upload_max_size_mb=int(
+                getenv("CARVEKIT_UPLOAD_MAX_SIZE_MB", default_config.upload_max_size_mb)
+            ),
+            upload_spool_size_mb=int(
+                getenv(
+                    "CARVEKIT_UPLOAD_SPOOL_SIZE_MB", default_config.upload_spool_size_mb
+                )
+            ),
+            batch_max_images=int(
+                getenv("CARVEKIT_BATCH_MAX_IMAGES", default_config.batch_max_images)
+            ),
+            batch_max_size_mb=int(
+                getenv("CARVEKIT_BATCH_MAX_SIZE_MB", default_config.batch_max_size_mb)
+            ),
             ml=MLConfig(
+                inference_backend=getenv(
+                    "CARVEKIT_INFERENCE_BACKEND", default_config.ml.inference_backend
+                ),
+                fake_latency_ms=float(
+                    getenv(
+                        "CARVEKIT_FAKE_LATENCY_MS", default_config.ml.fake_latency_ms
+                    )
+                ),
+                fake_latency_ms_per_mp=float(
+                    getenv(
+                        "CARVEKIT_FAKE_LATENCY_MS_PER_MP",
+                        default_config.ml.fake_latency_ms_per_mp,
+                    )
+                ),
+                fake_latency_std_ms=float(
+                    getenv(
+                        "CARVEKIT_FAKE_LATENCY_STD_MS",
+                        default_config.ml.fake_latency_std_ms,
+                    )
+                ),
                 segmentation_network=getenv(
                     "CARVEKIT_SEGMENTATION_NETWORK",
                     default_config.ml.segmentation_network,
@@ -44,6 +125,21 @@ def init_config() -> WebAPIConfig:
                     "CARVEKIT_POSTPROCESSING_METHOD",
                     default_config.ml.postprocessing_method,
                 ),
+                type_networks=parse_type_networks(
+                    getenv("CARVEKIT_TYPE_NETWORKS"), default_config.ml.type_networks
+                ),
+                qos_tiers=parse_qos_tiers(
+                    getenv("CARVEKIT_QOS_TIERS"), default_config.ml.qos_tiers
+                ),
+                qos_matting_mask_size=int(
+                    getenv(
+                        "CARVEKIT_QOS_MATTING_MASK_SIZE",
+                        default_config.ml.qos_matting_mask_size,
+                    )
+                ),
+                models_max_mb=int(
+                    getenv("CARVEKIT_MODELS_MAX_MB", default_config.ml.models_max_mb)
+                ),
                 device=getenv("CARVEKIT_DEVICE", default_config.ml.device),
                 batch_size_pre=int(
                     getenv("CARVEKIT_BATCH_SIZE_PRE", default_config.ml.batch_size_pre)
@@ -93,6 +189,58 @@ def init_config() -> WebAPIConfig:
                 trimap_erosion=int(
                     getenv("CARVEKIT_TRIMAP_EROSION", default_config.ml.trimap_erosion)
                 ),
+                batch_max_wait_ms=int(
+                    getenv(
+                        "CARVEKIT_BATCH_MAX_WAIT_MS",
+                        default_config.ml.batch_max_wait_ms,
+                    )
+                ),
+                inference_workers=int(
+                    getenv(
+                        "CARVEKIT_INFERENCE_WORKERS",
+                        default_config.ml.inference_workers,
+                    )
+                ),
+                queue_max_jobs=int(
+                    getenv("CARVEKIT_QUEUE_MAX_JOBS", default_config.ml.queue_max_jobs)
+                ),
+                queue_max_megapixels=float(
+                    getenv(
+                        "CARVEKIT_QUEUE_MAX_MEGAPIXELS",
+                        default_config.ml.queue_max_megapixels,
+                    )
+                ),
+                warmup=bool(int(getenv("CARVEKIT_WARMUP", default_config.ml.warmup))),
+                queue_policy=getenv(
+                    "CARVEKIT_QUEUE_POLICY", default_config.ml.queue_policy
+                ),
+                queue_aging=float(
+                    getenv("CARVEKIT_QUEUE_AGING", default_config.ml.queue_aging)
+                ),
+                cache_max_mb=int(
+                    getenv("CARVEKIT_CACHE_MAX_MB", default_config.ml.cache_max_mb)
+                ),
+                cache_dir=getenv("CARVEKIT_CACHE_DIR", default_config.ml.cache_dir),
+                cache_dir_max_mb=int(
+                    getenv(
+                        "CARVEKIT_CACHE_DIR_MAX_MB", default_config.ml.cache_dir_max_mb
+                    )
+                ),
+                results_max_mb=int(
+                    getenv("CARVEKIT_RESULTS_MAX_MB", default_config.ml.results_max_mb)
+                ),
+                results_ttl=int(
+                    getenv("CARVEKIT_RESULTS_TTL", default_config.ml.results_ttl)
+                ),
+                results_dir=getenv(
+                    "CARVEKIT_RESULTS_DIR", default_config.ml.results_dir
+                ),
+                results_dir_max_mb=int(
+                    getenv(
+                        "CARVEKIT_RESULTS_DIR_MAX_MB",
+                        default_config.ml.results_dir_max_mb,
+                    )
+                ),
             ),
             auth=AuthConfig(
                 auth=bool(
@@ -104,6 +252,15 @@ def init_config() -> WebAPIConfig:
                 allowed_tokens=default_config.auth.allowed_tokens
                 if getenv("CARVEKIT_ALLOWED_TOKENS") is None
                 else getenv("CARVEKIT_ALLOWED_TOKENS").split(","),
+                rate_limit=float(
+                    getenv("CARVEKIT_RATE_LIMIT", default_config.auth.rate_limit)
+                ),
+                rate_limit_burst=float(
+                    getenv(
+                        "CARVEKIT_RATE_LIMIT_BURST",
+                        default_config.auth.rate_limit_burst,
+                    )
+                ),
             ),
         )
     )
@@ -113,9 +270,105 @@ def init_config() -> WebAPIConfig:
     return config
 
 
+SEGMENTATION_NETWORKS = {
+    "u2net": U2NET,
+    "isnet": ISNet,
+    "deeplabv3": DeepLabV3,
+    "basnet": BASNET,
+    "tracer_b7": TracerUniversalB7,
+}
+
+
+def init_segmentation_network(config: MLConfig, name: str):
+    """
+    Initializes segmentation network
+
+    Args:
+        config: ml config
+        name: network name
+
+    Returns:
+        segmentation network instance, tracer_b7 for unknown names
+    """
+    return SEGMENTATION_NETWORKS.get(name, TracerUniversalB7)(
+        device=config.device,
+        batch_size=config.batch_size_seg,
+        input_image_size=config.seg_mask_size,
+        fp16=config.fp16,
+    )
+
+
+def init_postprocessing(config: MLConfig):
+    """
+    Initializes post-processing method
+
+    Args:
+        config: ml config
+
+    Returns:
+        post-processing method instance or None
+    """
+    if config.postprocessing_method == "fba":
+        fba = model_registry.get_resident(
+            FBAMatting,
+            device=config.device,
+            batch_size=config.batch_size_matting,
+            input_tensor_size=config.matting_mask_size,
+            fp16=config.fp16,
+        )
+        trimap_generator = TrimapGenerator(
+            prob_threshold=config.trimap_prob_threshold,
+            kernel_size=config.trimap_dilation,
+            erosion_iters=config.trimap_erosion,
+        )
+        return MattingMethod(
+            device=config.device,
+            matting_module=fba,
+            trimap_generator=trimap_generator,
+        )
+    elif config.postprocessing_method == "cascade_fba":
+        cascadepsp = model_registry.get_resident(
+            CascadePSP,
+            device=config.device,
+            batch_size=config.batch_size_refine,
+            input_tensor_size=config.refine_mask_size,
+            fp16=config.fp16,
+        )
+        fba = model_registry.get_resident(
+            FBAMatting,
+            device=config.device,
+            batch_size=config.batch_size_matting,
+            input_tensor_size=config.matting_mask_size,
+            fp16=config.fp16,
+        )
+        trimap_generator = TrimapGenerator(
+            prob_threshold=config.trimap_prob_threshold,
+            kernel_size=config.trimap_dilation,
+            erosion_iters=config.trimap_erosion,
+        )
+        return CasMattingMethod(
+            device=config.device,
+            matting_module=fba,
+            trimap_generator=trimap_generator,
+            refining_module=cascadepsp,
+        )
+    else:
+        return None
+
+
 def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
     if isinstance(config, WebAPIConfig):
         config = config.ml
+    model_registry.max_bytes = (
+        config.models_max_mb * 1024 * 1024 if config.models_max_mb > 0 else None
+    )
+    if config.inference_backend == "fake":
+        return FakeInterface(
+            latency_ms=config.fake_latency_ms,
+            latency_ms_per_mp=config.fake_latency_ms_per_mp,
+            latency_std_ms=config.fake_latency_std_ms,
+            device=config.device,
+        )
     if config.preprocessing_method == "auto":
         warnings.warn(
             "Preprocessing_method is set to `auto`."
@@ -132,6 +385,8 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
             scene_classifier=scene_classifier,
             object_classifier=object_classifier,
             segmentation_batch_size=config.batch_size_seg,
+            refining_batch_size=config.batch_size_refine,
+            refining_image_size=config.refine_mask_size,
             postprocessing_batch_size=config.batch_size_matting,
             postprocessing_image_size=config.matting_mask_size,
             segmentation_device=config.device,
@@ -140,48 +395,7 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
         )
 
     else:
-        if config.segmentation_network == "u2net":
-            seg_net = U2NET(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
-        elif config.segmentation_network == "isnet":
-            seg_net = ISNet(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
-        elif config.segmentation_network == "deeplabv3":
-            seg_net = DeepLabV3(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
-        elif config.segmentation_network == "basnet":
-            seg_net = BASNET(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
-        elif config.segmentation_network == "tracer_b7":
-            seg_net = TracerUniversalB7(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
-        else:
-            seg_net = TracerUniversalB7(
-                device=config.device,
-                batch_size=config.batch_size_seg,
-                input_image_size=config.seg_mask_size,
-                fp16=config.fp16,
-            )
+        seg_net = init_segmentation_network(config, config.segmentation_network)
 
         if config.preprocessing_method == "stub":
             preprocessing = PreprocessingStub()
@@ -198,56 +412,111 @@ def init_interface(config: Union[WebAPIConfig, MLConfig]) -> Interface:
         else:
             preprocessing = None
 
-        if config.postprocessing_method == "fba":
-            fba = FBAMatting(
-                device=config.device,
-                batch_size=config.batch_size_matting,
-                input_tensor_size=config.matting_mask_size,
-                fp16=config.fp16,
-            )
-            trimap_generator = TrimapGenerator(
-                prob_threshold=config.trimap_prob_threshold,
-                kernel_size=config.trimap_dilation,
-                erosion_iters=config.trimap_erosion,
-            )
-            postprocessing = MattingMethod(
-                device=config.device,
-                matting_module=fba,
-                trimap_generator=trimap_generator,
-            )
-        elif config.postprocessing_method == "cascade_fba":
-            cascadepsp = CascadePSP(
-                device=config.device,
-                batch_size=config.batch_size_refine,
-                input_tensor_size=config.refine_mask_size,
-                fp16=config.fp16,
-            )
-            fba = FBAMatting(
-                device=config.device,
-                batch_size=config.batch_size_matting,
-                input_tensor_size=config.matting_mask_size,
-                fp16=config.fp16,
-            )
-            trimap_generator = TrimapGenerator(
-                prob_threshold=config.trimap_prob_threshold,
-                kernel_size=config.trimap_dilation,
-                erosion_iters=config.trimap_erosion,
-            )
-            postprocessing = CasMattingMethod(
-                device=config.device,
-                matting_module=fba,
-                trimap_generator=trimap_generator,
-                refining_module=cascadepsp,
-            )
-        elif config.postprocessing_method == "none":
-            postprocessing = None
-        else:
-            postprocessing = None
-
         interface = Interface(
             pre_pipe=preprocessing,
-            post_pipe=postprocessing,
+            post_pipe=init_postprocessing(config),
             seg_pipe=seg_net,
             device=config.device,
         )
     return interface
+
+
+def init_typed_interfaces(
+    config: Union[WebAPIConfig, MLConfig], interface: Interface
+) -> Dict[str, Interface]:
+    """
+    Initializes interfaces for requests with specified image type.
+    Segmentation networks stay loaded and are shared between the interfaces,
+    post-processing is shared with the main interface.
+
+    Args:
+        config: config
+        interface: main interface, which processes requests with auto type
+
+    Returns:
+        dict of interfaces by the type request parameter
+    """
+    if isinstance(config, WebAPIConfig):
+        config = config.ml
+    if isinstance(interface, FakeInterface):
+        return {}
+    if isinstance(interface, AutoInterface):
+        networks = {}
+        # Matting networks are taken from the model registry, so they are shared with AutoInterface
+        postprocessing = init_postprocessing(config)
+    else:
+        networks = {config.segmentation_network: interface.segmentation_pipeline}
+        postprocessing = interface.postprocessing_pipeline
+
+    interfaces = {}
+    for image_type, network_name in config.type_networks.items():
+        if network_name not in networks:
+            if isinstance(interface, AutoInterface):
+                # Same registry key as in AutoInterface, so both use the same instance.
+                # Typed interfaces keep the network, so it is resident
+                networks[network_name] = model_registry.get_resident(
+                    SEGMENTATION_NETWORKS.get(network_name, TracerUniversalB7),
+                    device=interface.segmentation_device,
+                    batch_size=interface.segmentation_batch_size,
+                    fp16=interface.fp16,
+                )
+            else:
+                networks[network_name] = init_segmentation_network(config, network_name)
+        interfaces[image_type] = Interface(
+            pre_pipe=None,
+            post_pipe=postprocessing,
+            seg_pipe=networks[network_name],
+            device=config.device,
+        )
+    if isinstance(interface.preprocessing_pipeline, AutoScene):
+        # The scene classifier selects from the already loaded networks
+        interface.preprocessing_pipeline.networks = list(networks.values())
+    return interfaces
+
+
+def init_tier_postprocessing(
+    config: Union[WebAPIConfig, MLConfig], interface: Interface
+) -> Dict[str, Optional[Union[MattingMethod, CasMattingMethod]]]:
+    """
+    Initializes post-processing methods of the degraded quality tiers.
+    Matting network and trimap generator are shared with the main interface.
+
+    Args:
+        config: config
+        interface: main interface
+
+    Returns:
+        dict of post-processing methods by the configured quality tiers.
+        Tiers, which aren't supported by the interface, are missing
+    """
+    if isinstance(config, WebAPIConfig):
+        config = config.ml
+    if len(config.qos_tiers) == 0:
+        return {}
+    if isinstance(interface, (AutoInterface, FakeInterface)):
+        warnings.warn(
+            "Quality tiers aren't supported with this interface, degradation is disabled."
+        )
+        return {}
+    postprocessing = interface.postprocessing_pipeline
+    tiers = {}
+    for tier in config.qos_tiers:
+        if tier == "segmentation":
+            tiers[tier] = None
+        elif not isinstance(postprocessing, (MattingMethod, CasMattingMethod)):
+            warnings.warn(f"Quality tier {tier} requires FBA post-processing, skipped.")
+        elif tier == "no_refine":
+            tiers[tier] = MattingMethod(
+                device=config.device,
+                matting_module=postprocessing.matting_module,
+                trimap_generator=postprocessing.trimap_generator,
+            )
+        elif tier == "fast_matting":
+            # Smaller size is passed with each call, so the network isn't copied
+            tiers[tier] = MattingMethod(
+                device=config.device,
+                matting_module=postprocessing.matting_module,
+                trimap_generator=postprocessing.trimap_generator,
+                input_image_size=config.qos_matting_mask_size,
+            )
+    return tiers
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Optional, Dict, Tuple, Union
+
+from PIL import Image
+from loguru import logger
+
+__all__ = ["MatteCache"]
+
+
+class MatteCache:
+    """
+    Content-addressed cache of alpha mattes.
+
+    Notes:
+        Only alpha mattes are stored, since the interface output is fully determined by
+        the input image and its alpha matte. Recently used mattes are kept in memory,
+        evicted mattes can be kept on disk. Identical images, which are being processed
+        at the moment, are coalesced, so each image is inferred only once.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_bytes: int,
+        disk_path: Optional[Union[str, Path]] = None,
+        disk_max_bytes: int = 0,
+    ):
+        """
+        Args:
+            namespace: string, which identifies the pipeline config. Mattes from different
+                namespaces never match
+            max_bytes: in-memory tier size in bytes
+            disk_path: directory for the on-disk tier, disabled if None
+            disk_max_bytes: on-disk tier size in bytes
+        """
+        self.namespace = namespace.encode()
+        self.max_bytes = max_bytes
+        self.disk_path = Path(disk_path) if disk_path is not None else None
+        self.disk_max_bytes = disk_max_bytes
+        self.lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        if self.disk_path is not None:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+            files = sorted(
+                self.disk_path.glob("*.alpha"), key=lambda x: x.stat().st_mtime
+            )
+            for file in files:
+                self._disk[file.stem] = file.stat().st_size
+                self._disk_bytes += file.stat().st_size
+
+    @staticmethod
+    def digest(source: Union[bytes, Image.Image]) -> str:
+        """
+        Computes content digest of the uploaded image.
+        Hashing takes a noticeable time for large images, so it is done by the request handler
+        instead of the batching thread.
+
+        Args:
+            source: uploaded image file or decoded image, if the file isn't kept
+
+        Returns:
+            hex digest of the file bytes or of the image pixels and size
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        if isinstance(source, Image.Image):
+            digest.update(f"{source.mode} {source.size[0]}x{source.size[1]}".encode())
+            digest.update(source.tobytes())
+        else:
+            digest.update(source)
+        return digest.hexdigest()
+
+    def key(self, digest: str, variant: str = "", geometry: tuple = ()) -> str:
+        """
+        Computes cache key of the image
+
+        Args:
+            digest: content digest of the uploaded image returned by digest
+            variant: name of the interface variant, which processes the image
+            geometry: sizes and region of interest box, which select the part
+                of the uploaded image passed to the interface
+
+        Returns:
+            hex digest of the image digest, geometry, pipeline config and variant
+        """
+        key = hashlib.blake2b(self.namespace, digest_size=20)
+        key.update(f"{variant} {digest} {geometry}".encode())
+        return key.hexdigest()
+
+    def get(self, key: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+        """
+        Returns cached alpha matte
+
+        Args:
+            key: cache key
+            size: image size
+
+        Returns:
+            Alpha matte as L mode PIL image or None if it is not cached
+        """
+        with self.lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            elif key in self._disk:
+                self._disk.move_to_end(key)
+        if data is None and key in self._disk:
+            try:
+                data = self._file(key).read_bytes()
+            except OSError:
+                data = None
+            if data is not None:
+                self._put_memory(key, data)
+        if data is None or len(data) != size[0] * size[1]:
+            return None
+        return Image.frombytes("L", size, data)
+
+    def put(self, key: str, alpha: Image.Image):
+        """
+        Stores alpha matte
+
+        Args:
+            key: cache key
+            alpha: L mode alpha matte
+        """
+        self._put_memory(key, alpha.tobytes())
+
+    def claim(self, key: str) -> Optional[Future]:
+        """
+        Registers in-flight processing of the image
+
+        Args:
+            key: cache key
+
+        Returns:
+            Future of the alpha matte if the same image is already processed,
+            None if the caller should process the image and call resolve
+        """
+        with self.lock:
+            future = self._inflight.get(key)
+            if future is None:
+                self._inflight[key] = Future()
+            return future
+
+    def resolve(
+        self,
+        key: str,
+        alpha: Optional[Image.Image] = None,
+        error: Optional[BaseException] = None,
+    ):
+        """
+        Finishes in-flight processing of the image, stores its alpha matte and
+        passes it to all coalesced requests
+
+        Args:
+            key: cache key
+            alpha: L mode alpha matte
+            error: processing error, if alpha matte is not available
+        """
+        if alpha is not None:
+            self.put(key, alpha)
+        with self.lock:
+            future = self._inflight.pop(key, None)
+        if future is None:
+            return
+        if alpha is not None:
+            future.set_result(alpha)
+        else:
+            future.set_exception(error or RuntimeError("Alpha matte is not available"))
+
+    def _put_memory(self, key: str, data: bytes):
+        evicted = []
+        with self.lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            if len(data) > self.max_bytes:
+                evicted.append((key, data))
+            else:
+                self._memory[key] = data
+                self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_bytes:
+                evicted_key, evicted_data = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted_data)
+                evicted.append((evicted_key, evicted_data))
+        for evicted_key, evicted_data in evicted:
+            self._put_disk(evicted_key, evicted_data)
+
+    def _put_disk(self, key: str, data: bytes):
+        if self.disk_path is None or len(data) > self.disk_max_bytes:
+            return
+        with self.lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            removed = []
+            while self._disk_bytes > self.disk_max_bytes:
+                removed_key, removed_size = self._disk.popitem(last=False)
+                self._disk_bytes -= removed_size
+                removed.append(removed_key)
+        try:
+            temp_file = self._file(key).with_suffix(f".{threading.get_ident()}.tmp")
+            temp_file.write_bytes(data)
+            os.replace(temp_file, self._file(key))
+            for removed_key in removed:
+                self._file(removed_key).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to write alpha matte cache file: {str(e)}")
+
+    def _file(self, key: str) -> Path:
+        return self.disk_path.joinpath(f"{key}.alpha")
@@ -0,0 +1,83 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+from carvekit.utils.timing_utils import add_stage_listener
+
+__all__ = [
+    "QUEUE_DEPTH",
+    "JOBS_IN_PROGRESS",
+    "QUEUE_WAIT",
+    "BATCH_SIZE",
+    "STAGE_DURATION",
+    "IMAGES_PROCESSED",
+    "JOBS_FAILED",
+    "JOBS_REJECTED",
+    "JOBS_SHED",
+    "MEGAPIXELS_SHED",
+    "MATTE_CACHE_HITS",
+    "MATTE_CACHE_COALESCED",
+    "QUALITY_TIER_JOBS",
+]
+
+# Process RSS, cpu time and open fds are exported by the default process collector
+# of prometheus_client as process_resident_memory_bytes etc.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+QUEUE_DEPTH = Gauge("carvekit_queue_depth", "Count of jobs waiting in the queue")
+JOBS_IN_PROGRESS = Gauge(
+    "carvekit_jobs_in_progress", "Count of accepted and not yet finished jobs"
+)
+QUEUE_WAIT = Histogram(
+    "carvekit_queue_wait_seconds",
+    "Time between job submission and the start of its processing",
+    buckets=LATENCY_BUCKETS,
+)
+BATCH_SIZE = Histogram(
+    "carvekit_batch_size",
+    "Count of images passed through the interface at once",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+STAGE_DURATION = Histogram(
+    "carvekit_stage_duration_seconds",
+    "Duration of processing stages",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+IMAGES_PROCESSED = Counter(
+    "carvekit_images_processed_total",
+    "Count of successfully processed images, use rate() to get images per second",
+)
+JOBS_FAILED = Counter("carvekit_jobs_failed_total", "Count of jobs finished with error")
+JOBS_REJECTED = Counter(
+    "carvekit_jobs_rejected_total", "Count of jobs rejected because of full queue"
+)
+JOBS_SHED = Counter(
+    "carvekit_jobs_shed_total",
+    "Count of jobs dropped because the client disconnected or the deadline passed",
+    ["reason", "stage"],
+)
+MEGAPIXELS_SHED = Counter(
+    "carvekit_megapixels_shed_total",
+    "Megapixels of images, which were not processed because their jobs were dropped",
+    ["reason", "stage"],
+)
+MATTE_CACHE_HITS = Counter(
+    "carvekit_matte_cache_hits_total", "Count of jobs finalized with a cached matte"
+)
+MATTE_CACHE_COALESCED = Counter(
+    "carvekit_matte_cache_coalesced_total",
+    "Count of jobs, which waited for the matte of an identical image in processing",
+)
+
+QUALITY_TIER_JOBS = Counter(
+    "carvekit_quality_tier_jobs_total",
+    "Count of jobs processed at each quality tier",
+    ["tier"],
+)
+
+
+def _observe_stage(stage: str, seconds: float):
+    STAGE_DURATION.labels(stage).observe(seconds)
+
+
+add_stage_listener(_observe_stage)
@@ -1,8 +1,12 @@
+import asyncio
 import socket
 import struct
 from typing import Optional
 from urllib.parse import urlparse
 
+import httpx
+from PIL import Image, ImageFile
+
 
 def is_loopback(address):
     host: Optional[str] = None
@@ -32,3 +36,103 @@ def is_loopback(address):
         return True
 
     return False
+
+
+class ImageFetcher:
+    """Shared asynchronous http client for downloading images by url"""
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        max_size: int = 50 * 1024 * 1024,
+        max_connections: int = 100,
+        allow_loopback: bool = False,
+    ):
+        """
+        Args:
+            timeout: maximum time in seconds for downloading one image
+            max_size: maximum size of downloaded image in bytes
+            max_connections: maximum count of simultaneously open connections
+            allow_loopback: allows downloading images from loopback addresses
+        """
+        self.timeout = timeout
+        self.max_size = max_size
+        self.allow_loopback = allow_loopback
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections // 5,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Connection pool shared by all requests"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                follow_redirects=True,
+                event_hooks={"request": [self._check_request]},
+            )
+        return self._client
+
+    async def is_url_allowed(self, url: str) -> bool:
+        """
+        Checks that url is http(s) url, which doesn't point to the loopback address
+
+        Args:
+            url: image url
+
+        Returns:
+            True if image can be downloaded from this url
+        """
+        if not (url.startswith("http://") or url.startswith("https://")):
+            return False
+        if self.allow_loopback:
+            return True
+        # is_loopback resolves host name, so it shouldn't block the event loop
+        return not await asyncio.get_running_loop().run_in_executor(
+            None, is_loopback, url
+        )
+
+    async def _check_request(self, request: httpx.Request):
+        """Checks every request including redirects for possible ssrf"""
+        if not await self.is_url_allowed(str(request.url)):
+            raise ValueError(f"Url is not allowed: {request.url}")
+
+    async def fetch_image(self, url: str) -> Image.Image:
+        """
+        Downloads image and decodes it while receiving
+
+        Args:
+            url: image url
+
+        Returns:
+            Decoded PIL.Image.Image instance
+
+        Raises:
+            ValueError: if url is not allowed or image is too large
+            asyncio.TimeoutError: if image is not downloaded in time
+            httpx.HTTPError: if request is failed
+        """
+        return await asyncio.wait_for(self._fetch_image(url), self.timeout)
+
+    async def _fetch_image(self, url: str) -> Image.Image:
+        parser = ImageFile.Parser()
+        received = 0
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            if int(response.headers.get("Content-Length", 0)) > self.max_size:
+                raise ValueError("Image is too large")
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_size:
+                    raise ValueError("Image is too large")
+                parser.feed(chunk)
+        return parser.close()
+
+    async def close(self):
+        """Closes all connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,113 @@
+import math
+import threading
+import time
+from typing import Dict, List
+
+__all__ = ["RateLimitExceeded", "RateLimiter"]
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the API key has spent its rate limit"""
+
+    def __init__(self, retry_after: int, headers: Dict[str, str]):
+        """
+        Args:
+            retry_after: time in seconds after which the API key can send requests again
+            headers: X-Ratelimit headers of the API key
+        """
+        super().__init__("Rate limit exceeded")
+        self.retry_after = retry_after
+        self.headers = headers
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter for API keys.
+
+    Notes:
+        Requests are charged after their images are read, since the cost depends on
+        the image size. So a request is admitted while the bucket is not empty and
+        the bucket can go into debt, which delays the next requests of this API key.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Args:
+            rate: cost units, which every API key earns per second. 0 disables rate limiting
+            burst: bucket capacity in cost units
+        """
+        self.rate = rate
+        self.burst = burst
+        self.lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # key: [tokens, updated_at]
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _tokens(self, key: str) -> float:
+        """Refills the bucket and returns its tokens, must be called with the lock acquired"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        return bucket[0]
+
+    def check(self, key: str):
+        """
+        Checks that the API key can send a request
+
+        Args:
+            key: API key
+
+        Raises:
+            RateLimitExceeded: if the bucket of the API key is empty
+        """
+        if not self.enabled:
+            return
+        wait_time = self.wait_time(key)
+        if wait_time > 0:
+            raise RateLimitExceeded(max(1, math.ceil(wait_time)), self.headers(key))
+
+    def charge(self, key: str, cost: float):
+        """
+        Takes the request cost from the bucket of the API key
+
+        Args:
+            key: API key
+            cost: request cost
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self._buckets[key][0] = self._tokens(key) - cost
+
+    def wait_time(self, key: str) -> float:
+        """
+        Returns time in seconds until the bucket of the API key is not empty
+        """
+        if not self.enabled:
+            return 0.0
+        with self.lock:
+            tokens = self._tokens(key)
+        return 0.0 if tokens > 0 else (-tokens + 1e-6) / self.rate
+
+    def headers(self, key: str) -> Dict[str, str]:
+        """
+        Returns X-Ratelimit headers of the API key
+
+        Args:
+            key: API key
+
+        Returns:
+            bucket capacity, remaining cost units and time in seconds until the bucket is full
+        """
+        with self.lock:
+            tokens = self._tokens(key)
+        return {
+            "X-Ratelimit-Limit": str(math.floor(self.burst)),
+            "X-Ratelimit-Remaining": str(max(0, math.floor(tokens))),
+            "X-Ratelimit-Reset": str(math.ceil((self.burst - tokens) / self.rate)),
+        }
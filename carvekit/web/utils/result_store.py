@@ -0,0 +1,206 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from loguru import logger
+
+__all__ = ["ResultStore"]
+
+
+class ResultStore:
+    """
+    Byte-bounded store of job results with LRU and TTL eviction.
+
+    Notes:
+        Recently used results are kept in memory. Results evicted from memory or larger
+        than the memory budget are spilled to disk, if the on-disk tier is enabled.
+        All results share one TTL, so the insertion order is also the expiration order
+        and expired results are always at the head of it. Lookup and eviction are O(1).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        disk_path: Optional[Union[str, Path]] = None,
+        disk_max_bytes: int = 0,
+    ):
+        """
+        Args:
+            max_bytes: in-memory tier size in bytes
+            ttl: time in seconds, after which results are evicted
+            disk_path: directory for the on-disk tier, disabled if None
+            disk_max_bytes: on-disk tier size in bytes
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_path = Path(disk_path) if disk_path is not None else None
+        self.disk_max_bytes = disk_max_bytes
+        self.lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._expires: "OrderedDict[str, float]" = OrderedDict()
+        self._spilling: Dict[str, Any] = {}  # results, which are being written to disk
+        if self.disk_path is not None:
+            self.disk_path.mkdir(parents=True, exist_ok=True)
+            # Results of the previous run can't be requested anymore
+            for file in self.disk_path.glob("*.result"):
+                file.unlink(missing_ok=True)
+
+    def __contains__(self, key: str) -> bool:
+        self.expire()
+        return key in self._expires
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of results in the memory tier in bytes"""
+        return self._memory_bytes
+
+    def put(self, key: str, value: Any, size: int):
+        """
+        Stores result
+
+        Args:
+            key: result key
+            value: picklable result
+            size: approximate result size in bytes
+        """
+        self.expire()
+        spilled = []
+        with self.lock:
+            self._remove(key)
+            self._expires[key] = time.monotonic() + self.ttl
+            if size > self.max_bytes:
+                if self.disk_path is None or size > self.disk_max_bytes:
+                    logger.warning(f"Result {key} is too large for the result store")
+                spilled.append((key, value, size))
+            else:
+                self._memory[key] = value, size
+                self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes:
+                evicted_key, (evicted_value, evicted_size) = self._memory.popitem(
+                    last=False
+                )
+                self._memory_bytes -= evicted_size
+                spilled.append((evicted_key, evicted_value, evicted_size))
+            if self.disk_path is not None:
+                for spilled_key, spilled_value, _ in spilled:
+                    self._spilling[spilled_key] = spilled_value
+        for spilled_key, spilled_value, spilled_size in spilled:
+            self._put_disk(spilled_key, spilled_value, spilled_size)
+
+    def get(self, key: str, pop: bool = False) -> Optional[Any]:
+        """
+        Returns stored result
+
+        Args:
+            key: result key
+            pop: removes the result from the store
+
+        Returns:
+            Result or None if it is not found or expired
+        """
+        self.expire()
+        with self.lock:
+            entry = self._memory.get(key)
+            if entry is None and key in self._spilling:
+                entry = self._spilling[key], 0
+            on_disk = entry is None and key in self._disk
+            if pop:
+                self._remove(key, unlink=False)
+            elif entry is not None:
+                self._memory.move_to_end(key)
+            elif on_disk:
+                self._disk.move_to_end(key)
+        if entry is not None:
+            return entry[0]
+        if not on_disk:
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                value = pickle.load(f)
+            if pop:
+                self._file(key).unlink(missing_ok=True)
+            return value
+        except OSError:
+            return None
+
+    def pop(self, key: str) -> Optional[Any]:
+        """
+        Removes result from the store
+
+        Args:
+            key: result key
+
+        Returns:
+            Result or None if it is not found or expired
+        """
+        return self.get(key, pop=True)
+
+    def expire(self):
+        """Evicts expired results"""
+        now = time.monotonic()
+        with self.lock:
+            while len(self._expires) > 0:
+                key, expires_at = next(iter(self._expires.items()))
+                if expires_at > now:
+                    break
+                self._remove(key)
+
+    def _remove(self, key: str, unlink: bool = True):
+        """Removes result from all tiers, must be called with the lock acquired"""
+        if self._expires.pop(key, None) is None:
+            return
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+            if unlink:
+                self._file(key).unlink(missing_ok=True)
+
+    def _put_disk(self, key: str, value: Any, size: int):
+        with self.lock:
+            if self.disk_path is None or size > self.disk_max_bytes:
+                self._spilling.pop(key, None)
+                self._expires.pop(key, None)
+                return
+            if key not in self._expires:  # removed meanwhile
+                self._spilling.pop(key, None)
+                return
+            self._disk[key] = size
+            self._disk_bytes += size
+            removed = []
+            while self._disk_bytes > self.disk_max_bytes:
+                removed_key, removed_size = self._disk.popitem(last=False)
+                self._disk_bytes -= removed_size
+                self._expires.pop(removed_key, None)
+                removed.append(removed_key)
+        try:
+            temp_file = self._file(key).with_suffix(f".{threading.get_ident()}.tmp")
+            with open(temp_file, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self._file(key))
+            for removed_key in removed:
+                self._file(removed_key).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Failed to write result store file: {str(e)}")
+        finally:
+            with self.lock:
+                self._spilling.pop(key, None)
+                removed = key not in self._expires  # popped or evicted meanwhile
+            if removed:
+                self._file(key).unlink(missing_ok=True)
+
+    def _file(self, key: str) -> Path:
+        return self.disk_path.joinpath(f"{key}.result")
@@ -1,67 +1,631 @@
-import gc
+import heapq
+import math
+import queue
 import threading
 import time
 import uuid
-from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, List, Tuple, Union
 
+from PIL import Image, ImageDraw
 from loguru import logger
 
-from carvekit.api.interface import Interface
+from carvekit.utils.mask_utils import apply_mask
+from carvekit.utils.timing_utils import stage_timer, report_stage_time
+from carvekit.web.utils import metrics
+from carvekit.web.responses.api import error_dict
 from carvekit.web.schemas.config import WebAPIConfig
-from carvekit.web.utils.init_utils import init_interface
-from carvekit.web.other.removebg import process_remove_bg
+from carvekit.web.utils.inference_router import InferenceRouter
+from carvekit.web.utils.matte_cache import MatteCache
+from carvekit.web.utils.result_store import ResultStore
+from carvekit.web.utils.worker_pool import InferenceWorkerPool
+from carvekit.web.other.removebg import (
+    prepare_remove_bg,
+    finalize_remove_bg,
+    scaled_size,
+)
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue of MLProcessor has reached its limits"""
+
+    def __init__(self, retry_after: int):
+        """
+        Args:
+            retry_after: estimated time in seconds after which the queue will have free space
+        """
+        super().__init__("Job queue is full")
+        self.retry_after = retry_after
+
+
+class Job:
+    """Background removal job, which is processed by MLProcessor"""
+
+    def __init__(
+        self,
+        data: list,
+        deadline: Optional[float] = None,
+        keep_result: bool = True,
+        digest: Optional[str] = None,
+    ):
+        """
+        Args:
+            data: data object [parameters, image, bg, is_json_or_www_encoded]
+            deadline: time.monotonic() value, after which the job result is not needed
+            keep_result: stores the result until it is requested by job_result
+            digest: content digest of the uploaded image returned by MatteCache.digest.
+                Jobs without it bypass the matte cache
+        """
+        self.id = uuid.uuid4().hex
+        self.data = data
+        self.future: Future = Future()
+        self.number = 0
+        self.created_at = time.monotonic()
+        self.megapixels = data[1].size[0] * data[1].size[1] / 1_000_000
+        self.image_size: Optional[Tuple[int, int]] = None
+        self.keep_result = keep_result
+        self.deadline = deadline
+        self.digest = digest
+        self.cancelled = False
+        self.cost = 0.0
+        self.priority = 0.0
+        self.dequeued = False
 
 
 class MLProcessor(threading.Thread):
     """Simple ml task queue processor"""
 
+    PIPELINE_FIELDS = {
+        "inference_backend",
+        "segmentation_network",
+        "type_networks",
+        "preprocessing_method",
+        "postprocessing_method",
+        "device",
+        "fp16",
+        "seg_mask_size",
+        "matting_mask_size",
+        "refine_mask_size",
+        "trimap_dilation",
+        "trimap_erosion",
+        "trimap_prob_threshold",
+        "qos_matting_mask_size",
+    }
+    """MLConfig fields, which affect alpha mattes"""
+    PREPROCESSING_COST = {"none": 0.0, "stub": 0.0, "autoscene": 0.5, "auto": 1.0}
+    """Job cost of the pre-processing methods"""
+    POSTPROCESSING_COST = {"none": 0.0, "fba": 1.0, "cascade_fba": 2.0}
+    """Job cost per megapixel of the post-processing methods"""
+    PRIORITY_OFFSETS = {"high": -100.0, "normal": 0.0, "low": 100.0}
+    """Job cost offsets of the priority classes"""
+    QOS_TIERS = ["full", "no_refine", "fast_matting", "segmentation"]
+    """Quality tiers from the best to the fastest one"""
+    QOS_RECOVERY = 0.5
+    """Fraction of the tier queue wait, below which jobs return to the better tier"""
+
     def __init__(self, api_config: WebAPIConfig):
-        super().__init__()
+        super().__init__(daemon=True)
         self.api_config = api_config
-        self.interface: Optional[Interface] = None
-        self.jobs = {}
-        self.completed_jobs = {}
+        self.inference: Optional[InferenceRouter] = None
+        self.tier = "full"
+        # Entries are (priority, number, job), cancelled jobs are removed at once
+        self.queue: "queue.PriorityQueue[Tuple[float, int, Job]]" = (
+            queue.PriorityQueue()
+        )
+        self.jobs: Dict[str, Job] = {}
+        self.results = ResultStore(
+            max_bytes=api_config.ml.results_max_mb * 1024 * 1024,
+            ttl=api_config.ml.results_ttl,
+            disk_path=api_config.ml.results_dir,
+            disk_max_bytes=api_config.ml.results_dir_max_mb * 1024 * 1024,
+        )
+        self.lock = threading.Lock()
+        self.submitted_jobs = 0
+        self.queued_megapixels = 0.0
+        self.job_time: Optional[float] = None
+        self.state = "stopped"
+        self.load_time: Optional[float] = None
+        self.warmup_time: Optional[float] = None
+        self.worker_pool: Optional[InferenceWorkerPool] = None
+        self.inference_slots = threading.Semaphore(
+            max(1, api_config.ml.inference_workers)
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(2, api_config.ml.inference_workers),
+            thread_name_prefix="carvekit_finalize",
+        )
+        self.matte_cache: Optional[MatteCache] = None
+        if api_config.ml.cache_max_mb > 0:
+            self.matte_cache = MatteCache(
+                namespace=api_config.ml.json(include=self.PIPELINE_FIELDS),
+                max_bytes=api_config.ml.cache_max_mb * 1024 * 1024,
+                disk_path=api_config.ml.cache_dir,
+                disk_max_bytes=api_config.ml.cache_dir_max_mb * 1024 * 1024,
+            )
+        # Gauges are evaluated only when metrics are collected
+        metrics.QUEUE_DEPTH.set_function(self.queue.qsize)
+        metrics.JOBS_IN_PROGRESS.set_function(lambda: len(self.jobs))
+
+    @property
+    def batch_size(self) -> int:
+        """Maximum number of jobs passed through the interface at once"""
+        ml_config = self.api_config.ml
+        return max(
+            ml_config.batch_size_seg,
+            ml_config.batch_size_matting,
+            ml_config.batch_size_refine,
+        )
+
+    def ensure_started(self):
+        """Starts loading of models and processing of jobs, if it is not started yet"""
+        with self.lock:
+            if self.is_alive() is False and self.state == "stopped":
+                self.state = "loading"
+                self.start()
 
     def run(self):
-        """Starts listening for new jobs."""
-        unused_completed_jobs_timer = time.time()
-        if self.interface is None:
-            self.interface = init_interface(self.api_config)
-        while True:
-            # Clear unused completed jobs every hour
-            if time.time() - unused_completed_jobs_timer > 60:
-                self.clear_old_completed_jobs()
-                unused_completed_jobs_timer = time.time()
-
-            if len(self.jobs.keys()) >= 1:
-                id = list(self.jobs.keys())[0]
-                data = self.jobs[id]
-                # TODO add pydantic scheme here
-                response = process_remove_bg(
-                    self.interface, data[0], data[1], data[2], data[3]
+        """Loads models and starts listening for new jobs."""
+        try:
+            started_at = time.monotonic()
+            if self.api_config.ml.inference_workers > 0 and self.worker_pool is None:
+                # Models are loaded here once and shared with the workers, which run inference,
+                # this thread just routes the jobs
+                self.worker_pool = InferenceWorkerPool(
+                    partial(InferenceRouter.from_config, self.api_config),
+                    self.api_config.ml.inference_workers,
                 )
-                self.completed_jobs[id] = [response, time.time()]
-                try:
-                    del self.jobs[id]
-                except KeyError or NameError as e:
-                    logger.error(f"Something went wrong with Task Queue: {str(e)}")
-                gc.collect()
+                image_types, tiers = self.worker_pool.wait_ready()
+                self.inference = InferenceRouter.routing_only(image_types, tiers)
+            elif self.inference is None:
+                self.inference = InferenceRouter.from_config(self.api_config)
+            self.load_time = time.monotonic() - started_at
+            logger.info(f"Models are loaded in {self.load_time:.2f} seconds")
+            if self.api_config.ml.warmup:
+                self.state = "warming_up"
+                started_at = time.monotonic()
+                self.warmup()
+                self.warmup_time = time.monotonic() - started_at
+                logger.info(f"Models are warmed up in {self.warmup_time:.2f} seconds")
+        except Exception as e:
+            self.state = "failed"
+            logger.opt(exception=e).error(f"Failed to load models: {str(e)}")
+            raise
+        self.state = "ready"
+
+        expire_timer = time.monotonic()
+        while True:
+            # Results are expired on access too, this frees memory of an idle server
+            if time.monotonic() - expire_timer > 60:
+                self.results.expire()
+                expire_timer = time.monotonic()
+
+            # Wait for a free inference slot first, so jobs keep filling the batch meanwhile
+            self.inference_slots.acquire()
+            jobs = self.collect_batch()
+            if len(jobs) > 0:
+                self.process_batch(jobs)
             else:
-                time.sleep(1)
+                self.inference_slots.release()
+
+    def warmup(self):
+        """
+        Passes synthetic images through the interface at each configured network input size,
+        so memory allocations and lazy initializations are done before the first request.
+        """
+        ml_config = self.api_config.ml
+        sizes = sorted(
+            {
+                ml_config.seg_mask_size,
+                ml_config.refine_mask_size,
+                ml_config.matting_mask_size,
+            }
+        )
+        # One image for each segmentation network and each degraded tier
+        types = ["auto"] + self.inference.routing()[0]
+        variants = [(image_type, "full") for image_type in types]
+        variants += [("auto", tier) for tier in self.QOS_TIERS if self.has_tier(tier)]
+        for size in sizes:
+            images = [self.warmup_image(size)] * len(variants)
+            if self.worker_pool is None:
+                self.inference(images, variants)
+            else:
+                # Every worker is idle, so each of them gets one warm-up task
+                futures = [
+                    self.worker_pool.submit(images, variants)
+                    for _ in range(ml_config.inference_workers)
+                ]
+                for future in futures:
+                    future.result()
+
+    @staticmethod
+    def warmup_image(size: int) -> Image.Image:
+        """
+        Generates warm-up image
+
+        Args:
+            size: image size
+
+        Returns:
+            Image with an ellipse in the center, so all networks and the trimap have work to do
+        """
+        image = Image.new("RGB", (size, size), (200, 200, 200))
+        ImageDraw.Draw(image).ellipse(
+            (size // 4, size // 4, size * 3 // 4, size * 3 // 4), fill=(30, 60, 90)
+        )
+        return image
+
+    def collect_batch(self) -> List[Job]:
+        """
+        Waits for new jobs and collects them into one batch.
+        Collecting stops when the batch is full or when the max wait deadline has passed.
+
+        Returns:
+            list of jobs, it is empty if there were no new jobs for a long time
+        """
+        jobs = []
+        deadline = None
+        while len(jobs) < self.batch_size:
+            timeout = 60 if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                _, _, job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            with self.lock:
+                job.dequeued = True
+                if job.id not in self.jobs:  # cancelled while waiting in the queue
+                    continue
+            if self.shed_job(job, "queue"):
+                continue
+            jobs.append(job)
+            if deadline is None:
+                deadline = (
+                    time.monotonic() + self.api_config.ml.batch_max_wait_ms / 1000
+                )
+        return jobs
+
+    def process_batch(self, jobs: List[Job]):
+        """
+        Passes jobs through the interface as one batch and resolves their futures
+
+        Args:
+            jobs: jobs to process
+        """
+        prepared_jobs = []
+        for job in jobs:
+            metrics.QUEUE_WAIT.observe(time.monotonic() - job.created_at)
+        tier = self.select_tier(self.queue_wait(jobs))
+        for job in jobs:
+            metrics.QUALITY_TIER_JOBS.labels(tier).inc()
+            try:
+                # TODO add pydantic scheme here
+                with stage_timer("prepare"):
+                    prepared = prepare_remove_bg(job.data[0], job.data[1])
+            except Exception as e:
+                logger.exception(f"Something went wrong with job {job.id}: {str(e)}")
+                prepared = error_dict("Something went wrong during processing!"), 500
+            if isinstance(prepared, tuple):
+                self.finish_job(job, prepared)
                 continue
+            prepared["tier"] = tier
+            if not self.use_cached_matte(job, prepared):
+                prepared_jobs.append((job, prepared))
+        if len(prepared_jobs) == 0:
+            self.inference_slots.release()
+            return
+
+        metrics.BATCH_SIZE.observe(len(prepared_jobs))
+        started_at = time.monotonic()
+        images = [prepared["roi_image"] for _, prepared in prepared_jobs]
+        variants = [
+            (self.job_type(job.data[0]), prepared["tier"])
+            for job, prepared in prepared_jobs
+        ]
+        if self.worker_pool is None:
+            inference = Future()
+            try:
+                inference.set_result(self.inference(images, variants))
+            except Exception as e:
+                inference.set_exception(e)
+        else:
+            try:
+                inference = self.worker_pool.submit(images, variants)
+            except Exception as e:
+                inference = Future()
+                inference.set_exception(e)
+        inference.add_done_callback(
+            lambda future: self.complete_batch(prepared_jobs, future, started_at)
+        )
 
-    def clear_old_completed_jobs(self):
-        """Clears old completed jobs"""
+    def job_type(self, params: dict) -> str:
+        """
+        Returns image type, which selects the interface for the job
+
+        Args:
+            params: job parameters
+
+        Returns:
+            type request parameter or auto, if there is no interface for this type
+        """
+        image_type = params.get("type") or "auto"
+        return image_type if self.inference.has_type(image_type) else "auto"
 
-        if len(self.completed_jobs.keys()) >= 1:
-            for job_id in self.completed_jobs.keys():
-                job_finished_time = self.completed_jobs[job_id][1]
-                if time.time() - job_finished_time > 3600:
-                    try:
-                        del self.completed_jobs[job_id]
-                    except KeyError or NameError as e:
-                        logger.error(f"Something went wrong with Task Queue: {str(e)}")
-            gc.collect()
+    def has_tier(self, tier: str) -> bool:
+        """Checks that the degraded quality tier is configured and supported"""
+        return self.inference.has_tier(tier)
+
+    def queue_wait(self, jobs: List[Job]) -> float:
+        """
+        Returns current queue wait, which is the age of the oldest job
+        of the batch or of the jobs still waiting in the queue.
+        It drops as soon as the queue is drained, unlike an average of past waits.
+
+        Args:
+            jobs: dequeued jobs of the next batch
+
+        Returns:
+            queue wait in seconds
+        """
+        with self.queue.mutex:
+            created_at = [job.created_at for _, _, job in self.queue.queue]
+        created_at += [job.created_at for job in jobs]
+        if len(created_at) == 0:
+            return 0.0
+        return time.monotonic() - min(created_at)
+
+    def select_tier(self, wait: float) -> str:
+        """
+        Selects quality tier for the next batch by the current queue wait.
+        Jobs are degraded when the wait reaches the tier threshold and return to the better
+        tier only when it drops below QOS_RECOVERY of the threshold, so the tier doesn't flap.
+
+        Args:
+            wait: queue wait in seconds returned by queue_wait
+
+        Returns:
+            quality tier
+        """
+        tier = "full"
+        current = self.QOS_TIERS.index(self.tier)
+        for idx, candidate in enumerate(self.QOS_TIERS):
+            if not self.has_tier(candidate):
+                continue
+            threshold = self.api_config.ml.qos_tiers[candidate]
+            if wait >= threshold or (
+                idx <= current and wait >= threshold * self.QOS_RECOVERY
+            ):
+                tier = candidate
+        if tier != self.tier:
+            logger.info(
+                f"Quality tier is changed from {self.tier} to {tier}, "
+                f"queue wait is {wait:.2f} seconds"
+            )
+            self.tier = tier
+        return tier
+
+    def use_cached_matte(self, job: Job, prepared: dict) -> bool:
+        """
+        Finalizes the job with a cached alpha matte or with a matte of the identical image,
+        which is being processed at the moment
+
+        Args:
+            job: job to process
+            prepared: output of prepare_remove_bg for this job
+
+        Returns:
+            False if the job should be passed through the interface
+        """
+        if self.matte_cache is None or job.digest is None:
+            return False
+        roi_image = prepared["roi_image"]
+        variant = self.job_type(job.data[0])
+        if prepared["tier"] != "full":
+            variant = f"{variant}:{prepared['tier']}"
+        # The digest is computed by the request handler, so the key is cheap to compute here
+        geometry = (prepared["image"].size, tuple(prepared["roi_box"]), roi_image.size)
+        prepared["cache_key"] = self.matte_cache.key(job.digest, variant, geometry)
+        alpha = self.matte_cache.get(prepared["cache_key"], roi_image.size)
+        if alpha is not None:
+            metrics.MATTE_CACHE_HITS.inc()
+            self.executor.submit(self.finalize_cached_job, job, prepared, alpha)
+            return True
+        inflight = self.matte_cache.claim(prepared["cache_key"])
+        if inflight is not None:
+            metrics.MATTE_CACHE_COALESCED.inc()
+            inflight.add_done_callback(
+                lambda future: self.executor.submit(
+                    self.finalize_cached_job, job, prepared, future
+                )
+            )
+            return True
+        return False
+
+    def finalize_cached_job(
+        self, job: Job, prepared: dict, alpha: Union[Image.Image, Future]
+    ):
+        """
+        Applies alpha matte to the image and finalizes the job
+
+        Args:
+            job: job to finalize
+            prepared: output of prepare_remove_bg for this job
+            alpha: alpha matte or future of the coalesced job matte
+        """
+        if self.shed_job(job, "finalize"):
+            return
+        try:
+            if isinstance(alpha, Future):
+                alpha = alpha.result()
+            with stage_timer("apply_mask"):
+                new_image = apply_mask(prepared["roi_image"], alpha)
+        except Exception as e:
+            logger.exception(f"Something went wrong with job {job.id}: {str(e)}")
+            self.finish_job(
+                job, (error_dict("Something went wrong during processing!"), 500)
+            )
+            return
+        self.finalize_job(job, prepared, new_image)
+
+    def complete_batch(
+        self,
+        prepared_jobs: List[Tuple[Job, dict]],
+        inference: Future,
+        started_at: float,
+    ):
+        """
+        Passes interface output of the batch to the finalizing stage
+
+        Args:
+            prepared_jobs: list of jobs and their prepare_remove_bg outputs
+            inference: resolved future with interface output
+            started_at: time.monotonic() value at the start of the batch inference
+        """
+        self.inference_slots.release()
+        inference_time = time.monotonic() - started_at
+        report_stage_time("inference", inference_time)
+        job_time = inference_time / len(prepared_jobs)
+        # Exponential moving average of the inference time per job
+        self.job_time = (
+            job_time if self.job_time is None else 0.8 * self.job_time + 0.2 * job_time
+        )
+        try:
+            new_images = inference.result()
+        except Exception as e:
+            logger.opt(exception=e).error(
+                f"Something went wrong with Task Queue: {str(e)}"
+            )
+            for job, prepared in prepared_jobs:
+                if "cache_key" in prepared:
+                    self.matte_cache.resolve(prepared["cache_key"], error=e)
+                self.finish_job(
+                    job, (error_dict("Something went wrong during processing!"), 500)
+                )
+            return
+
+        for (job, prepared), new_image in zip(prepared_jobs, new_images):
+            if "cache_key" in prepared:
+                self.matte_cache.resolve(
+                    prepared["cache_key"], alpha=new_image.getchannel("A")
+                )
+            self.executor.submit(self.finalize_job, job, prepared, new_image)
+
+    def finalize_job(self, job: Job, prepared: dict, new_image):
+        """
+        Composes and encodes the job result
+
+        Args:
+            job: job to finalize
+            prepared: output of prepare_remove_bg for this job
+            new_image: interface output for this job
+        """
+        if self.shed_job(job, "finalize"):
+            return
+        try:
+            with stage_timer("finalize"):
+                response = finalize_remove_bg(
+                    job.data[0], prepared, new_image, job.data[2], job.data[3]
+                )
+            if isinstance(response, dict):
+                response["tier"] = prepared["tier"]
+        except Exception as e:
+            logger.exception(f"Something went wrong with job {job.id}: {str(e)}")
+            response = error_dict("Something went wrong during processing!"), 500
+        self.finish_job(job, response)
+
+    def shed_job(self, job: Job, stage: str) -> bool:
+        """
+        Drops the job if it is cancelled or its deadline has passed
+
+        Args:
+            job: job to check
+            stage: pipeline stage, which the job is going to enter
+
+        Returns:
+            True if the job is dropped and must not be processed further
+        """
+        if job.future.done():
+            return True
+        if job.cancelled:
+            reason, response = "cancelled", (error_dict("Job is cancelled"), 499)
+        elif job.deadline is not None and time.monotonic() > job.deadline:
+            reason = "deadline"
+            response = error_dict("Request deadline exceeded"), 504
+        else:
+            return False
+        metrics.JOBS_SHED.labels(reason, stage).inc()
+        metrics.MEGAPIXELS_SHED.labels(reason, stage).inc(job.megapixels)
+        self.finish_job(job, response)
+        return True
+
+    def finish_job(self, job: Job, response):
+        """
+        Stores job processing result and resolves job future
+
+        Args:
+            job: processed job
+            response: job processing result
+        """
+        if isinstance(response, dict):
+            metrics.IMAGES_PROCESSED.inc()
+        elif not job.cancelled:
+            metrics.JOBS_FAILED.inc()
+        job.image_size = job.data[1].size
+        job.data = None
+        # Nobody is going to read the result of a cancelled job
+        if job.keep_result and not job.cancelled:
+            # The result is stored before the job is removed, so it is always found
+            self.results.put(
+                job.id, (response, job.image_size), self.result_size(response)
+            )
+        with self.lock:
+            if self.jobs.pop(job.id, None) is not None:
+                self.queued_megapixels -= job.megapixels
+        job.future.set_result(response)
+
+    @staticmethod
+    def result_size(response) -> int:
+        """
+        Estimates memory size of the job result
+
+        Args:
+            response: job processing result
+
+        Returns:
+            Size in bytes
+        """
+        if isinstance(response, dict) and isinstance(response["data"][0], bytes):
+            return len(response["data"][0]) + 1024
+        return 1024
+
+    def job_cancel(self, id: str) -> bool:
+        """
+        Cancels the job. Waiting job is removed from the queue at once,
+        job in processing is dropped before its next pipeline stage.
+
+        Args:
+            id: id of the job
+
+        Returns:
+            False if the job is not found or already finished
+        """
+        with self.lock:
+            job = self.jobs.get(id)
+            if job is None:
+                return False
+            job.cancelled = True
+            if job.dequeued:
+                return True
+            del self.jobs[id]
+            self.queued_megapixels -= job.megapixels
+            # Stale entry would overstate the queue depth until it is dequeued
+            with self.queue.mutex:
+                try:
+                    self.queue.queue.remove((job.priority, job.number, job))
+                    heapq.heapify(self.queue.queue)
+                except ValueError:
+                    pass  # already taken by collect_batch, which skips it
+        self.shed_job(job, "queue")
+        return True
 
     def job_status(self, id: str) -> str:
         """
@@ -71,44 +635,189 @@ class MLProcessor(threading.Thread):
             id: id of the job
 
         Returns:
-            Current job status for specified id. Job status can be [finished, wait, not_found]
+            Current job status for specified id. Job status can be [finished, processing, wait, not_found]
         """
-        if id in self.completed_jobs.keys():
-            return "finished"
-        elif id in self.jobs.keys():
+        if id in self.jobs.keys():
+            if self.job_queue_position(id) == 0:
+                return "processing"
             return "wait"
+        elif id in self.results:
+            return "finished"
         else:
             return "not_found"
 
-    def job_result(self, id: str):
+    def job_queue_position(self, id: str) -> Optional[int]:
         """
-        Returns job processing result.
+        Returns position of the job in the queue
 
         Args:
             id: id of the job
 
         Returns:
-            job processing result.
+            Count of jobs in the queue before this job plus one, 0 if the job is already taken
+            from the queue or None if job is not waiting.
+            Position can grow if cheaper or higher priority jobs are submitted.
         """
-        if id in self.completed_jobs.keys():
-            data = self.completed_jobs[id][0]
-            try:
-                del self.completed_jobs[id]
-            except KeyError or NameError:
-                pass
-            return data
-        else:
+        job = self.jobs.get(id)
+        if job is None:
+            return None
+        if job.dequeued:
+            return 0
+        with self.queue.mutex:
+            return 1 + sum(
+                1
+                for priority, number, queued_job in self.queue.queue
+                if (priority, number) < (job.priority, job.number)
+                and queued_job.id in self.jobs
+            )
+
+    def job_cost(self, params: dict, image_size: Tuple[int, int]) -> float:
+        """
+        Estimates job processing cost
+
+        Args:
+            params: job parameters
+            image_size: size of the job image
+
+        Returns:
+            Cost in relative units. Segmentation runs at a fixed input size,
+            so it costs 1 regardless of the image size. Other stages scale with megapixels.
+        """
+        ml_config = self.api_config.ml
+        width, height = scaled_size(params, image_size)
+        megapixels = width * height / 1_000_000
+        megapixel_cost = 1.0 + self.POSTPROCESSING_COST[ml_config.postprocessing_method]
+        if params.get("bg_image_url") or params.get("bg_color"):
+            megapixel_cost += 0.5  # background composition
+        return (
+            1.0
+            + self.PREPROCESSING_COST[ml_config.preprocessing_method]
+            + megapixels * megapixel_cost
+        )
+
+    def job_priority(self, job: Job) -> float:
+        """
+        Computes job priority, jobs with lower values are processed first
+
+        Args:
+            job: job to prioritize
+
+        Returns:
+            Submission number for fifo queue policy. For cost queue policy it is the
+            shortest job first order with aging: each second of waiting is worth
+            queue_aging cost units. Since all waiting jobs age at the same rate,
+            priority doesn't change while the job waits in the queue.
+        """
+        ml_config = self.api_config.ml
+        if ml_config.queue_policy == "fifo":
+            return float(job.number)
+        offset = self.PRIORITY_OFFSETS[job.data[0].get("priority") or "normal"]
+        return offset + job.cost + ml_config.queue_aging * job.created_at
+
+    def job_image_size(self, id: str) -> Optional[Tuple[int, int]]:
+        """
+        Returns size of the job image passed to the interface
+
+        Args:
+            id: id of the job
+
+        Returns:
+            Image size or None if job is not finished.
+        """
+        stored = self.results.get(id)
+        if stored is None:
+            return None
+        return stored[1]
+
+    def job_future(self, id: str) -> Optional[Future]:
+        """
+        Returns future, which will be resolved with job processing result.
+
+        Args:
+            id: id of the job
+
+        Returns:
+            Future of the job or None if job is not found.
+        """
+        with self.lock:
+            job = self.jobs.get(id)
+        if job is not None:
+            return job.future
+        stored = self.results.get(id)
+        if stored is None:
+            return None
+        future = Future()
+        future.set_result(stored[0])
+        return future
+
+    def job_result(self, id: str, with_image_size: bool = False):
+        """
+        Returns job processing result and removes it from the result store.
+
+        Args:
+            id: id of the job
+            with_image_size: returns size of the job image passed to the interface too
+
+        Returns:
+            job processing result or (result, image size) tuple, False if job is not finished.
+        """
+        stored = self.results.pop(id)
+        if stored is None:
             return False
+        return stored if with_image_size else stored[0]
+
+    def queue_remaining(self) -> int:
+        """Returns count of jobs, which can be added to the queue"""
+        return max(self.api_config.ml.queue_max_jobs - len(self.jobs), 0)
 
-    def job_create(self, data: list):
+    def estimate_wait(self) -> int:
+        """
+        Estimates time to process all queued jobs
+
+        Returns:
+            Time in seconds based on the observed inference time per job
+        """
+        job_time = 1.0 if self.job_time is None else self.job_time
+        parallelism = max(1, self.api_config.ml.inference_workers)
+        return max(1, math.ceil(len(self.jobs) * job_time / parallelism))
+
+    def job_create(
+        self,
+        data: list,
+        deadline: Optional[float] = None,
+        keep_result: bool = True,
+        digest: Optional[str] = None,
+    ):
         """
         Send job to ML Processor
 
         Args:
             data: data object
+            deadline: time.monotonic() value, after which the job is dropped unprocessed
+            keep_result: stores the result until it is requested by job_result.
+                Callers, which read the result from the job future, should disable it
+            digest: content digest of the uploaded image returned by MatteCache.digest,
+                enables the matte cache for this job
+
+        Raises:
+            QueueFullError: if the queue has reached its job count or megapixels limit
         """
-        if self.is_alive() is False:
-            self.start()
-        id = uuid.uuid4().hex
-        self.jobs[id] = data
-        return id
+        job = Job(data, deadline=deadline, keep_result=keep_result, digest=digest)
+        job.cost = self.job_cost(data[0], data[1].size)
+        ml_config = self.api_config.ml
+        self.ensure_started()
+        with self.lock:
+            if len(self.jobs) >= ml_config.queue_max_jobs or (
+                len(self.jobs) > 0
+                and self.queued_megapixels + job.megapixels
+                > ml_config.queue_max_megapixels
+            ):
+                metrics.JOBS_REJECTED.inc()
+                raise QueueFullError(self.estimate_wait())
+            self.queued_megapixels += job.megapixels
+            self.submitted_jobs += 1
+            job.number = self.submitted_jobs
+            job.priority = self.job_priority(job)
+            self.jobs[job.id] = job
+            self.queue.put((job.priority, job.number, job))
+        return job.id
@@ -0,0 +1,122 @@
+import io
+import mmap
+import tarfile
+import tempfile
+import zipfile
+from typing import AsyncIterator, Optional, BinaryIO, List, Tuple, Callable
+
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+__all__ = ["UploadTooLargeError", "read_image_stream", "archive_members"]
+
+
+class UploadTooLargeError(Exception):
+    """Raised when uploaded data exceeds the size limit"""
+
+
+async def read_image_stream(
+    stream: AsyncIterator[bytes], max_size: int, spool_size: int
+) -> Optional[Image.Image]:
+    """
+    Reads and decodes image from the request body stream.
+    Small uploads are kept in memory, large ones are spilled to a temporary file,
+    which is memory-mapped for decoding.
+
+    Args:
+        stream: request body chunks
+        max_size: maximum upload size in bytes
+        spool_size: maximum size in bytes of upload kept in memory
+
+    Returns:
+        Decoded PIL.Image.Image instance or None if body is empty
+
+    Raises:
+        UploadTooLargeError: if upload is larger than max_size
+        PIL.UnidentifiedImageError: if image can't be decoded
+    """
+    chunks, received, temp_file = [], 0, None
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > max_size:
+                raise UploadTooLargeError("Image is too large")
+            if temp_file is None and received > spool_size:
+                temp_file = tempfile.TemporaryFile()
+                temp_file.writelines(chunks)
+                chunks = []
+            if temp_file is not None:
+                temp_file.write(chunk)
+            else:
+                chunks.append(chunk)
+        if received == 0:
+            return None
+        if temp_file is None:
+            # BytesIO shares the joined bytes object instead of copying it
+            return await run_in_threadpool(_decode, io.BytesIO(b"".join(chunks)))
+        temp_file.flush()
+        with mmap.mmap(temp_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return await run_in_threadpool(_decode, mapped)
+    finally:
+        if temp_file is not None:
+            temp_file.close()
+
+
+def _decode(file) -> Image.Image:
+    image = Image.open(file)
+    image.load()
+    return image
+
+
+def archive_members(
+    file: BinaryIO, max_count: int, max_size: int, max_total_size: int
+) -> List[Tuple[str, Callable[[], bytes]]]:
+    """
+    Lists files of the zip or tar archive and checks the limits before any file is extracted.
+    Sizes are taken from the archive headers. Readers never return more data than the
+    header declares, so a forged header can't bypass the limits.
+
+    Args:
+        file: uploaded zip or tar archive
+        max_count: maximum count of files
+        max_size: maximum uncompressed size of one file in bytes
+        max_total_size: maximum total uncompressed size of all files in bytes
+
+    Returns:
+        list of file names and functions, which read the file content
+
+    Raises:
+        UploadTooLargeError: if the archive exceeds any of the limits
+        zipfile.BadZipFile, tarfile.TarError: if the archive is broken
+    """
+    members = []
+    total_size = 0
+
+    def check(name: str, size: int):
+        nonlocal total_size
+        total_size += size
+        if len(members) >= max_count:
+            raise UploadTooLargeError("Too many files in the archive")
+        if size > max_size:
+            raise UploadTooLargeError(f"File {name} in the archive is too large")
+        if total_size > max_total_size:
+            raise UploadTooLargeError("Archive is too large")
+
+    if zipfile.is_zipfile(file):
+        file.seek(0)
+        zip_file = zipfile.ZipFile(file)
+        for info in zip_file.infolist():
+            if not info.is_dir():
+                check(info.filename, info.file_size)
+                members.append((info.filename, lambda info=info: zip_file.read(info)))
+    else:
+        file.seek(0)
+        tar_file = tarfile.open(None, "r:*", file)
+        # Headers are read lazily, so a tar bomb is rejected before it is decompressed fully
+        for info in tar_file:
+            if info.isfile():
+                check(info.name, info.size)
+                members.append(
+                    (info.name, lambda info=info: tar_file.extractfile(info).read())
+                )
+    return members
@@ -0,0 +1,380 @@
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory, resource_tracker
+from typing import List, Dict, Optional, Tuple, Callable, Any
+
+import numpy as np
+import torch
+import torch.multiprocessing
+from PIL import Image
+from loguru import logger
+
+from carvekit.utils.models_utils import (
+    model_registry,
+    cast_network,
+    get_precision_autocast,
+)
+from carvekit.utils.timing_utils import (
+    stage_listeners,
+    add_stage_listener,
+    report_stage_time,
+)
+
+__all__ = ["InferenceWorkerPool"]
+
+
+def _worker_loop(
+    interface: Callable,
+    models: List[Tuple[tuple, Any, bool]],
+    models_max_bytes: Optional[int],
+    tasks,
+    results,
+    num_threads: int,
+):
+    """
+    Inference worker process main loop
+
+    Args:
+        interface: InferenceRouter, whose weights are in memory shared with the parent process
+        models: entries of the parent process model registry, which share memory too
+        models_max_bytes: memory budget of the parent process model registry
+        tasks: queue with tasks of this worker
+        results: queue for processing results shared between all workers
+        num_threads: count of torch threads for this worker
+    """
+    torch.set_num_threads(num_threads)
+    # AutoInterface takes networks from the registry, so it finds the shared ones there
+    model_registry.max_bytes = models_max_bytes
+    for key, model, resident in models:
+        model_registry.add(key, model, resident=resident)
+    # Task id None reports that the worker is ready
+    results.put((None, None, None))
+    # Stage durations are passed to the listeners of the parent process with task results
+    timings = []
+    stage_listeners.clear()
+    add_stage_listener(lambda stage, seconds: timings.append((stage, seconds)))
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, items, variants = task
+        try:
+            _process_task(interface, items, variants)
+            results.put((task_id, None, timings.copy()))
+        except Exception as e:
+            results.put((task_id, f"{type(e).__name__}: {str(e)}", timings.copy()))
+        timings.clear()
+
+
+def _process_task(
+    interface: Callable, items: List[Tuple[str, str, tuple]], variants: list
+):
+    """
+    Reads images from shared memory, passes them through the interface
+    and writes results back to shared memory.
+
+    Args:
+        interface: inference function, which takes images and their variants
+        items: list of (input shared memory name, output shared memory name, image size)
+        variants: image variants, which select the interface
+    """
+    images = []
+    for input_name, _, size in items:
+        input_block = shared_memory.SharedMemory(name=input_name)
+        try:
+            images.append(_image_from_block(input_block, size, "RGB"))
+        finally:
+            input_block.close()
+    outputs = interface(images, variants)
+    for (_, output_name, size), output in zip(items, outputs):
+        output_block = shared_memory.SharedMemory(name=output_name)
+        try:
+            output_block.buf[: size[0] * size[1] * 4] = output.convert("RGBA").tobytes()
+        finally:
+            output_block.close()
+
+
+def _image_from_block(
+    block: shared_memory.SharedMemory, size: Tuple[int, int], mode: str
+) -> Image.Image:
+    """
+    Reads image from shared memory block
+
+    Args:
+        block: shared memory block
+        size: image size
+        mode: image color mode, RGB or RGBA
+
+    Returns:
+        PIL.Image.Image instance, which doesn't reference the shared memory block
+    """
+    array = np.ndarray((size[1], size[0], len(mode)), dtype=np.uint8, buffer=block.buf)
+    image = Image.fromarray(array, mode=mode)
+    if image.readonly:
+        image = image.copy()  # mapped modes like RGBA share memory with the array
+    del array
+    return image
+
+
+def _share_modules(obj: Any, dtype: Optional[torch.dtype] = None, seen=None):
+    """
+    Moves weights of all torch modules referenced by the object to shared memory.
+    Networks are cast to their inference dtype first, so casting on each call
+    in the workers doesn't replace the shared weights with private copies.
+
+    Args:
+        obj: object, like InferenceRouter, or a container of objects
+        dtype: inference dtype of the network, which references the object
+        seen: ids of the visited objects
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if hasattr(obj, "fp16") and hasattr(obj, "device"):
+        _, dtype = get_precision_autocast(device=obj.device, fp16=obj.fp16)
+    if isinstance(obj, torch.nn.Module):
+        if dtype is not None:
+            cast_network(obj, dtype)
+        obj.share_memory()  # CUDA tensors are shared by torch.multiprocessing anyway
+        return
+    if isinstance(obj, dict):
+        children = list(obj.values())
+    elif isinstance(obj, (list, tuple, set)):
+        children = list(obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        children = list(vars(obj).values())
+    else:
+        return
+    for child in children:
+        _share_modules(child, dtype, seen)
+
+
+class InferenceWorkerPool:
+    """
+    Pool of inference processes.
+
+    Notes:
+        Models are loaded once in this process and their weights are moved to shared memory.
+        Workers are spawned instead of forked, since forking a process with running threads
+        and initialized torch can deadlock the child, and receive the models
+        by torch.multiprocessing, which maps the shared weights instead of copying them.
+        So weights take memory once regardless of the worker count, each worker costs
+        its own interpreter with torch (about 200 MB of private memory on CPU), activations of
+        the batch it processes and, on GPU, its own CUDA context (about 300-500 MB of video memory).
+        Networks, which AutoInterface loads on demand after the pool is started,
+        are loaded by each worker separately.
+        Images and results are transferred via shared memory instead of pickling.
+    """
+
+    LIVENESS_INTERVAL = 1.0
+    """Seconds between checks of worker processes liveness"""
+
+    def __init__(self, factory: Callable, workers: int):
+        """
+        Args:
+            factory: function, which loads models and returns InferenceRouter,
+                like InferenceRouter.from_config bound to config. It is called once in this process
+            workers: count of worker processes
+
+        Raises:
+            Exception: if the factory has failed to load models
+        """
+        self.interface = factory()
+        _share_modules(self.interface)
+        models = model_registry.entries()
+        for _, model, _ in models:
+            _share_modules(model)
+        self._models = models
+        self.workers = workers
+        self.num_threads = max(1, (os.cpu_count() or 1) // workers)
+        self._context = torch.multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._lock = threading.Lock()
+        self._task_counter = 0
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._task_queues = [None] * workers
+        self._idle_workers = list(range(workers))
+        self._worker_tasks: Dict[int, int] = {}
+        self._pending: Dict[int, Tuple[Future, int, list, list]] = {}
+        self._ready = Future()
+        self._ready_workers = 0
+        self._closed = threading.Event()
+        # Workers must share the resource tracker of this process,
+        # otherwise they would try to clean up shared memory blocks owned by this process
+        resource_tracker.ensure_running()
+        for worker_idx in range(workers):
+            self._start_worker(worker_idx)
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def _start_worker(self, worker_idx: int):
+        """Spawns worker process with specified index"""
+        self._task_queues[worker_idx] = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_loop,
+            args=(
+                self.interface,
+                self._models,
+                model_registry.max_bytes,
+                self._task_queues[worker_idx],
+                self._results,
+                self.num_threads,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_idx] = process
+
+    def wait_ready(
+        self, timeout: Optional[float] = None
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Waits until all workers have received the models
+
+        Args:
+            timeout: maximum time to wait in seconds
+
+        Returns:
+            image types and quality tiers supported by the workers
+
+        Raises:
+            RuntimeError: if a worker has failed to start
+        """
+        return self._ready.result(timeout=timeout)
+
+    def submit(self, images: List[Image.Image], variants: list) -> Future:
+        """
+        Passes images to the idle worker process
+
+        Args:
+            images: list of images
+            variants: image variants, like image type and quality tier
+
+        Returns:
+            Future, which will be resolved with list of interface output images
+
+        Raises:
+            RuntimeError: if there is no idle worker
+        """
+        future = Future()
+        items, blocks, sizes = [], [], []
+        try:
+            for image in images:
+                image = image.convert("RGB")
+                width, height = image.size
+                input_block = shared_memory.SharedMemory(
+                    create=True, size=width * height * 3
+                )
+                blocks.append(input_block)
+                output_block = shared_memory.SharedMemory(
+                    create=True, size=width * height * 4
+                )
+                blocks.append(output_block)
+                input_block.buf[: width * height * 3] = image.tobytes()
+                items.append((input_block.name, output_block.name, image.size))
+                sizes.append(image.size)
+        except Exception:
+            self._release_blocks(blocks)
+            raise
+
+        with self._lock:
+            if len(self._idle_workers) == 0:
+                self._release_blocks(blocks)
+                raise RuntimeError("There is no idle inference worker!")
+            worker_idx = self._idle_workers.pop(0)
+            self._task_counter += 1
+            task_id = self._task_counter
+            self._pending[task_id] = (future, worker_idx, blocks, sizes)
+            self._worker_tasks[worker_idx] = task_id
+        self._task_queues[worker_idx].put((task_id, items, variants))
+        return future
+
+    def _listen(self):
+        """Resolves futures of completed tasks"""
+        while not self._closed.is_set():
+            try:
+                task_id, error, payload = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            if task_id is None:
+                self._worker_ready()
+                continue
+            for stage, seconds in payload:
+                report_stage_time(stage, seconds)
+            self._complete_task(task_id, error)
+
+    def _worker_ready(self):
+        """Handles the report of a started worker"""
+        if self._ready.done():
+            return
+        self._ready_workers += 1
+        if self._ready_workers == self.workers:
+            self._ready.set_result(self.interface.routing())
+
+    def _watch(self):
+        """Checks liveness of workers on a timer, independent of the results traffic"""
+        while not self._closed.wait(self.LIVENESS_INTERVAL):
+            self._check_workers()
+
+    def _check_workers(self):
+        """Fails tasks of dead workers and restarts them"""
+        for worker_idx, process in enumerate(self._processes):
+            if self._closed.is_set() or process is None or process.is_alive():
+                continue
+            logger.error(
+                f"Inference worker {worker_idx} died with exit code {process.exitcode}."
+                f" Restarting it."
+            )
+            if not self._ready.done():
+                # Worker dies on start, so restarting it won't help
+                self._ready.set_exception(
+                    RuntimeError("Inference worker died on start")
+                )
+                self._closed.set()
+                return
+            with self._lock:
+                task_id = self._worker_tasks.get(worker_idx)
+            self._start_worker(worker_idx)
+            if task_id is not None:
+                self._complete_task(task_id, "Inference worker died")
+
+    def _complete_task(self, task_id: int, error: Optional[str]):
+        """Reads task results from shared memory and resolves its future"""
+        with self._lock:
+            if task_id not in self._pending:
+                return
+            future, worker_idx, blocks, sizes = self._pending.pop(task_id)
+            self._worker_tasks.pop(worker_idx, None)
+            self._idle_workers.append(worker_idx)
+        try:
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(
+                    [
+                        _image_from_block(block, size, "RGBA")
+                        for block, size in zip(blocks[1::2], sizes)
+                    ]
+                )
+        finally:
+            self._release_blocks(blocks)
+
+    def close(self):
+        """Stops all worker processes"""
+        self._closed.set()
+        for worker_idx, process in enumerate(self._processes):
+            self._task_queues[worker_idx].put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+
+    @staticmethod
+    def _release_blocks(blocks: List[shared_memory.SharedMemory]):
+        for block in blocks:
+            block.close()
+            block.unlink()
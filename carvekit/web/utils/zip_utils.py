@@ -0,0 +1,53 @@
+import io
+import time
+import zipfile
+
+__all__ = ["write_zip_entry", "ZipStreamBuffer"]
+
+
+def write_zip_entry(
+    zip_file: zipfile.ZipFile,
+    filename: str,
+    data: bytes,
+    compress_type: int = zipfile.ZIP_DEFLATED,
+):
+    """
+    Writes file to the zip archive
+
+    Args:
+        zip_file: opened for writing zip archive
+        filename: file name in the archive
+        data: file content
+        compress_type: zipfile compression method
+    """
+    zip_info = zipfile.ZipInfo(filename=filename)
+    zip_info.date_time = time.localtime(time.time())[:6]
+    zip_info.compress_type = compress_type
+    zip_file.writestr(zip_info, data)
+
+
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    Unseekable output stream for zipfile.ZipFile,
+    which allows sending the archive while it is being written
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        """
+        Returns:
+            all data written since the previous call
+        """
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
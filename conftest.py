@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import os
+import threading
 from pathlib import Path
 
 import pytest
@@ -217,3 +218,38 @@ def yoloV4() -> Callable[[bool], SimplifiedYoloV4]:
         fp16=fp16,
         batch_size=5,
     )
+
+
+class BlockingInterface:
+    """Holds batches until release is set, started is set when the first batch arrives"""
+
+    def __init__(self, interface: Callable[[List[Image.Image]], List[Image.Image]]):
+        self.interface = interface
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.sizes = []
+
+    def __call__(self, images: List[Image.Image]) -> List[Image.Image]:
+        self.started.set()
+        self.release.wait(10)
+        self.sizes.extend(image.size for image in images)
+        return self.interface(images)
+
+
+@pytest.fixture()
+def block_interface(monkeypatch) -> Callable[[Any], BlockingInterface]:
+    """
+    Replaces the interface of the inference router with the BlockingInterface.
+    Held batches are released and the interface is restored after the test.
+    """
+    interfaces = []
+
+    def block(router) -> BlockingInterface:
+        interface = BlockingInterface(router.interface)
+        monkeypatch.setattr(router, "interface", interface)
+        interfaces.append(interface)
+        return interface
+
+    yield block
+    for interface in interfaces:
+        interface.release.set()
@@ -9,6 +9,10 @@ import torch
 
 from carvekit.api.autointerface import AutoInterface
 from carvekit.api.interface import Interface
+from carvekit.web.schemas.config import MLConfig
+from carvekit.utils.models_utils import ModelRegistry
+from carvekit.web.utils import init_utils
+from carvekit.web.utils.init_utils import init_postprocessing, init_typed_interfaces
 
 
 def test_init(scene_classifier_model, yoloV4):
@@ -40,3 +44,47 @@ def test_seg(image_pil, image_str, image_path, scene_classifier_model, yoloV4):
         fp16=True,
     )
     interface([image_pil, image_str, image_path])
+
+
+def test_shared_postprocessing():
+    config = MLConfig(preprocessing_method="auto", postprocessing_method="cascade_fba")
+    interface = AutoInterface(
+        None,
+        None,
+        refining_batch_size=config.batch_size_refine,
+        refining_image_size=config.refine_mask_size,
+        postprocessing_batch_size=config.batch_size_matting,
+        postprocessing_image_size=config.matting_mask_size,
+    )
+    postprocessing = init_postprocessing(config)
+    assert postprocessing.refining_module is interface.refining_module()
+    assert postprocessing.matting_module is interface.matting_module()
+
+
+def test_shared_typed_networks(monkeypatch):
+    class StubNet:
+        def __init__(self, device="cpu", batch_size=1, fp16=False):
+            self.device, self.batch_size, self.fp16 = device, batch_size, fp16
+
+    registry = ModelRegistry()
+    monkeypatch.setattr(init_utils, "model_registry", registry)
+    monkeypatch.setattr(init_utils, "SEGMENTATION_NETWORKS", {"isnet": StubNet})
+    config = MLConfig(
+        preprocessing_method="auto",
+        postprocessing_method="none",
+        type_networks={"person": "isnet", "car": "isnet"},
+    )
+    interface = AutoInterface(
+        None, None, segmentation_batch_size=3, segmentation_device="cpu"
+    )
+    interfaces = init_typed_interfaces(config, interface)
+    network = interfaces["person"].segmentation_pipeline
+    assert interfaces["car"].segmentation_pipeline is network
+    # AutoInterface takes networks from the registry with its own settings
+    assert network is registry.get(
+        StubNet,
+        device=interface.segmentation_device,
+        batch_size=interface.segmentation_batch_size,
+        fp16=interface.fp16,
+    )
+    assert network.batch_size == 3
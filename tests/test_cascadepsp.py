@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 
+import numpy as np
 import pytest
 import torch
 from PIL import Image
@@ -89,3 +90,25 @@ def test_seg_with_fp12(
     )
     with pytest.raises(ValueError):
         cascadepsp([image_pil], [image_mask, image_mask])
+
+
+@pytest.mark.parametrize("accelerate_size", [2048, 512])
+def test_mask_arrays_match_pil(image_mask, accelerate_size):
+    cascadepsp = CascadePSP(
+        load_pretrained=False, processing_accelerate_image_size=accelerate_size
+    )
+    mask = np.array(image_mask)
+    reference = image_mask.copy()
+    reference.thumbnail((accelerate_size, accelerate_size))
+    reference = (np.array(reference) > 127).astype(np.uint8) * 255
+    reference = cascadepsp._seg_transform(reference).unsqueeze(0)
+    preprocessed = cascadepsp.data_preprocessing(mask)
+    assert preprocessed.shape == reference.shape
+    assert (preprocessed != reference).float().mean() < 0.001
+
+    refined = torch.from_numpy(np.array(image_mask.resize((900, 600))) / 255)[None]
+    reference = image_mask.resize((900, 600)).resize(image_mask.size)
+    reference = np.array(reference).astype(int)
+    postprocessed = cascadepsp.data_postprocessing(refined, mask).astype(int)
+    assert postprocessed.shape == reference.shape
+    assert np.mean((postprocessed > 127) != (reference > 127)) < 0.001
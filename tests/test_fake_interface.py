@@ -0,0 +1,42 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import time
+
+from PIL import Image
+
+from carvekit.api.fake import FakeInterface, FakeSegmentation
+from carvekit.web.schemas.config import MLConfig
+from carvekit.web.utils.init_utils import init_interface, init_typed_interfaces
+
+
+def test_fake_segmentation_latency():
+    image = Image.new("RGB", (1000, 1000))
+    assert FakeSegmentation(100, 50, 0).latency(image) == 0.15
+    fake = FakeSegmentation(100, 0, 50, seed=0)
+    latencies = [fake.latency(image) for _ in range(2000)]
+    assert all(latency > 0 for latency in latencies)
+    assert 0.09 < sum(latencies) / len(latencies) < 0.11
+    assert FakeSegmentation(0, 0, 50).latency(image) == 0
+
+
+def test_fake_interface():
+    interface = init_interface(
+        MLConfig(
+            inference_backend="fake",
+            fake_latency_ms=100,
+            fake_latency_ms_per_mp=0,
+            fake_latency_std_ms=0,
+        )
+    )
+    assert isinstance(interface, FakeInterface)
+    assert init_typed_interfaces(MLConfig(inference_backend="fake"), interface) == {}
+    started_at = time.perf_counter()
+    outputs = interface([Image.new("RGB", (64, 48)), Image.new("RGB", (32, 32))])
+    assert time.perf_counter() - started_at >= 0.2
+    assert [output.size for output in outputs] == [(64, 48), (32, 32)]
+    assert outputs[0].mode == "RGBA"
+    assert outputs[0].getpixel((32, 24))[3] == 255
+    assert outputs[0].getpixel((0, 0))[3] == 0
@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 
+import numpy as np
 import pytest
 import torch
 from PIL import Image
@@ -114,3 +115,26 @@ def test_seg_with_fp12(
     )
     with pytest.raises(ValueError):
         fba_model([image_pil], [image_trimap, image_trimap])
+
+
+def test_trimap_arrays_match_pil(image_trimap):
+    fba = FBAMatting(load_pretrained=False, input_tensor_size=1024, batch_size=1)
+    reference = image_trimap.copy()
+    reference.thumbnail((1024, 1024), resample=3)
+    # Reference fits into the input size already, so it isn't resized again
+    reference = fba.data_preprocessing(reference.convert("L"))[0]
+    preprocessed = fba.data_preprocessing(np.array(image_trimap))[0]
+    assert preprocessed.shape == reference.shape
+    # Known foreground and background differ only on a small share of edge pixels
+    assert ((preprocessed > 0.5) != (reference > 0.5)).float().mean() < 0.001
+
+
+def test_call_input_size():
+    fba = FBAMatting(load_pretrained=False, input_tensor_size=1024, batch_size=2)
+    image = Image.new("RGB", (512, 384))
+    assert fba.data_preprocessing(image)[0].shape == (1, 3, 1024, 1024)
+    assert fba.data_preprocessing(image, (256, 128))[0].shape == (1, 3, 128, 256)
+    # Size passed with the call doesn't change the shared instance
+    masks = fba([image], [np.zeros((384, 512), dtype=np.uint8)], input_image_size=64)
+    assert masks[0].shape == (384, 512)
+    assert fba.input_image_size == (1024, 1024)
@@ -3,10 +3,12 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import pickle
 import uuid
 from pathlib import Path
 
 import PIL.Image
+import numpy as np
 import pytest
 import torch
 from PIL import Image
@@ -17,6 +19,13 @@ from carvekit.utils.image_utils import (
     to_tensor,
     transparency_paste,
     add_margin,
+    PreparedImage,
+    prepare_image,
+    prepare_images,
+    load_rgb_image,
+    resize_image,
+    thumbnail_image,
+    thumbnail_size,
 )
 
 
@@ -61,6 +70,64 @@ def test_convert_image(image_pil):
     assert convert_image(image_pil.convert("RGBA")).mode == "RGB"
 
 
+def test_prepared_image(image_path, image_pil):
+    prepared = prepare_image(image_path)
+    assert isinstance(prepared, PreparedImage)
+    assert prepared.mode == "RGB" and prepared.size == image_pil.size
+    assert prepare_image(prepared) is prepared
+    first, second, third = prepare_images([image_pil, image_pil, prepared])
+    assert first is second and third is prepared
+    assert load_image(prepared) is prepared.image
+    assert convert_image(prepared) is prepared.image
+    assert convert_image(prepared, mode="L").mode == "L"
+    assert load_rgb_image(prepared) is prepared
+    assert load_rgb_image(image_path).mode == "RGB"
+    assert prepare_image(image_pil.convert("RGBA")).mode == "RGB"
+    with pytest.raises(ValueError):
+        prepare_image(23)
+
+    rgb = image_pil.convert("RGB")
+    resized = resize_image(prepared, (256, 128), resample=3)
+    assert np.array_equal(np.array(resized), np.array(rgb.resize((256, 128), 3)))
+    prepared.resize((256, 128), resample=0)
+    assert list(prepared.variants) == [
+        ("resize", (256, 128), 3),
+        ("resize", (256, 128), 0),
+    ]
+    assert np.array_equal(
+        np.array(resize_image(rgb, (256, 128), resample=3)), np.array(resized)
+    )
+
+    thumbnail = thumbnail_image(prepared, (300, 300))
+    expected = rgb.copy()
+    expected.thumbnail((300, 300))
+    assert np.array_equal(np.array(thumbnail), np.array(expected))
+    thumbnail_image(prepared, (300, 300))
+    assert len(prepared.variants) == 3  # memoized
+    assert np.array_equal(
+        np.array(thumbnail_image(rgb, (300, 300))), np.array(expected)
+    )
+
+    # Returned variants are copies, so writing to them doesn't change the memoized ones
+    thumbnail.paste((255, 0, 0), (0, 0, 10, 10))
+    resized.paste((255, 0, 0), (0, 0, 10, 10))
+    cached = prepared.variants[("thumbnail", (300, 300), 3)]
+    assert np.array_equal(np.array(cached), np.array(expected))
+    assert np.array_equal(
+        np.array(thumbnail_image(prepared, (300, 300))), np.array(expected)
+    )
+    cached = prepared.variants[("resize", (256, 128), 3)]
+    assert np.array_equal(np.array(cached), np.array(rgb.resize((256, 128), 3)))
+    # RGB image isn't copied
+    source = Image.new("RGB", (512, 512))
+    assert load_image(prepare_image(source)) is source
+
+    # Variants aren't pickled
+    restored = pickle.loads(pickle.dumps(prepared))
+    assert np.array_equal(np.array(restored.image), np.array(rgb))
+    assert restored.variants == {}
+
+
 def test_to_tensor(image_pil):
     assert isinstance(to_tensor(image_pil), torch.Tensor)
 
@@ -90,3 +157,14 @@ def test_add_margin():
         )
         is True
     )
+
+
+@pytest.mark.parametrize(
+    "size",
+    [(2160, 1440), (1440, 2160), (1000, 333), (333, 1000), (512, 512), (7, 3000)],
+)
+def test_thumbnail_size(size):
+    for max_size in [(1024, 1024), (900, 600), (4096, 4096)]:
+        image = Image.new("L", size)
+        image.thumbnail(max_size)
+        assert thumbnail_size(size, max_size) == image.size
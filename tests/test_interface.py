@@ -5,9 +5,13 @@ License: Apache License 2.0
 """
 import warnings
 
+import numpy as np
 import torch
 
+from carvekit.api.fake import FakeSegmentation
 from carvekit.api.interface import Interface
+from carvekit.pipelines.postprocessing import MattingMethod, CasMattingMethod
+from carvekit.trimap.generator import TrimapGenerator
 
 
 def test_init(available_models):
@@ -52,3 +56,76 @@ def test_seg(image_pil, image_str, image_path, available_models):
                 del post, interface
             del pre
         del mdl
+
+
+class StubMatting:
+    batch_size = 2
+
+    def __call__(self, images, trimaps, disable_noise_filter=None):
+        return [np.where(trimap > 0, 255, 0).astype(np.uint8) for trimap in trimaps]
+
+
+class StubRefining:
+    batch_size = 3
+
+    def __call__(self, images, masks, mask_binary_threshold=None):
+        return [255 - mask for mask in masks]
+
+
+def test_stream(image_pil, image_str, image_path):
+    trimap_generator = TrimapGenerator()
+    for post in [
+        None,
+        MattingMethod(matting_module=StubMatting(), trimap_generator=trimap_generator),
+        CasMattingMethod(
+            refining_module=StubRefining(),
+            matting_module=StubMatting(),
+            trimap_generator=trimap_generator,
+        ),
+    ]:
+        interface = Interface(
+            seg_pipe=FakeSegmentation(latency_ms=0, latency_ms_per_mp=0),
+            post_pipe=post,
+        )
+        images = [image_pil, image_str, image_path] * 2
+        expected = interface(images)
+        outputs = list(interface.stream(iter(images), queue_size=1))
+        assert len(outputs) == len(expected)
+        for output, expected_output in zip(outputs, expected):
+            assert output.tobytes() == expected_output.tobytes()
+
+
+class RecordingCasMatting(CasMattingMethod):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stages = []
+
+    def refine(self, images, masks):
+        self.stages.append(("refine", len(images)))
+        return super().refine(images, masks)
+
+    def matting(self, images, trimaps):
+        self.stages.append(("matting", len(images)))
+        return super().matting(images, trimaps)
+
+
+def test_stream_stages(image_pil, image_str, image_path):
+    post = RecordingCasMatting(
+        refining_module=StubRefining(),
+        matting_module=StubMatting(),
+        trimap_generator=TrimapGenerator(),
+    )
+    interface = Interface(
+        seg_pipe=FakeSegmentation(latency_ms=0, latency_ms_per_mp=0), post_pipe=post
+    )
+    images = [image_pil, image_str, image_path] * 2
+    expected = interface(images)
+    assert post.stages == [("refine", 6), ("matting", 6)]
+    post.stages.clear()
+    outputs = list(interface.stream(iter(images), queue_size=1))
+    # Stream runs the same stage methods of the pipeline, batched by each network
+    assert sum(n for stage, n in post.stages if stage == "refine") == 6
+    assert sum(n for stage, n in post.stages if stage == "matting") == 6
+    assert [output.tobytes() for output in outputs] == [
+        output.tobytes() for output in expected
+    ]
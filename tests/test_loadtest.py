@@ -0,0 +1,74 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from carvekit.web.loadtest import (
+    parse_image_size,
+    parse_params,
+    synthetic_image,
+    percentile,
+    run_load,
+    format_report,
+)
+
+
+def test_parsers():
+    assert parse_image_size("1920x1080") == (1920, 1080)
+    with pytest.raises(ValueError):
+        parse_image_size("1920")
+    with pytest.raises(ValueError):
+        parse_image_size("0x10")
+    assert parse_params("size=preview&format=png") == {
+        "size": "preview",
+        "format": "png",
+    }
+    assert parse_params("") == {}
+
+
+def test_synthetic_image():
+    image = Image.open(io.BytesIO(synthetic_image((64, 48), 0)))
+    assert image.size == (64, 48)
+    assert synthetic_image((64, 48), 0) != synthetic_image((64, 48), 1)
+
+
+def test_percentile():
+    assert percentile([], 50) == 0
+    assert percentile([3, 1, 2], 50) == 2
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile(list(range(101)), 99) == 99
+
+
+def test_run_load():
+    sizes = []
+
+    def handler(request: httpx.Request):
+        assert request.url.path == "/api/removebg"
+        assert request.headers["X-Api-Key"] == "token"
+        sizes.append(len(request.content))
+        if len(sizes) % 5 == 0:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b"image")
+
+    stats = asyncio.run(
+        run_load(
+            "http://test",
+            api_key="token",
+            concurrency=3,
+            requests_count=20,
+            image_sizes=[(64, 64), (32, 32)],
+            params_mix=[{"size": "preview"}, {}],
+            transport=httpx.MockTransport(handler),
+        )
+    )
+    assert stats["statuses"] == {"200": 16, "503": 4}
+    assert stats["throughput"] > 0
+    assert 0 < stats["latency"]["p50"] <= stats["latency"]["p99"]
+    assert "p95" in format_report(stats)
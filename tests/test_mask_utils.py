@@ -3,9 +3,18 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+import numpy as np
 import pytest
 import PIL.Image
-from carvekit.utils.mask_utils import composite, apply_mask, extract_alpha_channel
+from carvekit.utils.mask_utils import (
+    composite,
+    apply_mask,
+    extract_alpha_channel,
+    to_mask_array,
+    to_mask_image,
+    load_mask,
+    resize_mask,
+)
 
 
 def test_composite():
@@ -37,6 +46,27 @@ def test_apply_mask():
     )
 
 
+def test_apply_mask_array(image_pil, image_mask):
+    mask = image_mask.convert("L")
+    assert np.array_equal(
+        np.array(apply_mask(image=image_pil, mask=np.array(mask))),
+        np.array(apply_mask(image=image_pil, mask=mask)),
+    )
+
+
+def test_mask_conversion(image_path, image_mask):
+    mask = np.array(image_mask.convert("L"))
+    assert to_mask_array(mask) is mask
+    assert np.array_equal(to_mask_array(image_mask.convert("L")), mask)
+    assert np.array_equal(np.array(to_mask_image(mask)), mask)
+    assert np.array_equal(load_mask(image_path.with_name("cat_mask.png")), mask)
+    assert np.array_equal(load_mask(image_mask), mask)
+    with pytest.raises(ValueError):
+        to_mask_array(image_mask.convert("RGB"))
+    with pytest.raises(ValueError):
+        to_mask_image(np.zeros((10, 10, 3), dtype=np.uint8))
+
+
 def test_extract_alpha_channel():
     assert (
         isinstance(
@@ -44,3 +74,15 @@ def test_extract_alpha_channel():
         )
         is True
     )
+
+
+def test_resize_mask(image_mask):
+    mask = np.array(image_mask)
+    assert resize_mask(mask, mask.shape[::-1]) is mask
+    for size in [(900, 600), (4000, 3000)]:
+        resized = resize_mask(mask, size).astype(int)
+        reference = np.array(image_mask.resize(size)).astype(int)
+        assert resized.shape == reference.shape
+        # Resampling differs from PIL one only on a small share of edge pixels
+        assert np.abs(resized - reference).mean() < 1
+        assert np.mean((resized > 127) != (reference > 127)) < 0.001
@@ -0,0 +1,57 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+from PIL import Image
+
+from carvekit.web.utils.matte_cache import MatteCache
+
+
+def test_matte_cache_key():
+    cache = MatteCache("config", max_bytes=1024)
+    image = Image.new("RGB", (16, 16), (1, 2, 3))
+    digest = MatteCache.digest(image)
+    assert digest == MatteCache.digest(image.copy())
+    assert digest != MatteCache.digest(Image.new("RGB", (16, 16), (1, 2, 4)))
+    assert digest != MatteCache.digest(Image.new("RGB", (8, 32), (1, 2, 3)))
+    assert MatteCache.digest(b"file") != MatteCache.digest(b"other file")
+    geometry = ((16, 16), (0, 0, 16, 16))
+    assert cache.key(digest, "auto", geometry) == cache.key(digest, "auto", geometry)
+    assert cache.key(digest, "auto", geometry) != cache.key(digest, "car", geometry)
+    assert cache.key(digest, "auto", geometry) != cache.key(
+        digest, "auto", ((16, 16), (0, 0, 8, 16))
+    )
+    assert cache.key(digest, "auto", geometry) != MatteCache(
+        "other", max_bytes=1024
+    ).key(digest, "auto", geometry)
+
+
+def test_matte_cache_lru(tmp_path):
+    cache = MatteCache(
+        "config", max_bytes=2 * 256, disk_path=tmp_path, disk_max_bytes=256
+    )
+    for i in range(4):
+        cache.put(str(i), Image.new("L", (16, 16), i))
+    assert cache.get("0", (16, 16)) is None  # evicted from both tiers
+    assert cache.get("1", (16, 16)).getpixel((0, 0)) == 1  # read from disk
+    assert cache.get("3", (16, 16)).getpixel((0, 0)) == 3
+    assert len(list(tmp_path.glob("*.alpha"))) == 1
+
+    cache = MatteCache("config", max_bytes=0, disk_path=tmp_path, disk_max_bytes=256)
+    # "2" was evicted to disk, when "1" was read back into memory
+    assert cache.get("2", (16, 16)).getpixel((0, 0)) == 2  # disk tier survives restart
+
+
+def test_matte_cache_coalescing():
+    cache = MatteCache("config", max_bytes=1024)
+    assert cache.claim("key") is None
+    future = cache.claim("key")
+    assert not future.done()
+    cache.resolve("key", alpha=Image.new("L", (16, 16), 5))
+    assert future.result().getpixel((0, 0)) == 5
+    assert cache.get("key", (16, 16)) is not None
+    assert cache.claim("key") is None
+    future = cache.claim("key")
+    cache.resolve("key", error=ValueError())
+    assert isinstance(future.exception(), ValueError)
@@ -4,7 +4,11 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+import torch
 from pathlib import Path
 from carvekit.utils.download_models import sha512_checksum_calc
 from carvekit.ml.files.models_loc import (
@@ -18,7 +22,7 @@ from carvekit.ml.files.models_loc import (
     tracer_b7_pretrained,
     scene_classifier_pretrained,
 )
-from carvekit.utils.models_utils import fix_seed, suppress_warnings
+from carvekit.utils.models_utils import fix_seed, suppress_warnings, ModelRegistry
 
 
 def test_fix_seed():
@@ -72,3 +76,69 @@ def test_check_for_exists():
     assert basnet_pretrained().exists()
     assert tracer_b7_pretrained().exists()
     assert scene_classifier_pretrained().exists()
+
+
+class TinyModel(torch.nn.Module):
+    created = 0
+
+    def __init__(self, size: int = 8, device="cpu"):
+        super().__init__()
+        TinyModel.created += 1
+        self.linear = torch.nn.Linear(size, size, bias=False)
+
+
+def test_model_registry():
+    registry = ModelRegistry(max_bytes=2 * 8 * 8 * 4)
+    TinyModel.created = 0
+    model = registry.get(TinyModel, size=8)
+    assert registry.get(TinyModel, size=8) is model
+    assert registry.get(TinyModel, size=8, device="cpu") is not model  # other config
+    assert TinyModel.created == 2
+    assert registry.nbytes == 2 * 8 * 8 * 4
+    registry.get(TinyModel, size=8)  # most recently used now
+    registry.get(TinyModel, size=8, device="cuda:1")
+    assert len(registry) == 2  # least recently used model is evicted
+    assert registry.get(TinyModel, size=8) is model
+    assert TinyModel.created == 3
+    registry.get(TinyModel, size=16)  # larger than the budget, but it is still kept
+    assert len(registry) == 1
+    registry.max_bytes = None
+    registry.get(TinyModel, size=8)
+    assert len(registry) == 2
+    registry.max_bytes = 0
+    assert len(registry) == 1
+    registry.clear()
+    assert len(registry) == 0 and registry.nbytes == 0
+
+
+def test_model_registry_resident():
+    registry = ModelRegistry(max_bytes=8 * 8 * 4)
+    model = registry.get_resident(TinyModel, size=8)
+    registry.get(TinyModel, size=8, device="cuda:1")
+    registry.get(TinyModel, size=8, device="cuda:2")
+    assert registry.get(TinyModel, size=8) is model  # resident model isn't evicted
+    assert len(registry) == 2
+
+
+class SlowModel(TinyModel):
+    started = threading.Event()
+    release = threading.Event()
+
+    def __init__(self, size: int = 8, device="cpu"):
+        SlowModel.started.set()
+        assert SlowModel.release.wait(10)
+        super().__init__(size, device)
+
+
+def test_model_registry_concurrent_loading():
+    registry = ModelRegistry()
+    TinyModel.created = 0
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(registry.get, SlowModel) for _ in range(2)]
+        assert SlowModel.started.wait(10)
+        # Other models are loaded meanwhile, the registry isn't locked by the slow one
+        registry.get(TinyModel, size=4)
+        SlowModel.release.set()
+        models = [future.result(timeout=10) for future in futures]
+    assert models[0] is models[1]
+    assert TinyModel.created == 2
@@ -0,0 +1,80 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from carvekit.web.utils.net_utils import ImageFetcher
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        buff = io.BytesIO()
+        Image.new("RGB", (32, 16), (255, 0, 0)).save(buff, "PNG")
+        body = buff.getvalue()
+        if self.path == "/slow.png":
+            time.sleep(1)
+        elif self.path == "/redirect.png":
+            self.send_response(302)
+            self.send_header("Location", "file:///etc/passwd")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def image_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def fetch(fetcher: ImageFetcher, url: str):
+    async def run():
+        try:
+            return await fetcher.fetch_image(url)
+        finally:
+            await fetcher.close()
+
+    return asyncio.run(run())
+
+
+def test_fetch_image(image_server):
+    image = fetch(ImageFetcher(allow_loopback=True), f"{image_server}/image.png")
+    assert image.size == (32, 16)
+    assert image.convert("RGB").getpixel((0, 0)) == (255, 0, 0)
+
+
+def test_fetch_image_limits(image_server):
+    with pytest.raises(ValueError):
+        fetch(
+            ImageFetcher(allow_loopback=True, max_size=10), f"{image_server}/image.png"
+        )
+    with pytest.raises(asyncio.TimeoutError):
+        fetch(
+            ImageFetcher(allow_loopback=True, timeout=0.2), f"{image_server}/slow.png"
+        )
+
+
+def test_fetch_image_ssrf(image_server):
+    with pytest.raises(ValueError):
+        fetch(ImageFetcher(), f"{image_server}/image.png")
+    with pytest.raises(Exception):
+        fetch(ImageFetcher(allow_loopback=True), f"{image_server}/redirect.png")
+    assert asyncio.run(ImageFetcher().is_url_allowed("ftp://example.com")) is False
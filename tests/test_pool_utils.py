@@ -3,7 +3,15 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
-from carvekit.utils.pool_utils import batch_generator, thread_pool_processing
+import itertools
+
+import pytest
+
+from carvekit.utils.pool_utils import (
+    batch_generator,
+    thread_pool_processing,
+    pipeline_processing,
+)
 
 
 def test_thread_pool_processing():
@@ -14,3 +22,43 @@ def test_thread_pool_processing():
 def test_batch_generator():
     assert list(batch_generator([1, 2, 3], n=1)) == [[1], [2], [3]]
     assert list(batch_generator([1, 2, 3, 4], n=2)) == [[1, 2], [3, 4]]
+
+
+def test_pipeline_processing():
+    batches = []
+
+    def double(batch):
+        batches.append(len(batch))
+        return [x * 2 for x in batch]
+
+    stages = [(double, 4), (lambda batch: [x + 1 for x in batch], 1)]
+    assert list(pipeline_processing(iter(range(20)), stages, queue_size=2)) == [
+        x * 2 + 1 for x in range(20)
+    ]
+    assert sum(batches) == 20 and max(batches) <= 4
+    assert list(pipeline_processing([], stages)) == []
+
+
+def test_pipeline_processing_errors():
+    def fail(batch):
+        if 3 in batch:
+            raise ValueError("stage error")
+        return batch
+
+    outputs = []
+    with pytest.raises(ValueError, match="stage error"):
+        for output in pipeline_processing(range(10), [(fail, 1)]):
+            outputs.append(output)
+    assert outputs == [0, 1, 2]
+
+    def data():
+        yield 1
+        raise KeyError("input error")
+
+    with pytest.raises(KeyError):
+        list(pipeline_processing(data(), [(fail, 1)]))
+
+    # Closed generator stops the stage threads
+    generator = pipeline_processing(itertools.count(), [(fail, 1)], queue_size=1)
+    assert next(generator) == 0
+    generator.close()
@@ -3,6 +3,12 @@ Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
 Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
+from PIL import Image
+
+from carvekit.api.interface import Interface
+from carvekit.pipelines.preprocessing import autoscene
+from carvekit.pipelines.preprocessing.autoscene import AutoScene
+from carvekit.utils.models_utils import ModelRegistry
 
 
 def test_seg(
@@ -12,3 +18,46 @@ def test_seg(
     interface_instance = interface_instance()
     preprocessing_stub_instance(interface_instance, [image_str, image_path])
     preprocessing_stub_instance(interface_instance, [image_pil, image_path])
+
+
+def test_autoscene(monkeypatch):
+    class StubNet:
+        def __init__(self, device="cpu", batch_size=1, fp16=False):
+            self.device, self.batch_size, self.fp16 = device, batch_size, fp16
+
+        def __call__(self, images):
+            return [(type(self), i) for i in range(len(images))]
+
+        def to(self, device):
+            raise AssertionError("Networks must stay on their device")
+
+    class SoftNet(StubNet):
+        pass
+
+    class HardNet(StubNet):
+        pass
+
+    registry = ModelRegistry()
+    monkeypatch.setattr(autoscene, "model_registry", registry)
+    monkeypatch.setattr(
+        AutoScene, "select_net", staticmethod({"soft": SoftNet, "hard": HardNet}.get)
+    )
+    scenes = ["soft", "hard", "soft", "hard", "soft"]
+    soft_net = SoftNet()
+    preprocessing = AutoScene(
+        lambda images: [[(scene, 1.0)] for scene in scenes], networks=[soft_net]
+    )
+    interface = Interface(seg_pipe=StubNet(batch_size=2), device="cpu")
+    # Equal images are in different scenes, masks keep the order of the images
+    masks = preprocessing(interface, [Image.new("RGB", (8, 8)) for _ in scenes])
+    assert masks == [
+        (SoftNet, 0),
+        (HardNet, 0),
+        (SoftNet, 1),
+        (HardNet, 1),
+        (SoftNet, 2),
+    ]
+    # Resident networks are used as is, others are taken from the registry
+    assert [key for key, _, _ in registry.entries()] == [
+        registry.key(HardNet, device="cpu", batch_size=2, fp16=False)
+    ]
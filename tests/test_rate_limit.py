@@ -0,0 +1,42 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import time
+
+import pytest
+
+from carvekit.web.utils.rate_limit import RateLimiter, RateLimitExceeded
+
+
+def test_rate_limiter_disabled():
+    limiter = RateLimiter(rate=0, burst=10)
+    limiter.charge("key", 100)
+    limiter.check("key")
+    assert limiter.wait_time("key") == 0
+
+
+def test_rate_limiter_bucket():
+    limiter = RateLimiter(rate=10, burst=5)
+    assert limiter.headers("key") == {
+        "X-Ratelimit-Limit": "5",
+        "X-Ratelimit-Remaining": "5",
+        "X-Ratelimit-Reset": "0",
+    }
+    limiter.check("key")
+    limiter.charge("key", 3)
+    assert limiter.headers("key")["X-Ratelimit-Remaining"] == "2"
+    limiter.charge("key", 4)  # large request takes the bucket into debt
+    headers = limiter.headers("key")
+    assert headers["X-Ratelimit-Remaining"] == "0"
+    assert headers["X-Ratelimit-Reset"] == "1"
+    assert 0.1 < limiter.wait_time("key") <= 0.2
+    with pytest.raises(RateLimitExceeded) as e:
+        limiter.check("key")
+    assert e.value.retry_after == 1
+    assert e.value.headers["X-Ratelimit-Remaining"] == "0"
+    limiter.check("other")  # buckets are per API key
+    time.sleep(0.25)
+    limiter.check("key")
+    assert limiter.wait_time("key") == 0
@@ -0,0 +1,58 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from carvekit.web.other.removebg import (
+    process_remove_bg,
+    prepare_remove_bg,
+    scaled_size,
+)
+from carvekit.web.schemas.request import Parameters
+
+
+class RecordingInterface:
+    def __init__(self):
+        self.sizes = []
+
+    def __call__(self, images):
+        self.sizes.extend(image.size for image in images)
+        return [image.convert("RGBA") for image in images]
+
+
+@pytest.mark.parametrize(
+    "params, input_size, output_size",
+    [
+        ({"size": "full"}, (1200, 800), (1200, 800)),
+        ({"size": "full", "scale": "25%"}, (300, 200), (300, 200)),
+        ({"size": "preview", "scale": "50%"}, (300, 200), (300, 200)),
+        (
+            {"size": "full", "scale": "25%", "roi": "0% 0% 50% 100%"},
+            (150, 200),
+            (150, 200),
+        ),
+        ({"size": "full", "scale": "10%", "crop": True}, (120, 80), (120, 80)),
+        ({"size": "full", "scale": "30%", "format": "jpg"}, (360, 240), (360, 240)),
+    ],
+)
+def test_output_resolution_planning(params, input_size, output_size):
+    params = Parameters(**params).dict()
+    interface = RecordingInterface()
+    response = process_remove_bg(interface, params, Image.new("RGB", (1200, 800)), None)
+    assert interface.sizes == [input_size]
+    assert response["data"][1] == output_size
+    assert Image.open(io.BytesIO(response["data"][0])).size == output_size
+
+
+def test_scaled_size():
+    params = Parameters(size="full", scale="25%").dict()
+    assert scaled_size(params, (1200, 800)) == (300, 200)
+    assert prepare_remove_bg(params, Image.new("RGB", (1200, 800)))[
+        "roi_image"
+    ].size == (300, 200)
+    assert scaled_size(Parameters(size="preview").dict(), (1250, 800)) == (625, 400)
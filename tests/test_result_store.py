@@ -0,0 +1,50 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import time
+
+from carvekit.web.utils.result_store import ResultStore
+
+
+def test_result_store_lru():
+    store = ResultStore(max_bytes=200, ttl=60)
+    for i in range(3):
+        store.put(str(i), {"data": i}, size=100)
+    assert "0" not in store  # evicted by the byte budget
+    assert store.nbytes == 200
+    assert store.get("1") == {"data": 1}
+    store.put("3", {"data": 3}, size=100)
+    assert "2" not in store  # "1" was used more recently
+    assert store.pop("1") == {"data": 1}
+    assert store.pop("1") is None
+    assert len(store) == 1 and store.nbytes == 100
+    store.put("large", {"data": 4}, size=1000)
+    assert "large" not in store
+
+
+def test_result_store_ttl():
+    store = ResultStore(max_bytes=200, ttl=0.2)
+    store.put("0", {"data": 0}, size=100)
+    time.sleep(0.1)
+    store.put("1", {"data": 1}, size=100)
+    assert store.get("0") is not None
+    time.sleep(0.15)
+    assert store.get("0") is None
+    assert store.get("1") is not None
+    assert store.nbytes == 100
+
+
+def test_result_store_disk(tmp_path):
+    store = ResultStore(max_bytes=100, ttl=60, disk_path=tmp_path, disk_max_bytes=2000)
+    store.put("0", {"data": b"0"}, size=100)
+    store.put("large", {"data": b"large"}, size=1000)
+    store.put("1", {"data": b"1"}, size=100)
+    assert store.nbytes == 100
+    assert len(list(tmp_path.glob("*.result"))) == 2
+    assert store.get("large") == {"data": b"large"}
+    assert store.pop("0") == {"data": b"0"}
+    assert len(list(tmp_path.glob("*.result"))) == 1
+    store.put("huge", {"data": b"huge"}, size=3000)
+    assert "huge" not in store and "large" in store
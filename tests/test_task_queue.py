@@ -0,0 +1,556 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+import time
+from functools import partial
+
+import pytest
+import torch
+from prometheus_client import generate_latest, REGISTRY
+from PIL import Image
+
+from carvekit.api.interface import Interface
+from carvekit.pipelines.postprocessing import MattingMethod
+from carvekit.trimap.generator import TrimapGenerator
+from carvekit.web.schemas.config import WebAPIConfig, MLConfig
+from carvekit.web.schemas.request import Parameters
+from carvekit.web.utils.inference_router import InferenceRouter
+from carvekit.web.utils.init_utils import init_tier_postprocessing
+from carvekit.web.utils.matte_cache import MatteCache
+from carvekit.web.utils import task_queue
+from carvekit.web.utils.task_queue import MLProcessor, QueueFullError
+from carvekit.web.utils.worker_pool import InferenceWorkerPool, _share_modules
+
+
+class StubInterface:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, images):
+        self.calls.append(len(images))
+        return [image.convert("RGBA") for image in images]
+
+
+FAKE_BACKEND = dict(
+    inference_backend="fake",
+    fake_latency_ms=0,
+    fake_latency_ms_per_mp=0,
+    fake_latency_std_ms=0,
+    device="cpu",
+)
+
+
+class Clock:
+    """Stand-in for the time module of the task queue, which tests move forward"""
+
+    def __init__(self):
+        self.offset = 0.0
+
+    def monotonic(self) -> float:
+        return time.monotonic() + self.offset
+
+    def advance(self, seconds: float):
+        self.offset += seconds
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def ml_processor_instance(**ml_config) -> MLProcessor:
+    ml_config.setdefault("warmup", False)
+    config = WebAPIConfig()
+    config.ml = config.ml.copy(update=ml_config)
+    processor = MLProcessor(api_config=config)
+    processor.inference = InferenceRouter(StubInterface())
+    return processor
+
+
+@pytest.fixture()
+def blocked_processor(block_interface):
+    """
+    Creates MLProcessor, whose interface holds batches until they are released.
+    Jobs are taken one by one, so once the interface is started, the first job
+    is in processing and the next ones are waiting in the queue.
+    """
+
+    def create(**ml_config):
+        ml_config.setdefault("batch_max_wait_ms", 0)
+        processor = ml_processor_instance(**ml_config)
+        return processor, block_interface(processor.inference)
+
+    return create
+
+
+@pytest.fixture()
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(task_queue, "time", clock)
+    return clock
+
+
+def test_job_lifecycle():
+    processor = ml_processor_instance()
+    job_id = processor.job_create(
+        [Parameters(format="png").dict(), Image.new("RGB", (64, 64)), None, False]
+    )
+    assert processor.job_future(job_id).result(timeout=10)["type"] == "png"
+    assert processor.job_status(job_id) == "finished"
+    result = processor.job_result(job_id)
+    assert result["type"] == "png"
+    assert result["data"][1] == (64, 64)
+    assert processor.job_status(job_id) == "not_found"
+    assert processor.job_future(job_id) is None
+    assert processor.job_result(job_id) is False
+
+
+def test_job_await():
+    processor = ml_processor_instance()
+
+    async def wait_all():
+        job_ids = [
+            processor.job_create(
+                [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+            )
+            for _ in range(3)
+        ]
+        await asyncio.gather(
+            *[asyncio.wrap_future(processor.job_future(i)) for i in job_ids]
+        )
+        return [processor.job_result(i) for i in job_ids]
+
+    results = asyncio.run(wait_all())
+    assert all(result["type"] == "png" for result in results)
+
+
+def test_job_error():
+    processor = ml_processor_instance()
+    job_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (1, 1)), None, False]
+    )
+    processor.job_future(job_id).result(timeout=10)
+    response, status_code = processor.job_result(job_id)
+    assert status_code == 400
+    assert "errors" in response
+
+
+def test_job_batching():
+    processor = ml_processor_instance(batch_size_seg=4, batch_max_wait_ms=1000)
+    job_ids = [
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64 + i)), None, False]
+        )
+        for i in range(4)
+    ]
+    results = []
+    for job_id in job_ids:
+        processor.job_future(job_id).result(timeout=10)
+        results.append(processor.job_result(job_id))
+    assert processor.inference.interface.calls == [4]
+    assert [result["data"][1] for result in results] == [(64, 64 + i) for i in range(4)]
+
+
+def test_worker_pool():
+    # Fake backend is loaded by this process and passed to the spawned workers
+    processor = ml_processor_instance(
+        inference_workers=2, batch_size_seg=2, **FAKE_BACKEND
+    )
+    job_ids = [
+        processor.job_create(
+            [
+                Parameters(format="png").dict(),
+                Image.new("RGB", (64, 64 + i), (i, 0, 0)),
+                None,
+                False,
+            ]
+        )
+        for i in range(6)
+    ]
+    for i, job_id in enumerate(job_ids):
+        processor.job_future(job_id).result(timeout=30)
+        result = processor.job_result(job_id)
+        image = Image.open(io.BytesIO(result["data"][0]))
+        assert image.size == (64, 64 + i)
+        assert image.getpixel((32, 32)) == (i, 0, 0, 255)
+        assert image.getpixel((0, 0))[3] == 0
+    processor.worker_pool.close()
+
+
+def test_worker_pool_dead_worker():
+    config = WebAPIConfig()
+    config.ml = config.ml.copy(update=dict(FAKE_BACKEND, fake_latency_ms=5000))
+    pool = InferenceWorkerPool(partial(InferenceRouter.from_config, config), 1)
+    assert pool.wait_ready(timeout=60) == ([], [])
+    future = pool.submit([Image.new("RGB", (64, 64))], [("auto", "full")])
+    pool._processes[0].kill()
+    # Liveness is checked on a timer, so the task fails long before the fake latency
+    with pytest.raises(RuntimeError, match="Inference worker died"):
+        future.result(timeout=4)
+    pool.close()
+
+
+def test_share_modules():
+    class Wrapper:
+        device = "cpu"
+        fp16 = False
+
+        def __init__(self):
+            self.net = torch.nn.Linear(2, 2).to(torch.float64)
+
+    wrapper = Wrapper()
+    router = {"wrappers": [wrapper, wrapper], "other": torch.nn.Linear(2, 2)}
+    _share_modules(router)
+    # Networks are cast to the inference dtype before sharing, so casting in workers is a no-op
+    assert wrapper.net.weight.dtype == torch.float32
+    assert all(p.is_shared() for p in wrapper.net.parameters())
+    assert all(p.is_shared() for p in router["other"].parameters())
+
+
+def test_job_queue_position(blocked_processor):
+    processor, interface = blocked_processor()
+    job_ids = [
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+        for _ in range(3)
+    ]
+    assert interface.started.wait(10)
+    assert processor.job_status(job_ids[0]) == "processing"
+    assert processor.job_status(job_ids[2]) == "wait"
+    assert [processor.job_queue_position(i) for i in job_ids] == [0, 1, 2]
+    interface.release.set()
+    processor.job_future(job_ids[2]).result(timeout=10)
+    assert processor.job_queue_position(job_ids[2]) is None
+    assert processor.job_image_size(job_ids[2]) == (64, 64)
+
+
+def test_job_queue_limits(blocked_processor):
+    processor, interface = blocked_processor(
+        queue_max_jobs=2, queue_max_megapixels=0.01
+    )
+    first_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (100, 200)), None, False]
+    )
+    with pytest.raises(QueueFullError):  # megapixels limit
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (1, 1)), None, False]
+        )
+    interface.release.set()
+    processor.job_future(first_id).result(timeout=10)
+    assert processor.queued_megapixels == 0
+    assert processor.job_time is not None
+    interface.release.clear()
+    processor.api_config.ml.queue_max_megapixels = 1
+    for _ in range(2):
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+    assert processor.queue_remaining() == 0
+    with pytest.raises(QueueFullError) as e:  # job count limit
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+    assert e.value.retry_after >= 1
+
+
+def test_job_metrics():
+    processor = ml_processor_instance(inference_workers=1, **FAKE_BACKEND)
+    job_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+    )
+    processor.job_future(job_id).result(timeout=30)
+    metrics = generate_latest().decode()
+    assert "carvekit_batch_size_count" in metrics
+    for stage in ["prepare", "inference", "finalize"]:
+        assert f'carvekit_stage_duration_seconds_count{{stage="{stage}"}}' in metrics
+    processor.worker_pool.close()
+
+
+def test_job_matte_cache(blocked_processor):
+    processor, interface = blocked_processor()
+    image = Image.new("RGB", (64, 64))
+    digest = MatteCache.digest(image)
+    job_ids = [
+        processor.job_create(
+            [Parameters(format="png").dict(), image.copy(), None, False],
+            digest=digest,
+        )
+        for _ in range(3)
+    ]
+    # Identical jobs wait in the queue, while the first one is processed
+    assert interface.started.wait(10)
+    interface.release.set()
+    for job_id in job_ids:
+        processor.job_future(job_id).result(timeout=10)
+        assert processor.job_result(job_id)["type"] == "png"
+    job_id = processor.job_create(
+        [Parameters(format="png").dict(), image.copy(), None, False], digest=digest
+    )
+    processor.job_future(job_id).result(timeout=10)
+    assert interface.interface.calls == [1]
+    # Jobs without the digest of the uploaded image bypass the cache
+    job_id = processor.job_create(
+        [Parameters(format="png").dict(), image.copy(), None, False]
+    )
+    processor.job_future(job_id).result(timeout=10)
+    assert interface.interface.calls == [1, 1]
+
+
+def test_job_formats():
+    processor = ml_processor_instance()
+    image = Image.new("RGB", (64, 64), (10, 20, 30))
+    expected = {
+        ("png", None): ("PNG", "RGBA"),
+        ("alpha", None): ("PNG", "L"),
+        ("webp", False): ("WEBP", "RGBA"),
+        ("webp", True): ("WEBP", "RGBA"),
+        ("jpg", None): ("JPEG", "RGB"),
+    }
+    for (image_format, lossless), (pil_format, mode) in expected.items():
+        # roi makes the right half of the output transparent
+        params = Parameters(
+            format=image_format,
+            lossless=bool(lossless),
+            quality=80,
+            roi="0% 0% 50% 100%",
+        )
+        job_id = processor.job_create([params.dict(), image.copy(), None, False])
+        processor.job_future(job_id).result(timeout=10)
+        result = processor.job_result(job_id)
+        output = Image.open(io.BytesIO(result["data"][0]))
+        assert (output.format, output.mode) == (pil_format, mode)
+        if lossless:
+            assert output.getpixel((0, 0)) == (10, 20, 30, 255)
+
+
+def test_warmup():
+    processor = ml_processor_instance(
+        warmup=True, seg_mask_size=64, refine_mask_size=32, matting_mask_size=64
+    )
+    sizes = []
+    interface = processor.inference.interface
+    processor.inference.interface = lambda images: sizes.extend(
+        image.size for image in images
+    ) or interface(images)
+    assert processor.state == "stopped"
+    processor.ensure_started()
+    # Jobs are taken from the queue only after the warm-up
+    job_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (48, 48)), None, False]
+    )
+    processor.job_future(job_id).result(timeout=10)
+    assert processor.state == "ready"
+    assert sizes == [(32, 32), (64, 64), (48, 48)]
+    assert processor.load_time is not None and processor.warmup_time is not None
+
+
+def test_job_cancel(blocked_processor):
+    processor, interface = blocked_processor()
+    job_ids = [
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64 + i)), None, False]
+        )
+        for i in range(3)
+    ]
+    assert interface.started.wait(10)
+    assert processor.job_cancel(job_ids[0])  # in processing
+    assert processor.job_cancel(job_ids[1])  # waiting in the queue
+    assert processor.job_cancel("unknown") is False
+    assert processor.job_status(job_ids[1]) == "not_found"
+    assert processor.queued_megapixels == pytest.approx(64 * (64 + 66) / 1_000_000)
+    interface.release.set()
+    processor.job_future(job_ids[2]).result(timeout=10)
+    assert processor.job_result(job_ids[2])["type"] == "png"
+    assert processor.job_status(job_ids[0]) == "not_found"
+    assert interface.interface.calls == [1, 1]
+    metrics = generate_latest().decode()
+    assert 'carvekit_jobs_shed_total{reason="cancelled",stage="queue"}' in metrics
+    assert 'carvekit_jobs_shed_total{reason="cancelled",stage="finalize"}' in metrics
+
+
+def test_job_cancel_queue_depth(blocked_processor):
+    processor, interface = blocked_processor(queue_max_jobs=3)
+    job_ids = [
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+        for _ in range(3)
+    ]
+    assert interface.started.wait(10)
+    assert REGISTRY.get_sample_value("carvekit_queue_depth") == 2
+    assert processor.job_cancel(job_ids[1])
+    # Cancelled job leaves the queue at once, so it doesn't count as load anymore
+    assert REGISTRY.get_sample_value("carvekit_queue_depth") == 1
+    assert processor.job_queue_position(job_ids[2]) == 1
+    job_ids.append(
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+    )
+    assert processor.job_queue_position(job_ids[3]) == 2
+    interface.release.set()
+    for job_id in [job_ids[0], job_ids[2], job_ids[3]]:
+        processor.job_future(job_id).result(timeout=10)
+    assert REGISTRY.get_sample_value("carvekit_queue_depth") == 0
+
+
+def test_job_deadline(blocked_processor, clock):
+    processor, interface = blocked_processor()
+    first_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+    )
+    expired_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (64, 64)), None, False],
+        deadline=clock.monotonic() + 0.2,
+    )
+    assert interface.started.wait(10)
+    clock.advance(0.5)  # deadline passes while the job waits in the queue
+    interface.release.set()
+    processor.job_future(first_id).result(timeout=10)
+    processor.job_future(expired_id).result(timeout=10)
+    response, status_code = processor.job_result(expired_id)
+    assert status_code == 504
+    assert interface.interface.calls == [1]
+
+
+@pytest.mark.parametrize(
+    "queue_policy, queue_aging, expected",
+    [
+        ("cost", 1.0, [(64, 64), (32, 32), (2000, 1000), (40, 40)]),
+        ("cost", 1e6, [(64, 64), (2000, 1000), (40, 40), (32, 32)]),
+        ("fifo", 1.0, [(64, 64), (2000, 1000), (40, 40), (32, 32)]),
+    ],
+)
+def test_job_scheduling(blocked_processor, clock, queue_policy, queue_aging, expected):
+    processor, interface = blocked_processor(
+        queue_policy=queue_policy, queue_aging=queue_aging
+    )
+    jobs = [
+        (Parameters(size="full"), (64, 64)),
+        (Parameters(size="full"), (2000, 1000)),
+        (Parameters(size="preview", priority="low"), (40, 40)),
+        (Parameters(size="preview", priority="high"), (32, 32)),
+    ]
+    job_ids = []
+    for params, size in jobs:
+        job_ids.append(
+            processor.job_create([params.dict(), Image.new("RGB", size), None, False])
+        )
+        # The first job is processed, the next ones are ordered in the queue
+        assert interface.started.wait(10)
+        clock.advance(0.2)
+    if queue_policy == "cost" and queue_aging == 1.0:
+        assert [processor.job_queue_position(i) for i in job_ids] == [0, 2, 3, 1]
+    interface.release.set()
+    for job_id in job_ids:
+        processor.job_future(job_id).result(timeout=10)
+    assert interface.sizes == expected
+
+
+def test_job_type_routing():
+    processor = ml_processor_instance(batch_size_seg=3, batch_max_wait_ms=1000)
+    person_interface = StubInterface()
+    processor.inference.typed_interfaces = {"person": person_interface}
+    job_ids = [
+        processor.job_create(
+            [Parameters(type=image_type).dict(), Image.new("RGB", size), None, False]
+        )
+        for image_type, size in [
+            ("person", (64, 64)),
+            ("car", (64, 64)),
+            ("auto", (32, 32)),
+        ]
+    ]
+    results = []
+    for job_id in job_ids:
+        processor.job_future(job_id).result(timeout=10)
+        results.append(processor.job_result(job_id))
+    assert [result["data"][1] for result in results] == [(64, 64), (64, 64), (32, 32)]
+    assert person_interface.calls == [1]
+    assert processor.inference.interface.calls == [
+        2
+    ]  # car has no interface, so it is auto
+
+
+def test_quality_tiers():
+    with pytest.raises(ValueError):
+        MLConfig(qos_tiers={"segmentation": 1, "no_refine": 5})
+    processor = ml_processor_instance(qos_tiers={"no_refine": 1, "segmentation": 3})
+    processor.inference.tier_postprocessing = {
+        "no_refine": object(),
+        "segmentation": None,
+    }
+    tiers = []
+    for wait in [0.5, 1.2, 0.6, 0.4, 3.5, 2, 1.2, 0.1]:
+        tiers.append(processor.select_tier(wait))
+    assert tiers == [
+        "full",
+        "no_refine",
+        "no_refine",  # degraded until the wait drops below the half of the threshold
+        "full",
+        "segmentation",
+        "segmentation",
+        "no_refine",
+        "full",
+    ]
+
+    segmentation_interface = StubInterface()
+    processor.inference.tier_interfaces[
+        ("auto", "segmentation")
+    ] = segmentation_interface
+    processor.queue_wait = lambda jobs: 10
+    job_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+    )
+    processor.job_future(job_id).result(timeout=10)
+    assert processor.job_result(job_id)["tier"] == "segmentation"
+    assert segmentation_interface.calls == [1]
+    assert processor.inference.interface.calls == []
+
+
+def test_fast_matting_tier():
+    config = MLConfig(qos_tiers={"fast_matting": 1}, qos_matting_mask_size=512)
+    fba = object()
+    postprocessing = MattingMethod(
+        matting_module=fba, trimap_generator=TrimapGenerator()
+    )
+    interface = Interface(seg_pipe=None, post_pipe=postprocessing)
+    tiers = init_tier_postprocessing(config, interface)
+    # Network is shared, the smaller size is passed with each call
+    assert tiers["fast_matting"].matting_module is fba
+    assert tiers["fast_matting"].input_image_size == 512
+    assert postprocessing.input_image_size is None
+
+
+def test_quality_tiers_drain(blocked_processor):
+    processor, interface = blocked_processor(qos_tiers={"no_refine": 1})
+    processor.inference.tier_postprocessing = {"no_refine": object()}
+    processor.inference.tier_interfaces[("auto", "no_refine")] = StubInterface()
+    job_ids = [
+        processor.job_create(
+            [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+        )
+    ]
+    assert interface.started.wait(10)
+    for _ in range(2):
+        job_ids.append(
+            processor.job_create(
+                [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+            )
+        )
+        processor.jobs[job_ids[-1]].created_at -= 2  # waited in a backlog
+    interface.release.set()
+    for job_id in job_ids:
+        processor.job_future(job_id).result(timeout=10)
+    tiers = [processor.job_result(job_id)["tier"] for job_id in job_ids]
+    assert tiers == ["full", "no_refine", "no_refine"]
+
+    # The queue is drained, so the next job isn't degraded by the past backlog
+    job_id = processor.job_create(
+        [Parameters().dict(), Image.new("RGB", (64, 64)), None, False]
+    )
+    processor.job_future(job_id).result(timeout=10)
+    assert processor.job_result(job_id)["tier"] == "full"
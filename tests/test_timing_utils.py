@@ -0,0 +1,30 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import pytest
+
+from carvekit.utils.timing_utils import (
+    add_stage_listener,
+    remove_stage_listener,
+    stage_timer,
+)
+
+
+def test_stage_timer():
+    timings = []
+    listener = lambda stage, seconds: timings.append((stage, seconds))
+    add_stage_listener(listener)
+    try:
+        with stage_timer("first"):
+            pass
+        with pytest.raises(ValueError):
+            with stage_timer("second"):
+                raise ValueError()
+    finally:
+        remove_stage_listener(listener)
+    with stage_timer("third"):
+        pass
+    assert [stage for stage, _ in timings] == ["first", "second"]
+    assert all(seconds >= 0 for _, seconds in timings)
@@ -4,6 +4,7 @@ Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
 License: Apache License 2.0
 """
 import PIL.Image
+import numpy as np
 import pytest
 
 from carvekit.trimap.add_ops import prob_as_unknown_area
@@ -29,6 +30,19 @@ def test_trimap_generator(trimap_instance, image_mask, image_pil):
         te(PIL.Image.new("RGB", (512, 512)), PIL.Image.new("RGB", (512, 512)))
 
 
+def test_trimap_generator_array(trimap_instance, image_mask, image_pil):
+    te = trimap_instance()
+    mask = np.array(image_mask.convert("L"))
+    trimap = te(image_pil, mask)
+    assert isinstance(trimap, np.ndarray) and trimap.dtype == np.uint8
+    assert np.array_equal(trimap, np.array(te(image_pil, image_mask.convert("L"))))
+    assert np.array_equal(mask, np.array(image_mask.convert("L")))  # not modified
+    with pytest.raises(ValueError):
+        te(image_pil, mask.astype(np.float32))
+    with pytest.raises(ValueError):
+        te(image_pil, mask[:256])
+
+
 def test_cv2_generator(cv2_trimap_instance, image_pil, image_mask):
     cv2trimapgen = cv2_trimap_instance()
     assert isinstance(cv2trimapgen(image_pil, image_mask), PIL.Image.Image)
@@ -0,0 +1,76 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import pytest
+from PIL import Image
+
+from carvekit.web.utils.upload_utils import (
+    read_image_stream,
+    archive_members,
+    UploadTooLargeError,
+)
+
+
+def read(data: bytes, max_size: int = 1024 * 1024, spool_size: int = 1024 * 1024):
+    async def stream():
+        for i in range(0, len(data), 100):
+            yield data[i : i + 100]
+
+    return asyncio.run(read_image_stream(stream(), max_size, spool_size))
+
+
+def test_read_image_stream():
+    buff = io.BytesIO()
+    Image.new("RGB", (64, 32), (1, 2, 3)).save(buff, "PNG")
+    for spool_size in [1024 * 1024, 0]:  # in memory and spilled to a temporary file
+        image = read(buff.getvalue(), spool_size=spool_size)
+        assert image.size == (64, 32)
+        assert image.getpixel((0, 0)) == (1, 2, 3)
+    assert read(b"") is None
+    with pytest.raises(UploadTooLargeError):
+        read(buff.getvalue(), max_size=10)
+    with pytest.raises(Exception):
+        read(b"not an image", spool_size=0)
+
+
+def zip_archive(files: dict) -> io.BytesIO:
+    buff = io.BytesIO()
+    with zipfile.ZipFile(buff, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for name, data in files.items():
+            zip_file.writestr(name, data)
+    buff.seek(0)
+    return buff
+
+
+def tar_archive(files: dict) -> io.BytesIO:
+    buff = io.BytesIO()
+    with tarfile.open(fileobj=buff, mode="w:gz") as tar_file:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar_file.addfile(info, io.BytesIO(data))
+    buff.seek(0)
+    return buff
+
+
+@pytest.mark.parametrize("archive", [zip_archive, tar_archive])
+def test_archive_members(archive):
+    files = {"a.png": b"a" * 10, "b.png": b"b" * 20}
+    members = archive_members(archive(files), 2, 20, 30)
+    assert [(name, read()) for name, read in members] == list(files.items())
+    with pytest.raises(UploadTooLargeError, match="Too many files"):
+        archive_members(archive(files), 1, 20, 30)
+    with pytest.raises(UploadTooLargeError, match="b.png"):
+        archive_members(archive(files), 2, 19, 30)
+    with pytest.raises(UploadTooLargeError, match="Archive is too large"):
+        archive_members(archive(files), 2, 20, 29)
+    # Highly compressible member is rejected by its header, before it is extracted
+    with pytest.raises(UploadTooLargeError):
+        archive_members(archive({"bomb.png": bytes(10 * 1024 * 1024)}), 2, 1024, 1024)
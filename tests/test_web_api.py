@@ -0,0 +1,218 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import asyncio
+import io
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+from starlette.testclient import TestClient
+
+API_KEY = "test-token"
+
+FAKE_BACKEND_ENV = {
+    "CARVEKIT_INFERENCE_BACKEND": "fake",
+    "CARVEKIT_FAKE_LATENCY_MS": "0",
+    "CARVEKIT_FAKE_LATENCY_MS_PER_MP": "0",
+    "CARVEKIT_FAKE_LATENCY_STD_MS": "0",
+    "CARVEKIT_WARMUP": "0",
+    "CARVEKIT_BATCH_MAX_WAIT_MS": "0",
+    "CARVEKIT_CACHE_MAX_MB": "0",  # every job reaches the interface
+    "CARVEKIT_AUTH_ENABLE": "1",
+    "CARVEKIT_ALLOWED_TOKENS": API_KEY,
+}
+
+
+def image_file(size=(64, 64), color=(200, 100, 50), image_format="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def deps():
+    """Web api dependencies, which are configured for the fake backend by the environment"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name, value in FAKE_BACKEND_ENV.items():
+            monkeypatch.setenv(name, value)
+        from carvekit.web import deps
+
+        assert deps.config.ml.inference_backend == "fake"
+        yield deps
+
+
+@pytest.fixture(scope="module")
+def client(deps):
+    from carvekit.web.app import app
+
+    with TestClient(app, headers={"X-Api-Key": API_KEY}) as client:
+        # Jobs are accepted before the backend is loaded, so the first one waits for it
+        response = client.post(
+            "/api/removebg", files={"image_file": ("image.png", image_file())}
+        )
+        assert response.status_code == 200
+        yield client
+
+
+def test_removebg(client):
+    response = client.post(
+        "/api/removebg",
+        files={"image_file": ("image.png", image_file((64, 48)))},
+        data={"format": "png"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert (response.headers["X-Width"], response.headers["X-Height"]) == ("64", "48")
+    image = Image.open(io.BytesIO(response.content))
+    assert image.size == (64, 48) and image.mode == "RGBA"
+    response = client.post(
+        "/api/removebg",
+        files={"image_file": ("image.png", image_file())},
+        headers={"X-Api-Key": "unknown"},
+    )
+    assert response.status_code == 403
+
+
+def test_jobs(client, deps):
+    response = client.post(
+        "/api/jobs",
+        files={"image_file": ("image.png", image_file())},
+        data={"format": "png"},
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ["wait", "processing", "finished"]
+    # Without rate limiting the headers report free space in the job queue
+    assert response.headers["X-Ratelimit-Limit"] == str(deps.config.ml.queue_max_jobs)
+
+    response = client.get(f"/api/jobs/{job['id']}/result", params={"wait": 10})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(response.content)).size == (64, 64)
+    # Result is returned once
+    assert client.get(f"/api/jobs/{job['id']}").status_code == 404
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 404
+    assert client.delete(f"/api/jobs/{job['id']}").status_code == 404
+
+
+def test_jobs_long_poll(client, deps, block_interface):
+    interface = block_interface(deps.ml_processor.inference)
+    job_id = client.post(
+        "/api/jobs", files={"image_file": ("image.png", image_file())}
+    ).json()["id"]
+    assert interface.started.wait(10)
+    assert client.get(f"/api/jobs/{job_id}").json() == {
+        "id": job_id,
+        "status": "processing",
+        "queue_position": 0,
+    }
+    response = client.get(f"/api/jobs/{job_id}/result", params={"wait": 0.1})
+    assert response.status_code == 202
+    assert response.json()["status"] == "processing"
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        long_poll = executor.submit(
+            client.get, f"/api/jobs/{job_id}/result", params={"wait": 30}
+        )
+        interface.release.set()
+        response = long_poll.result(timeout=30)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_batch_zip(client):
+    response = client.post(
+        "/api/removebg/batch",
+        files=[
+            ("image_files", ("first.png", image_file((64, 64)))),
+            ("image_files", ("second.png", image_file((48, 32)))),
+            ("image_files", ("broken.png", b"not an image")),
+        ],
+        data={"format": "png"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert sorted(archive.namelist()) == [
+            "broken.error.json",
+            "first.png",
+            "second.png",
+        ]
+        image = Image.open(io.BytesIO(archive.read("second.png")))
+        assert image.size == (48, 32) and image.mode == "RGBA"
+
+
+def test_queue_full(client, deps, block_interface, monkeypatch):
+    monkeypatch.setattr(deps.config.ml, "queue_max_jobs", 1)
+    interface = block_interface(deps.ml_processor.inference)
+    job_id = client.post(
+        "/api/jobs", files={"image_file": ("image.png", image_file())}
+    ).json()["id"]
+    for url in ["/api/jobs", "/api/removebg"]:
+        response = client.post(url, files={"image_file": ("image.png", image_file())})
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.headers["X-Ratelimit-Remaining"] == "0"
+    interface.release.set()
+    response = client.get(f"/api/jobs/{job_id}/result", params={"wait": 10})
+    assert response.status_code == 200
+
+
+def test_queue_full_background(client, deps, block_interface, monkeypatch):
+    class ImageFetcher:
+        cancelled = threading.Event()
+
+        async def is_url_allowed(self, url):
+            return True
+
+        async def fetch_image(self, url):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                self.cancelled.set()
+                raise
+
+    from carvekit.web.routers import api_router
+
+    fetcher = ImageFetcher()
+    monkeypatch.setattr(api_router, "image_fetcher", fetcher)
+    monkeypatch.setattr(deps.config.ml, "queue_max_jobs", 1)
+    interface = block_interface(deps.ml_processor.inference)
+    job_id = client.post(
+        "/api/jobs", files={"image_file": ("image.png", image_file())}
+    ).json()["id"]
+    response = client.post(
+        "/api/removebg",
+        files={"image_file": ("image.png", image_file())},
+        data={"bg_image_url": "https://example.com/bg.png"},
+    )
+    assert response.status_code == 503
+    # Background of the rejected job isn't downloaded
+    assert fetcher.cancelled.wait(10)
+    interface.release.set()
+    response = client.get(f"/api/jobs/{job_id}/result", params={"wait": 10})
+    assert response.status_code == 200
+
+
+def test_rate_limit_headers(client, deps, monkeypatch):
+    monkeypatch.setattr(deps.rate_limiter, "rate", 0.01)
+    monkeypatch.setattr(deps.rate_limiter, "burst", 1)
+    monkeypatch.setattr(deps.rate_limiter, "_buckets", {})
+    response = client.post(
+        "/api/removebg", files={"image_file": ("image.png", image_file())}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Ratelimit-Limit"] == "1"
+    assert response.headers["X-Ratelimit-Remaining"] == "0"
+    assert int(response.headers["X-Ratelimit-Reset"]) > 0
+    # The job has taken the bucket into debt, the next request is rejected
+    for url in ["/api/removebg", "/api/jobs"]:
+        response = client.post(url, files={"image_file": ("image.png", image_file())})
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.headers["X-Ratelimit-Remaining"] == "0"
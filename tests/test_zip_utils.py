@@ -0,0 +1,27 @@
+"""
+Source url: https://github.com/OPHoperHPO/freezed_carvekit_2023
+Author: Nikita Selin (OPHoperHPO)[https://github.com/OPHoperHPO].
+License: Apache License 2.0
+"""
+import io
+import zipfile
+
+from carvekit.web.utils.zip_utils import write_zip_entry, ZipStreamBuffer
+
+
+def test_zip_stream():
+    buffer = ZipStreamBuffer()
+    chunks = []
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        write_zip_entry(zip_file, "first.png", b"first")
+        chunks.append(buffer.pop())
+        assert len(chunks[0]) > 0
+        write_zip_entry(
+            zip_file, "second.png", b"second" * 100, compress_type=zipfile.ZIP_STORED
+        )
+        chunks.append(buffer.pop())
+    chunks.append(buffer.pop())
+    zip_file = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert zip_file.namelist() == ["first.png", "second.png"]
+    assert zip_file.read("second.png") == b"second" * 100
+    assert zip_file.testzip() is None